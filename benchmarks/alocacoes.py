@@ -0,0 +1,176 @@
+"""Alocação de memória e tempo por recomendação: caminho original do app x motor atual.
+
+O caminho original é reproduzido aqui a partir do handler antigo do ``app_V2.py``:
+``X_total_sim.copy()`` antes da cascata de filtros, ``df_candidatos.copy()`` duas
+vezes na busca numérica, um ``pd.DataFrame`` remontado a cada ajuste do laço e o
+``pd.merge`` com a base de parâmetros em toda requisição. O motor trabalha com
+posições no índice, lê só as linhas necessárias do tensor de métricas e usa as
+colunas de parâmetros juntadas uma única vez na carga.
+
+Os cenários são amostrados das linhas de ``X_dados_*`` (com a inércia trocada por
+um valor próximo em parte deles, para cair também no modo de médias).
+
+Uso (na raiz do repositório)::
+
+    python benchmarks/alocacoes.py [--n 200] [--json saida.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recomendador.catalogo import (  # noqa: E402
+    LIMIAR_BAC, LIMIAR_FNR, LIMIAR_FPR, SISTEMAS, bloqueio_tensao_map_inv, cenario_geracao_map_inv,
+    curvas_regulacao_map_inv, req_suportabilidade_map_inv, tecnica_ativa_map_inv, tipo_gd_map_inv,
+)
+from recomendador.engine import Recommender, Scenario, load_parameter_database, load_simulation_database  # noqa: E402
+from recomendador.indice import FALLBACK_POR_COLUNA  # noqa: E402
+
+MAPAS_INV = [tipo_gd_map_inv, bloqueio_tensao_map_inv, req_suportabilidade_map_inv, tecnica_ativa_map_inv,
+             curvas_regulacao_map_inv, cenario_geracao_map_inv]
+
+
+def sample_scenarios(x_total_sim, n, semente=0):
+    """Cenários montados a partir de linhas sorteadas de X (códigos convertidos para os textos da barra lateral)."""
+    rng = np.random.default_rng(semente)
+    cenarios = []
+    for pos in rng.integers(0, len(x_total_sim), n * 4):
+        linha = x_total_sim.iloc[int(pos)]
+        codigos = [int(v) for v in linha.iloc[4:10]]
+        if any(c not in mapa for c, mapa in zip(codigos, MAPAS_INV)):
+            continue
+        textos = [mapa[c] for c, mapa in zip(codigos, MAPAS_INV)]
+        inercia = float(linha.iloc[3])
+        if rng.random() < 0.3:
+            inercia = None if rng.random() < 0.5 else round(inercia * 0.9, 4)
+        cenarios.append(Scenario(float(linha.iloc[1]) / 1000.0, float(linha.iloc[2]) / 1000.0, *textos,
+                                 inercia=inercia))
+        if len(cenarios) == n:
+            break
+    return cenarios
+
+
+def recommend_original(config, x_total_sim, y_total_sim, df_params, cenario):
+    """Handler antigo do app, sem a parte de exibição (retorna os válidos ordenados por BAC)."""
+    user_categorical_inputs = list(cenario.categorical_codes())
+    f1_capacidade, f2_tensao, f3_inercia = cenario.capacidade_kw, cenario.tensao_kv, cenario.inercia_busca
+    feature_cols = x_total_sim.columns[4:10]
+    fallback_por_coluna = {feature_cols[i]: v for i, v in FALLBACK_POR_COLUNA.items()}
+
+    df_candidatos = x_total_sim.copy()
+    for i, col in enumerate(feature_cols):
+        df_filtrado = df_candidatos[df_candidatos[col] == user_categorical_inputs[i]]
+        if not df_filtrado.empty:
+            df_candidatos = df_filtrado
+        elif col in fallback_por_coluna:
+            df_filtrado_fb = df_candidatos[df_candidatos[col] == fallback_por_coluna[col]]
+            if not df_filtrado_fb.empty:
+                df_candidatos = df_filtrado_fb
+    if df_candidatos.empty:
+        return None
+
+    capacidade_db_kw = df_candidatos.iloc[:, 1] / 1000.0
+    vn_db_kv = df_candidatos.iloc[:, 2] / 1000.0
+    h_db = df_candidatos.iloc[:, 3]
+    df_tmp = df_candidatos.copy()
+    df_tmp = df_tmp.copy()
+    diff_cap = abs(capacidade_db_kw - f1_capacidade)
+    df_tmp = df_tmp[diff_cap == diff_cap.min()]
+    if df_tmp.shape[0] > 1:
+        diff_vn = abs(vn_db_kv - f2_tensao)
+        df_tmp = df_tmp[(diff_vn == diff_vn.min()).reindex(df_tmp.index)]
+    if df_tmp.shape[0] > 1:
+        diff_h_abs = abs(h_db - f3_inercia)
+        min_diff_h = diff_h_abs.min()
+        if not np.isclose(min_diff_h, 0.0, atol=1e-9):
+            diff_h_signed = h_db - f3_inercia
+            mask_maiores = diff_h_signed > 0
+            if mask_maiores.any():
+                df_tmp = df_tmp[(diff_h_signed == diff_h_signed[mask_maiores].min()).reindex(df_tmp.index)]
+            else:
+                df_tmp = df_tmp[(diff_h_abs == min_diff_h).reindex(df_tmp.index)]
+        else:
+            df_tmp = df_tmp[(diff_h_abs == 0).reindex(df_tmp.index)]
+    if df_tmp.empty:
+        return None
+
+    subset_metricas = y_total_sim.loc[df_tmp.index.tolist()]
+    dados_candidatos = []
+    for ajuste_id in config.ajustes_candidatos:
+        dados_candidatos.append({
+            'Ajuste_ID': ajuste_id,
+            'Label': config.label(ajuste_id),
+            'BAC': subset_metricas[f'BAC_Ajuste_{ajuste_id}'].mean(),
+            'FNR': subset_metricas[f'FNR_Ajuste_{ajuste_id}'].mean(),
+            'FPR': subset_metricas[f'FPR_Ajuste_{ajuste_id}'].mean(),
+        })
+        df_candidatos = pd.DataFrame(dados_candidatos)
+    df_candidatos_completo = pd.merge(df_candidatos, df_params, left_on='Ajuste_ID', right_index=True, how='left')
+    ajustes_elegiveis = config.allowed_adjustments(user_categorical_inputs[1], user_categorical_inputs[2])
+    df_filtrado_regras = df_candidatos_completo[df_candidatos_completo['Ajuste_ID'].isin(ajustes_elegiveis)]
+    df_filtrado_final = df_filtrado_regras[
+        (df_filtrado_regras['BAC'] > LIMIAR_BAC) & (df_filtrado_regras['FNR'] < LIMIAR_FNR)
+        & (df_filtrado_regras['FPR'] < LIMIAR_FPR)
+    ]
+    return df_filtrado_final.sort_values(by='BAC', ascending=False)
+
+
+def _medir(funcao, cenarios):
+    """(mediana ms, mediana e máximo do pico de memória alocada por chamada em KiB)."""
+    tempos, picos = [], []
+    for cenario in cenarios:
+        tracemalloc.start()
+        base_memoria = tracemalloc.get_traced_memory()[0]
+        funcao(cenario)
+        picos.append((tracemalloc.get_traced_memory()[1] - base_memoria) / 1024)
+        tracemalloc.stop()
+    for cenario in cenarios:
+        t0 = time.perf_counter()
+        funcao(cenario)
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return {'tempo_ms_mediana': round(statistics.median(tempos), 3),
+            'pico_kib_mediana': round(statistics.median(picos), 1),
+            'pico_kib_max': round(max(picos), 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--n', type=int, default=200, help="Cenários por sistema")
+    parser.add_argument('--base-dir', default='.')
+    parser.add_argument('--json', default=None, help="Grava os resultados neste arquivo")
+    args = parser.parse_args(argv)
+
+    recomendador = Recommender(base_dir=args.base_dir)
+    resultados = {}
+    for nome, config in SISTEMAS.items():
+        arquivos = {k: os.path.join(args.base_dir, v) for k, v in config.arquivos.items()}
+        x_total_sim, y_total_sim = load_simulation_database(arquivos['x'], arquivos['y'])
+        df_params = load_parameter_database(arquivos['params'])
+        recomendador.database(nome)
+        cenarios = sample_scenarios(x_total_sim, args.n)
+
+        original = _medir(lambda c: recommend_original(config, x_total_sim, y_total_sim, df_params, c), cenarios)
+        motor = _medir(lambda c: recomendador.recommend(c), cenarios)
+        resultados[nome] = {'cenarios': len(cenarios), 'original': original, 'motor': motor}
+        print(f"{nome} ({len(cenarios)} cenários)")
+        for caminho, r in (('original', original), ('motor', motor)):
+            print(f"  {caminho:9s} {r['tempo_ms_mediana']:8.3f} ms  pico {r['pico_kib_mediana']:8.1f} KiB "
+                  f"(máx {r['pico_kib_max']:.1f})")
+        print(f"  redução do pico de alocação: {original['pico_kib_mediana'] / motor['pico_kib_mediana']:.1f}x")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""Suíte de benchmarks do pipeline de recomendação (AT e MT, com escalas sintéticas).
+
+Etapas medidas, por sistema e por escala:
+
+* ``carga_fria``: ``Database.load`` lendo os .xlsx (cache colunar vazio, só na escala 1);
+* ``carga_quente``: ``Database.load`` com o cache colunar já compilado (só na escala 1);
+* ``carga_armazem``: abertura da base pelo armazém mmap (``armazem.open_database``);
+* ``busca``: cascata categórica + vizinho mais próximo (``ScenarioIndex.nearest``);
+* ``vizinhos``: k-NN (k = 5) pela árvore k-d do grupo categórico (``ScenarioIndex.nearest_k``),
+  uma consulta por vez, com as árvores já montadas;
+* ``vizinhos_lote``: as mesmas consultas de uma vez (``ScenarioIndex.nearest_k_many``);
+* ``agregacao``: média das métricas dos candidatos quando há vários cenários empatados;
+* ``filtro``: regras de especialista (VB x RS), limiares de desempenho e ordem por BAC
+  (``catalogo.valid_adjustments``);
+* ``filtro_bitmap``: o mesmo filtro para um cenário único, pelo AND do bitmap de aprovação
+  pré-calculado com a máscara das regras;
+* ``bitmaps``: montagem dos bitmaps de aprovação de toda a base (``engine.pass_bitmaps``, feita
+  na carga);
+* ``pontuacao``: ranking top-k com frentes de Pareto (``pontuacao.Scoring``) de um lote de
+  100 mil avaliações, montado replicando as dos cenários amostrados;
+* ``atualizacao``: ``atualizacao.apply_delta`` com as últimas 300 linhas de X (e as métricas
+  delas) anexadas a uma base sem elas, para comparar com ``carga_quente``;
+* ``recomendacao``: ``Recommender.recommend`` ponta a ponta, sem cache de resultados;
+* ``lote``: ``recommend_batch`` com todos os cenários amostrados de uma vez;
+* ``cobertura``: relatório de cobertura (``cobertura.coverage``) com a grade padrão, sobre
+  todas as combinações categóricas do sistema.
+
+Os cenários são amostrados das linhas de ``X_dados_*``. As escalas 10x/100x
+replicam as linhas de X (cada réplica com a capacidade deslocada em alguns W, para
+que os pontos continuem distintos) e as linhas do tensor de métricas.
+
+Os resultados vão para um JSON (metadados do commit e das bibliotecas + uma entrada
+por sistema/escala/etapa), que pode ser comparado com o de outro commit::
+
+    python benchmarks/suite.py --saida bench_novo.json
+    python benchmarks/suite.py --saida bench_novo.json --comparar bench_antigo.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from alocacoes import sample_scenarios  # noqa: E402
+
+from recomendador import armazem  # noqa: E402
+from recomendador.atualizacao import apply_delta  # noqa: E402
+from recomendador.batch import recommend_batch  # noqa: E402
+from recomendador.cache import VARIAVEL_AMBIENTE_CACHE  # noqa: E402
+from recomendador.cobertura import coverage  # noqa: E402
+from recomendador.catalogo import SISTEMAS, valid_adjustments  # noqa: E402
+from recomendador.engine import METRICAS, Database, Recommender, mean_metrics, pass_bitmaps  # noqa: E402
+from recomendador.indice import ScenarioIndex  # noqa: E402
+from recomendador.pontuacao import Scoring  # noqa: E402
+
+FORMATO_RESULTADOS = 1
+ETAPAS = ('carga_fria', 'carga_quente', 'carga_armazem', 'busca', 'vizinhos', 'vizinhos_lote', 'agregacao', 'filtro',
+          'filtro_bitmap', 'bitmaps', 'pontuacao', 'atualizacao', 'recomendacao', 'lote', 'cobertura')
+# k das etapas ``vizinhos`` e ``vizinhos_lote``
+K_VIZINHOS = 5
+# Linhas anexadas na etapa ``atualizacao``
+LINHAS_DELTA = 300
+# Avaliações pontuadas de uma vez na etapa ``pontuacao``
+LOTE_PONTUACAO = 100_000
+
+
+def _estatisticas(tempos_s):
+    ms = np.asarray(tempos_s) * 1000
+    return {
+        'n': int(len(ms)),
+        'mediana_ms': round(float(np.median(ms)), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'media_ms': round(float(ms.mean()), 4),
+        'total_ms': round(float(ms.sum()), 3),
+    }
+
+
+def _cronometrar(funcao, itens):
+    tempos = []
+    for item in itens:
+        t0 = time.perf_counter()
+        funcao(item)
+        tempos.append(time.perf_counter() - t0)
+    return tempos
+
+
+def scaled_database(base, fator):
+    """Base sintética com ``fator`` réplicas das linhas de X (e do tensor de métricas)."""
+    if fator == 1:
+        return base
+    x = base.X_total_sim
+    replicas = []
+    for r in range(fator):
+        copia = x.copy()
+        copia.iloc[:, 1] = copia.iloc[:, 1] + r  # capacidade em W: réplicas em pontos distintos
+        copia['NomeCenario'] = copia['NomeCenario'].astype(str) + f'_r{r}'
+        replicas.append(copia)
+    x_escalado = pd.concat(replicas, ignore_index=True)
+    metricas = np.concatenate([base.metricas] * fator)
+    return Database(base.config, base.df_params, x_escalado, ScenarioIndex.from_frame(x_escalado),
+                    metricas, base.coluna_ajuste)
+
+
+def split_delta(base, n_linhas):
+    """(base sem as últimas ``n_linhas`` de X, X dessas linhas, Y delas com NomeCenario e as métricas)."""
+    corte = len(base.X_total_sim) - n_linhas
+    x = base.X_total_sim.iloc[:corte].reset_index(drop=True)
+    anterior = Database(base.config, base.df_params, x, ScenarioIndex.from_frame(x), base.metricas[:corte],
+                        base.coluna_ajuste)
+    x_delta = base.X_total_sim.iloc[corte:]
+    y_delta = pd.DataFrame({'NomeCenario': x_delta['NomeCenario'].to_numpy(),
+                            **{f'{metrica}_Ajuste_{ajuste_id}': base.metricas[corte:, coluna, m]
+                               for ajuste_id, coluna in base.coluna_ajuste.items()
+                               for m, metrica in enumerate(METRICAS)}})
+    return anterior, x_delta, y_delta
+
+
+def _recomendador_com(base):
+    """Recommender de um único sistema com a base (possivelmente sintética) já carregada."""
+    recomendador = Recommender(sistemas={base.config.nome: base.config})
+    recomendador.check_sources()
+    recomendador._bases[base.config.nome] = base
+    return recomendador
+
+
+def bench_load(config, base_dir, repeticoes):
+    resultados = {}
+    anterior = os.environ.get(VARIAVEL_AMBIENTE_CACHE)
+    tempos = []
+    try:
+        for _ in range(repeticoes):
+            with tempfile.TemporaryDirectory() as vazio:
+                os.environ[VARIAVEL_AMBIENTE_CACHE] = vazio
+                t0 = time.perf_counter()
+                Database.load(config, base_dir)
+                tempos.append(time.perf_counter() - t0)
+    finally:
+        if anterior is None:
+            os.environ.pop(VARIAVEL_AMBIENTE_CACHE, None)
+        else:
+            os.environ[VARIAVEL_AMBIENTE_CACHE] = anterior
+    resultados['carga_fria'] = tempos
+
+    Database.load(config, base_dir)  # garante o cache colunar compilado
+    resultados['carga_quente'] = _cronometrar(lambda _: Database.load(config, base_dir), range(repeticoes))
+    return resultados
+
+
+def bench_system(base, cenarios, repeticoes):
+    config = base.config
+    resultados = {}
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        armazem.save_database(base, os.path.join(diretorio, config.nome))
+        resultados['carga_armazem'] = _cronometrar(
+            lambda _: armazem.open_database(config, os.path.join(diretorio, config.nome)), range(repeticoes))
+
+    entradas = [(c.categorical_codes(), c.capacidade_kw, c.tensao_kv, c.inercia_busca) for c in cenarios]
+    resultados['busca'] = _cronometrar(lambda e: base.indice.nearest(*e), entradas)
+
+    codigos_lote = [e[0] for e in entradas]
+    alvos_lote = [e[1:] for e in entradas]
+    base.indice.nearest_k_many(codigos_lote, alvos_lote, K_VIZINHOS)  # monta as árvores dos grupos
+    resultados['vizinhos'] = _cronometrar(lambda e: base.indice.nearest_k(*e, K_VIZINHOS), entradas)
+    resultados['vizinhos_lote'] = _cronometrar(
+        lambda _: base.indice.nearest_k_many(codigos_lote, alvos_lote, K_VIZINHOS), range(repeticoes))
+
+    posicoes = [base.indice.nearest(*e) for e in entradas]
+    colunas = base.candidate_columns
+    blocos = [base.metricas[p][:, colunas, :].reshape(len(p), -1) for p in posicoes if len(p) > 1]
+    resultados['agregacao'] = _cronometrar(mean_metrics, blocos)
+
+    valores = [(mean_metrics(base.metricas[p][:, colunas, :].reshape(len(p), -1)).reshape(len(colunas), -1),
+                codigos[1], codigos[2])
+               for p, (codigos, *_) in zip(posicoes, entradas) if len(p)]
+
+    resultados['filtro'] = _cronometrar(lambda item: valid_adjustments(config, *item), valores)
+
+    unicos = [(base.metricas[p[0]][colunas, :], codigos[1], codigos[2], base.aprovacao[p[0]])
+              for p, (codigos, *_) in zip(posicoes, entradas) if len(p)]
+    resultados['filtro_bitmap'] = _cronometrar(lambda item: valid_adjustments(config, *item), unicos)
+    resultados['bitmaps'] = _cronometrar(lambda _: pass_bitmaps(base.metricas, colunas), range(repeticoes))
+
+    if valores:
+        repeticoes_lote = -(-LOTE_PONTUACAO // len(valores))
+        metricas_lote = np.tile(np.stack([v for v, _, _ in valores]), (repeticoes_lote, 1, 1))[:LOTE_PONTUACAO]
+        elegiveis_lote = np.tile(np.stack([config.eligible(vb, rs) for _, vb, rs in valores]),
+                                 (repeticoes_lote, 1))[:LOTE_PONTUACAO]
+        pontuacao = Scoring(pesos=(1.0, 0.5, 0.5), pareto=True)
+        resultados['pontuacao'] = _cronometrar(lambda _: pontuacao.rank(metricas_lote, elegiveis_lote),
+                                               range(repeticoes))
+
+    if len(base.X_total_sim) > LINHAS_DELTA:
+        anterior, x_delta, y_delta = split_delta(base, LINHAS_DELTA)
+        resultados['atualizacao'] = _cronometrar(lambda _: apply_delta(anterior, x_delta, y_delta),
+                                                 range(repeticoes))
+
+    recomendador = _recomendador_com(base)
+    resultados['recomendacao'] = _cronometrar(recomendador.recommend, cenarios)
+
+    lote = pd.DataFrame([asdict(c) for c in cenarios])
+    resultados['lote'] = _cronometrar(lambda _: recommend_batch(recomendador, lote), range(repeticoes))
+    resultados['cobertura'] = _cronometrar(lambda _: coverage(recomendador), range(repeticoes))
+    return resultados
+
+
+def _metadados():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'formato': FORMATO_RESULTADOS,
+        'commit': commit,
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(atual, anterior):
+    """Linhas (sistema, escala, etapa, mediana anterior, mediana atual, razão) das entradas em comum."""
+    chave = lambda r: (r['sistema'], r['escala'], r['etapa'])  # noqa: E731
+    antigos = {chave(r): r for r in anterior['resultados']}
+    linhas = []
+    for r in atual['resultados']:
+        a = antigos.get(chave(r))
+        if a is not None and a['mediana_ms'] > 0:
+            linhas.append((*chave(r), a['mediana_ms'], r['mediana_ms'], r['mediana_ms'] / a['mediana_ms']))
+    return linhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de recomendação.")
+    parser.add_argument('--base-dir', default=RAIZ, help="Diretório com as bases X/Y/parâmetros")
+    parser.add_argument('--sistemas', default=','.join(SISTEMAS), help="Sistemas a medir (separados por vírgula)")
+    parser.add_argument('--escalas', default='1,10,100', help="Fatores de réplica das linhas de X")
+    parser.add_argument('--n', type=int, default=300, help="Cenários amostrados por sistema")
+    parser.add_argument('--repeticoes', type=int, default=3, help="Repetições das etapas de carga e do lote")
+    parser.add_argument('--saida', default='bench_resultados.json', help="Arquivo JSON de resultados")
+    parser.add_argument('--comparar', default=None, help="JSON de outra execução para comparar as medianas")
+    args = parser.parse_args(argv)
+
+    escalas = [int(e) for e in args.escalas.split(',') if e.strip()]
+    saida = {**_metadados(), 'parametros': {'n': args.n, 'escalas': escalas, 'repeticoes': args.repeticoes},
+             'resultados': []}
+
+    def registrar(sistema, escala, linhas, tempos):
+        for etapa in ETAPAS:
+            if etapa in tempos and tempos[etapa]:
+                r = {'sistema': sistema, 'escala': escala, 'linhas': linhas, 'etapa': etapa,
+                     **_estatisticas(tempos[etapa])}
+                saida['resultados'].append(r)
+                print(f"{sistema:3s} {escala:4d}x {etapa:14s} mediana {r['mediana_ms']:10.4f} ms  "
+                      f"p95 {r['p95_ms']:10.4f} ms  (n={r['n']})", flush=True)
+
+    for nome in args.sistemas.split(','):
+        config = SISTEMAS[nome]
+        base = Database.load(config, args.base_dir)
+        cenarios = sample_scenarios(base.X_total_sim, args.n)
+        for escala in escalas:
+            tempos = bench_load(config, args.base_dir, args.repeticoes) if escala == 1 else {}
+            escalada = scaled_database(base, escala)
+            tempos.update(bench_system(escalada, cenarios, args.repeticoes))
+            registrar(nome, escala, len(escalada.X_total_sim), tempos)
+            del escalada
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(saida, f, ensure_ascii=False, indent=1)
+    print(f"Resultados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        print(f"\nComparação com {anterior.get('commit')} ({args.comparar}):")
+        for sistema, escala, etapa, antes, agora, razao in compare(saida, anterior):
+            print(f"{sistema:3s} {escala:4d}x {etapa:14s} {antes:10.4f} -> {agora:10.4f} ms  ({razao:.2f}x)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
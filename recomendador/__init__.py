@@ -0,0 +1,39 @@
+"""Núcleo do recomendador de ajustes (sem dependência do Streamlit).
+
+Os nomes públicos são importados sob demanda, para que ``python -m recomendador.<módulo>``
+não carregue o pacote inteiro antes do módulo executado.
+"""
+import importlib
+
+_EXPORTS = {
+    'DatabaseLoadError': 'engine',
+    'Recommendation': 'engine',
+    'Recommender': 'engine',
+    'Scenario': 'engine',
+    'validate_scenario': 'engine',
+    'compile_all': 'cache',
+    'read_excel_cached': 'cache',
+    'RecommendationTable': 'tabela',
+    'ResultCache': 'memo',
+    'compile_table': 'tabela',
+    'recommend_batch': 'batch',
+    'RecommendationService': 'service',
+    'ingest': 'ingestao',
+    'publish_delta': 'atualizacao',
+    'compile_store': 'armazem',
+    'load_shared': 'armazem',
+    'TELEMETRIA': 'instrumentacao',
+    'Telemetry': 'instrumentacao',
+    'Warmup': 'aquecimento',
+    'Scoring': 'pontuacao',
+    'sweep': 'varredura',
+    'coverage': 'cobertura',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(nome):
+    if nome in _EXPORTS:
+        return getattr(importlib.import_module(f'.{_EXPORTS[nome]}', __name__), nome)
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
@@ -0,0 +1,158 @@
+"""Aquecimento das bases em segundo plano na subida do processo e sinal de prontidão.
+
+Uma réplica nova só deve receber tráfego depois de abrir (ou compilar) as bases AT
+e MT; até lá, quem chegasse primeiro pagaria a leitura dos .xlsx. ``Warmup`` carrega
+as bases de um ``Recommender`` numa thread e expõe o estado (``aquecendo``,
+``pronto`` ou ``erro``). ``serve_readiness`` publica esse estado numa porta HTTP
+própria, para a verificação de prontidão do balanceador de carga::
+
+    GET /ready  ->  200 {"status": "pronto", ...}  |  503 {"status": "aquecendo", ...}
+
+Para o app Streamlit, este módulo sobe o servidor no mesmo processo depois de
+disparar o aquecimento do ``Recommender`` compartilhado (o mesmo que o app usa)::
+
+    python -m recomendador.aquecimento app_V2.py --prontidao-porta 8502 -- --server.port 8501
+
+Rodando com ``streamlit run`` direto, o aquecimento começa na primeira sessão aberta.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ESTADO_PARADO = 'parado'
+ESTADO_AQUECENDO = 'aquecendo'
+ESTADO_PRONTO = 'pronto'
+ESTADO_ERRO = 'erro'
+
+VARIAVEL_AMBIENTE_PORTA = 'RECOMENDADOR_PORTA_PRONTIDAO'
+
+
+class Warmup:
+    """Carrega as bases de ``recomendador`` numa thread em segundo plano."""
+
+    def __init__(self, recomendador, sistemas=None):
+        self.recomendador = recomendador
+        self.sistemas = sistemas
+        self.estado = ESTADO_PARADO
+        self.erro = None
+        self.segundos = None
+        self._concluido = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Dispara o aquecimento (só na primeira chamada)."""
+        with self._lock:
+            if self.estado != ESTADO_PARADO:
+                return self
+            self.estado = ESTADO_AQUECENDO
+        threading.Thread(target=self._aquecer, name='aquecimento-bases', daemon=True).start()
+        return self
+
+    def _aquecer(self):
+        t0 = time.perf_counter()
+        try:
+            self.recomendador.warm(self.sistemas)
+            self.estado = ESTADO_PRONTO
+        except Exception as e:
+            # As bases ainda podem subir sob demanda; a réplica só não se declara pronta
+            self.erro = f"{type(e).__name__}: {e}"
+            self.estado = ESTADO_ERRO
+        finally:
+            self.segundos = time.perf_counter() - t0
+            self._concluido.set()
+
+    @property
+    def ready(self):
+        return self.estado == ESTADO_PRONTO
+
+    def wait(self, timeout=None):
+        """Espera o fim do aquecimento. Retorna True se a réplica ficou pronta."""
+        self._concluido.wait(timeout)
+        return self.ready
+
+    def status(self):
+        saida = {'status': self.estado, 'carregados': self.recomendador.loaded_systems()}
+        if self.segundos is not None:
+            saida['segundos'] = round(self.segundos, 2)
+        if self.erro is not None:
+            saida['erro'] = self.erro
+        return saida
+
+
+def serve_readiness(aquecimento, host='0.0.0.0', port=8502):
+    """Servidor HTTP (thread daemon) com ``GET /ready``: 200 quando pronto, 503 antes disso."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0].rstrip('/') != '/ready':
+                status, dados = HTTPStatus.NOT_FOUND, {'erro': f"Rota não encontrada: {self.path}"}
+            else:
+                status = HTTPStatus.OK if aquecimento.ready else HTTPStatus.SERVICE_UNAVAILABLE
+                dados = aquecimento.status()
+            corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, formato, *args):
+            pass  # as sondas do balanceador chamam /ready a cada poucos segundos
+
+    servidor = ThreadingHTTPServer((host, port), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='prontidao', daemon=True).start()
+    return servidor
+
+
+_compartilhado = None
+_lock_compartilhado = threading.Lock()
+
+
+def shared_warmup():
+    """``Warmup`` do ``Recommender`` do processo (o que o app usa), já disparado."""
+    global _compartilhado
+    with _lock_compartilhado:
+        if _compartilhado is None:
+            from .engine import Recommender
+            from .memo import ResultCache
+            # Com o armazém mmap, os processos do servidor compartilham uma só cópia física das bases
+            _compartilhado = Warmup(Recommender(cache=ResultCache(), armazem=True))
+    return _compartilhado.start()
+
+
+def shared_recommender():
+    return shared_warmup().recomendador
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sobe o app Streamlit com as bases aquecidas em segundo plano e a porta de prontidão.")
+    parser.add_argument('script', help="Script do app (ex.: app_V2.py)")
+    parser.add_argument('--prontidao-host', default='0.0.0.0')
+    parser.add_argument('--prontidao-porta', type=int, default=int(os.environ.get(VARIAVEL_AMBIENTE_PORTA, 8502)),
+                        help=f"Porta do GET /ready (padrão: ${VARIAVEL_AMBIENTE_PORTA} ou 8502)")
+    parser.epilog = "Argumentos depois de -- são repassados ao 'streamlit run'."
+    argv = sys.argv[1:] if argv is None else list(argv)
+    repassados = argv[argv.index('--') + 1:] if '--' in argv else []
+    args = parser.parse_args(argv[:argv.index('--')] if '--' in argv else argv)
+
+    # Com ``-m`` este arquivo roda como __main__: o app importa ``recomendador.aquecimento``,
+    # e é o Recommender desse módulo que precisa ser aquecido
+    from . import aquecimento as modulo
+    aquecimento = modulo.shared_warmup()
+    serve_readiness(aquecimento, args.prontidao_host, args.prontidao_porta)
+    print(f"Prontidão em http://{args.prontidao_host}:{args.prontidao_porta}/ready", flush=True)
+
+    from streamlit.web import cli as stcli  # só aqui: o módulo também serve ao serviço HTTP, sem Streamlit
+    sys.argv = ['streamlit', 'run', args.script, *repassados]
+    return stcli.main(prog_name='streamlit')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""Armazém somente leitura das bases compiladas, aberto com ``mmap`` e compartilhado entre processos.
+
+Cada sistema vira um diretório com um .npy por array (colunas de X e da base de
+parâmetros, tensor de métricas, códigos categóricos, eixos numéricos e os grupos de
+prefixos do índice categórico) e um manifesto com a assinatura dos arquivos de
+origem. Os processos (servidores Streamlit, workers do serviço) abrem os .npy com
+``mmap_mode='r'``: as páginas vêm do page cache do sistema operacional, ficam em uma
+única cópia física por máquina e os DataFrames da ``Database`` são montados sobre
+elas sem cópia (só os textos, como ``NomeCenario``, viram objetos em cada processo).
+
+O primeiro processo que encontra o armazém ausente ou velho compila o sistema a
+partir dos .xlsx e o grava com substituição atômica; os demais só o abrem.
+
+Uso::
+
+    python -m recomendador.armazem .cache_bases/armazem   # compila todos os sistemas
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from .cache import column_to_array, file_sha256
+from .catalogo import SISTEMAS
+from .engine import COLUNA_ID_AJUSTE, Database
+from .indice import CategoricalIndex, NumericIndex, ScenarioIndex
+
+FORMATO_ARMAZEM = 1
+MANIFESTO = 'manifesto.json'
+DIRETORIO_ARMAZEM_PADRAO = os.path.join('.cache_bases', 'armazem')
+VARIAVEL_AMBIENTE_ARMAZEM = 'RECOMENDADOR_ARMAZEM'
+
+
+def store_dir_for(diretorio=None, base_dir='.'):
+    """Diretório do armazém: argumento, variável de ambiente ou ``.cache_bases/armazem`` junto às bases."""
+    if diretorio is None:
+        diretorio = os.environ.get(VARIAVEL_AMBIENTE_ARMAZEM)
+    if diretorio is None:
+        diretorio = os.path.join(base_dir, DIRETORIO_ARMAZEM_PADRAO)
+    return diretorio
+
+
+def _fontes(config, base_dir):
+    fontes = {}
+    for tipo, caminho in config.arquivos.items():
+        st = os.stat(os.path.join(base_dir, caminho))
+        fontes[tipo] = {'arquivo': caminho, 'tamanho': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    return fontes
+
+
+def _ler_manifesto(dir_sistema):
+    try:
+        with open(os.path.join(dir_sistema, MANIFESTO), encoding='utf-8') as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifesto.get('formato') != FORMATO_ARMAZEM:
+        return None
+    return manifesto
+
+
+def is_fresh(manifesto, config, base_dir='.'):
+    """O armazém do sistema corresponde aos arquivos de origem atuais?
+
+    Tamanho e mtime iguais bastam; se só o mtime mudou (checkout, cópia), compara o SHA-256.
+    """
+    # Diretórios gravados pela ingestão em blocos não têm 'arquivos': nunca valem pelas planilhas
+    if manifesto is None or manifesto.get('arquivos') != config.arquivos:
+        return False
+    for tipo, atual in _fontes(config, base_dir).items():
+        gravada = manifesto['fontes'][tipo]
+        if gravada['tamanho'] != atual['tamanho']:
+            return False
+        if (gravada['mtime_ns'] != atual['mtime_ns']
+                and gravada['sha256'] != file_sha256(os.path.join(base_dir, atual['arquivo']))):
+            return False
+    return True
+
+
+def save_frame(df, diretorio, prefixo):
+    """Grava cada coluna de ``df`` em ``{prefixo}_{i}.npy`` (e os nulos ao lado). Retorna as entradas do manifesto."""
+    colunas = []
+    for i, nome in enumerate(df.columns):
+        valores, nulos = column_to_array(df[nome])
+        coluna = {'nome': nome, 'arquivo': f'{prefixo}_{i:04d}.npy'}
+        np.save(os.path.join(diretorio, coluna['arquivo']), valores, allow_pickle=False)
+        if nulos is not None:
+            coluna['nulos'] = f'{prefixo}_nulos_{i:04d}.npy'
+            np.save(os.path.join(diretorio, coluna['nulos']), nulos, allow_pickle=False)
+        colunas.append(coluna)
+    return colunas
+
+
+def save_prefix_groups(grupos, n_colunas, diretorio):
+    """Grava os grupos de prefixos do índice categórico (pares chave, posições): chaves, nível
+    (colunas preenchidas) e posições concatenadas."""
+    arrays = {
+        'grupos_chaves': np.array([[v if v is not None else 0 for v in chave] for chave, _ in grupos],
+                                  dtype=np.int64).reshape(len(grupos), n_colunas),
+        'grupos_nivel': np.array([sum(v is not None for v in chave) for chave, _ in grupos], dtype=np.int64),
+        'grupos_inicio': np.concatenate(([0], np.cumsum([len(p) for _, p in grupos]))).astype(np.int64),
+        'grupos_posicoes': (np.concatenate([p for _, p in grupos]) if grupos else np.empty(0)).astype(np.int64),
+    }
+    for nome, valores in arrays.items():
+        np.save(os.path.join(diretorio, f'{nome}.npy'), np.ascontiguousarray(valores), allow_pickle=False)
+
+
+def _abrir_frame(colunas, diretorio, mmap_mode):
+    dados = {}
+    for coluna in colunas:
+        # np.asarray: view comum (não np.memmap) do arquivo mapeado, como o pandas espera
+        valores = np.asarray(np.load(os.path.join(diretorio, coluna['arquivo']), mmap_mode=mmap_mode,
+                                     allow_pickle=False))
+        if 'nulos' in coluna:
+            nulos = np.load(os.path.join(diretorio, coluna['nulos']), allow_pickle=False)
+            valores = pd.Series(valores).where(~nulos).to_numpy()
+        dados[coluna['nome']] = valores
+    # copy=False: as colunas numéricas continuam sendo views dos arquivos mapeados
+    return pd.DataFrame(dados, columns=[c['nome'] for c in colunas], copy=False)
+
+
+def _gravar_sistema(base, tmp, fontes):
+    config = base.config
+    arrays = {
+        'metricas': base.metricas,
+        'codigos': base.indice.categorico.codigos,
+        'capacidade_kw': base.indice.numerico.capacidade_kw,
+        'vn_kv': base.indice.numerico.vn_kv,
+        'h': base.indice.numerico.h,
+    }
+    for nome, valores in arrays.items():
+        np.save(os.path.join(tmp, f'{nome}.npy'), np.ascontiguousarray(valores), allow_pickle=False)
+    save_prefix_groups(base.indice.categorico.prefix_groups(), base.indice.categorico.n_colunas, tmp)
+
+    manifesto = {
+        'formato': FORMATO_ARMAZEM,
+        'sistema': config.nome,
+        'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'coluna_ajuste': [[int(a), int(c)] for a, c in base.coluna_ajuste.items()],
+        'colunas_x': save_frame(base.X_total_sim, tmp, 'x'),
+        'colunas_params': save_frame(base.df_params.reset_index(), tmp, 'params'),
+    }
+    if fontes is not None:
+        manifesto.update(arquivos=dict(config.arquivos), fontes=fontes)
+    with open(os.path.join(tmp, MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=1)
+    return manifesto
+
+
+def save_database(base, diretorio, base_dir='.'):
+    """Grava uma ``Database`` carregada no diretório do sistema (substituição atômica).
+
+    Colunas que não voltariam iguais dos .npy (ver ``column_to_array``) levantam ``ValueError``
+    sem deixar nada gravado. Com ``base_dir=None`` o manifesto fica sem os arquivos de origem,
+    como os da ingestão em blocos (cópias de trabalho, ex.: a dos processos do lote e a da
+    tabela pré-computada), e nunca vale pelas planilhas em ``is_fresh``.
+    """
+    fontes = None
+    if base_dir is not None:
+        fontes = _fontes(base.config, base_dir)
+        for tipo, fonte in fontes.items():
+            fonte['sha256'] = file_sha256(os.path.join(base_dir, fonte['arquivo']))
+
+    diretorio = os.path.abspath(diretorio)
+    tmp = f"{diretorio}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        manifesto = _gravar_sistema(base, tmp, fontes)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    antigo = f"{diretorio}.{os.getpid()}.old"
+    if os.path.isdir(diretorio):
+        os.replace(diretorio, antigo)
+    try:
+        os.replace(tmp, diretorio)
+    except OSError:
+        # Outro processo publicou o mesmo sistema nesse meio tempo
+        shutil.rmtree(tmp, ignore_errors=True)
+    # Processos que ainda mapeiam os arquivos antigos continuam lendo normalmente
+    shutil.rmtree(antigo, ignore_errors=True)
+    return manifesto
+
+
+def open_database(config, diretorio, manifesto=None, mmap_mode='r'):
+    """Abre a ``Database`` de um sistema gravado por ``save_database`` sem copiar os arrays."""
+    if manifesto is None:
+        manifesto = _ler_manifesto(diretorio)
+        if manifesto is None:
+            raise FileNotFoundError(f"Armazém inválido ou ausente em {diretorio}")
+
+    def abrir(nome):
+        return np.load(os.path.join(diretorio, f'{nome}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+
+    codigos = abrir('codigos')
+    chaves, nivel, inicio, posicoes = (abrir('grupos_chaves'), abrir('grupos_nivel'),
+                                       abrir('grupos_inicio'), abrir('grupos_posicoes'))
+    n_colunas = codigos.shape[1]
+    grupos = {}
+    for g, (valores, n) in enumerate(zip(chaves.tolist(), nivel.tolist())):
+        grupos[tuple(valores[:n]) + (None,) * (n_colunas - n)] = posicoes[inicio[g]:inicio[g + 1]]
+    indice = ScenarioIndex(CategoricalIndex(codigos, grupos_prefixos=grupos),
+                           NumericIndex(abrir('capacidade_kw'), abrir('vn_kv'), abrir('h')))
+
+    df_params = _abrir_frame(manifesto['colunas_params'], diretorio, mmap_mode).set_index(COLUNA_ID_AJUSTE)
+    x_total_sim = _abrir_frame(manifesto['colunas_x'], diretorio, mmap_mode)
+    coluna_ajuste = {a: c for a, c in manifesto['coluna_ajuste']}
+    return Database(config, df_params, x_total_sim, indice, abrir('metricas'), coluna_ajuste)
+
+
+def load_shared(config, base_dir='.', diretorio=None):
+    """``Database`` do sistema a partir do armazém, compilando-o antes se estiver ausente ou velho."""
+    dir_sistema = os.path.join(store_dir_for(diretorio, base_dir), config.nome)
+    manifesto = _ler_manifesto(dir_sistema)
+    if not is_fresh(manifesto, config, base_dir):
+        try:
+            manifesto = save_database(Database.load(config, base_dir), dir_sistema, base_dir)
+        except (OSError, TypeError, ValueError):
+            # Armazém sem permissão de escrita, ou colunas que não podem ser gravadas sem perda:
+            # segue com a base em memória, como sem armazém
+            return Database.load(config, base_dir)
+    return open_database(config, dir_sistema, manifesto)
+
+
+def compile_store(diretorio=None, base_dir='.', sistemas=None, force=False):
+    """Compila (ou valida) todos os sistemas no armazém. Retorna [(sistema, segundos, status)]."""
+    diretorio = store_dir_for(diretorio, base_dir)
+    resultados = []
+    for nome, config in (SISTEMAS if sistemas is None else sistemas).items():
+        t0 = time.perf_counter()
+        dir_sistema = os.path.join(diretorio, nome)
+        if not force and is_fresh(_ler_manifesto(dir_sistema), config, base_dir):
+            status = 'atualizado'
+        else:
+            save_database(Database.load(config, base_dir), dir_sistema, base_dir)
+            status = 'compilado'
+        resultados.append((nome, time.perf_counter() - t0, status))
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compila o armazém mmap das bases.")
+    parser.add_argument('diretorio', nargs='?', default=None,
+                        help=f"Diretório do armazém (padrão: ${VARIAVEL_AMBIENTE_ARMAZEM} ou "
+                             f"{DIRETORIO_ARMAZEM_PADRAO} dentro de --base-dir)")
+    parser.add_argument('--base-dir', default='.', help="Diretório com as bases X/Y/parâmetros")
+    parser.add_argument('--force', action='store_true', help="Recompila mesmo se estiver atualizado")
+    args = parser.parse_args(argv)
+    for nome, segundos, status in compile_store(args.diretorio, args.base_dir, force=args.force):
+        print(f"{nome}: {status} em {segundos:.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
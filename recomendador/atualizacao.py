@@ -0,0 +1,333 @@
+"""Atualizações incrementais das bases: deltas versionados aplicados sem recarregar os .xlsx.
+
+Quando a equipe de simulação acrescenta cenários (ou as métricas de um ajuste novo), em
+vez de reexportar ``X_dados_*``/``Metricas_Y_*`` inteiros, publica um delta::
+
+    python -m recomendador.atualizacao MT --x novos_X.csv --y novos_Y.csv
+    python -m recomendador.atualizacao MT --y metricas_ajuste_50.csv
+    python -m recomendador.atualizacao MT --listar
+
+Cada delta vira um diretório numerado em ``deltas/<sistema>/`` (junto às bases), com
+os arquivos copiados e um manifesto. A publicação é atômica (o diretório só aparece
+completo, com o próximo número livre) e o delta é validado antes contra a base atual.
+
+* ``--x``: linhas novas de X (mesmas colunas de ``X_total``); nomes de cenário repetidos
+  são rejeitados;
+* ``--y``: métricas (``BAC_Ajuste_<id>``, ``FNR_Ajuste_<id>``, ``FPR_Ajuste_<id>``) casadas
+  com X pela coluna ``NomeCenario`` (cenários novos ou já existentes; ajustes novos
+  ganham colunas no tensor). Sem ``NomeCenario``, as linhas de Y casam pela posição com
+  as de ``--x``, como na carga completa.
+
+O ``Recommender`` aplica os deltas pendentes na carga e, a cada verificação das
+fontes, monta a versão seguinte da base ao lado da atual: só os grupos do índice
+tocados pelas linhas novas são refeitos e o tensor de métricas é estendido. A troca
+é a atribuição de um único objeto; requisições em andamento terminam na versão que
+já tinham em mãos, e o cache de resultados usa a versão na chave.
+
+Cada delta guarda o SHA-256 de X e Y de origem: quando os arquivos completos são
+reexportados (já com as linhas dos deltas), os deltas antigos deixam de valer.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .cache import file_sha256
+from .catalogo import SISTEMAS
+from .engine import METRICAS, PADRAO_COLUNA_METRICA, Database, DatabaseLoadError
+from .indice import COLUNAS_CATEGORICAS
+
+FORMATO_DELTA = 1
+DIRETORIO_DELTAS = 'deltas'
+MANIFESTO = 'delta.json'
+
+# SHA-256 dos arquivos de origem por (caminho, tamanho, mtime): a verificação periódica não relê os .xlsx
+_impressoes = {}
+_lock_impressoes = threading.Lock()
+
+
+def deltas_dir_for(config, base_dir='.'):
+    return os.path.join(base_dir, DIRETORIO_DELTAS, config.nome)
+
+
+def _sha256_memo(caminho):
+    st = os.stat(caminho)
+    chave = (os.path.abspath(caminho), st.st_size, st.st_mtime_ns)
+    with _lock_impressoes:
+        valor = _impressoes.get(chave)
+    if valor is None:
+        valor = file_sha256(caminho)
+        with _lock_impressoes:
+            _impressoes[chave] = valor
+    return valor
+
+
+def source_fingerprint(config, base_dir='.'):
+    """SHA-256 das bases X e Y de origem do sistema (os deltas só valem sobre elas)."""
+    return {tipo: _sha256_memo(os.path.join(base_dir, config.arquivos[tipo])) for tipo in ('x', 'y')}
+
+
+def _ler_manifesto(diretorio):
+    try:
+        with open(os.path.join(diretorio, MANIFESTO), encoding='utf-8') as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifesto.get('formato') != FORMATO_DELTA:
+        return None
+    return manifesto
+
+
+def _versoes(diretorio):
+    try:
+        nomes = os.listdir(diretorio)
+    except OSError:
+        return []
+    return sorted(int(nome) for nome in nomes if nome.isdigit())
+
+
+def list_deltas(config, base_dir='.', depois_de=0, impressao=None):
+    """Deltas publicados do sistema com versão maior que ``depois_de``: [(versão, diretório, manifesto)].
+
+    Com ``impressao`` (de ``source_fingerprint``), só os publicados sobre essas mesmas bases de origem.
+    """
+    diretorio = deltas_dir_for(config, base_dir)
+    deltas = []
+    for versao in _versoes(diretorio):
+        if versao <= depois_de:
+            continue
+        dir_delta = os.path.join(diretorio, f'{versao:06d}')
+        manifesto = _ler_manifesto(dir_delta)
+        if manifesto is None or (impressao is not None and manifesto['fontes'] != impressao):
+            continue
+        deltas.append((versao, dir_delta, manifesto))
+    return deltas
+
+
+def read_delta(diretorio, manifesto):
+    """(X novos ou None, Y ou None) de um delta publicado."""
+    from .ingestao import read_chunks  # ingestao importa o armazém, que importa o motor
+
+    def ler(tipo):
+        arquivo = manifesto['arquivos'].get(tipo)
+        if arquivo is None:
+            return None
+        partes = list(read_chunks(os.path.join(diretorio, arquivo)))
+        return pd.concat(partes, ignore_index=True) if partes else None
+
+    return ler('x'), ler('y')
+
+
+def _validar_x(x_novos, x_total_sim):
+    faltando = [c for c in x_total_sim.columns if c not in x_novos.columns]
+    if faltando:
+        raise ValueError(f"Colunas ausentes nas linhas novas de X: {faltando}")
+    x_novos = x_novos[list(x_total_sim.columns)].reset_index(drop=True)
+    try:
+        x_novos = x_novos.astype(x_total_sim.dtypes.to_dict())
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Valores inválidos nas linhas novas de X: {e}") from None
+    nomes = x_novos['NomeCenario']
+    # Busca pelo índice dos nomes da base (``isin`` percorre a base inteira em Python com strings do Arrow)
+    existentes = pd.Index(x_total_sim['NomeCenario']).get_indexer_for(nomes) >= 0
+    repetidos = sorted(set(nomes[nomes.duplicated()]) | set(nomes[existentes]))
+    if repetidos:
+        raise ValueError(f"Cenários já existentes ou repetidos nas linhas novas de X: {repetidos[:10]}")
+    return x_novos
+
+
+def _linhas_y(y_novos, x_total_sim, n_antigas, n_novas):
+    """Posição em X (já estendida) de cada linha de Y."""
+    if 'NomeCenario' in y_novos.columns:
+        linhas = pd.Index(x_total_sim['NomeCenario']).get_indexer(y_novos['NomeCenario'])
+        if (linhas < 0).any():
+            desconhecidos = y_novos['NomeCenario'][linhas < 0].tolist()
+            raise ValueError(f"Métricas de cenários que não estão em X: {desconhecidos[:10]}")
+        if len(np.unique(linhas)) != len(linhas):
+            raise ValueError("Cenários repetidos nas métricas do delta.")
+        return linhas
+    if len(y_novos) != n_novas:
+        raise ValueError("Sem a coluna NomeCenario, Y deve ter uma linha para cada linha nova de X "
+                         f"({len(y_novos)} != {n_novas}).")
+    return np.arange(n_antigas, n_antigas + n_novas)
+
+
+def _validar_candidatos(config, x_total_sim, metricas, coluna_ajuste, linhas):
+    # Sem as três métricas de um candidato, o cenário nunca o aprovaria (NaN não passa nos limiares)
+    if not len(linhas):
+        return
+    ajustes = list(config.ajustes_candidatos)
+    ausentes = np.isnan(metricas[linhas][:, [coluna_ajuste[a] for a in ajustes], :]).any(axis=2)
+    if ausentes.any():
+        cenarios = x_total_sim['NomeCenario'].iloc[linhas[ausentes.any(axis=1)]].tolist()
+        ajustes = [a for a, falta in zip(ajustes, ausentes.any(axis=0)) if falta]
+        raise ValueError(f"Métricas ausentes para os ajustes candidatos {ajustes} nos cenários {cenarios[:10]}")
+
+
+def apply_delta(base, x_novos=None, y_novos=None, versao=None):
+    """Nova ``Database`` com as linhas de ``x_novos`` e as métricas de ``y_novos`` (``base`` não muda).
+
+    O índice é estendido (``ScenarioIndex.extended``) e o tensor de métricas ganha as
+    linhas novas e as colunas dos ajustes que ainda não existiam (NaN onde não há valor).
+    Como na carga completa (``Database.load``), o delta é rejeitado (``ValueError``) se algum
+    cenário novo, ou com métricas trocadas, fica sem as métricas de um ajuste candidato.
+    """
+    x_total_sim = base.X_total_sim
+    n_antigas = len(x_total_sim)
+    indice = base.indice
+    n_novas = 0
+    if x_novos is not None and len(x_novos):
+        x_novos = _validar_x(x_novos, x_total_sim)
+        n_novas = len(x_novos)
+        # Base em W e V; entradas do usuário em kW e kV (como em ``NumericIndex.from_frame``)
+        indice = indice.extended(x_novos.iloc[:, COLUNAS_CATEGORICAS].to_numpy(),
+                                 x_novos.iloc[:, 1].to_numpy(dtype=float) / 1000.0,
+                                 x_novos.iloc[:, 2].to_numpy(dtype=float) / 1000.0,
+                                 x_novos.iloc[:, 3].to_numpy(dtype=float))
+        x_total_sim = pd.concat([x_total_sim, x_novos], ignore_index=True)
+
+    coluna_ajuste = dict(base.coluna_ajuste)
+    colunas_y = []
+    if y_novos is not None:
+        for nome in y_novos.columns:
+            encontrado = PADRAO_COLUNA_METRICA.match(str(nome))
+            if encontrado:
+                ajuste_id = int(encontrado.group(2))
+                coluna_ajuste.setdefault(ajuste_id, len(coluna_ajuste))
+                colunas_y.append((nome, coluna_ajuste[ajuste_id], METRICAS.index(encontrado.group(1))))
+        if not colunas_y:
+            raise ValueError("Nenhuma coluna de métrica (BAC_Ajuste_<id>, FNR_..., FPR_...) no Y do delta.")
+
+    metricas = base.metricas
+    if n_novas or len(coluna_ajuste) > metricas.shape[1]:
+        # Só a parte nova é preenchida com NaN: o resto é sobrescrito pela cópia das métricas atuais
+        n_colunas = base.metricas.shape[1]
+        metricas = np.empty((len(x_total_sim), len(coluna_ajuste), len(METRICAS)), dtype=base.metricas.dtype)
+        metricas[:n_antigas, :n_colunas] = base.metricas
+        metricas[:n_antigas, n_colunas:] = np.nan
+        metricas[n_antigas:] = np.nan
+    elif colunas_y:
+        # Só valores de cenários existentes mudam: cópia, para não alterar a versão anterior
+        metricas = np.array(metricas)
+    linhas = np.empty(0, dtype=np.intp)
+    if colunas_y:
+        linhas = _linhas_y(y_novos, x_total_sim, n_antigas, n_novas)
+        for nome, coluna, m in colunas_y:
+            metricas[linhas, coluna, m] = pd.to_numeric(y_novos[nome], errors='coerce').to_numpy(dtype=float)
+    _validar_candidatos(base.config, x_total_sim, metricas, coluna_ajuste,
+                        np.union1d(np.arange(n_antigas, len(x_total_sim)), linhas))
+
+    return Database(base.config, base.df_params, x_total_sim, indice, metricas, coluna_ajuste,
+                    base.versao + 1 if versao is None else versao)
+
+
+def apply_pending(base, base_dir='.'):
+    """``base`` com todos os deltas publicados depois da sua versão (a própria ``base`` se não houver)."""
+    config = base.config
+    if not _versoes(deltas_dir_for(config, base_dir)):
+        return base
+    for versao, diretorio, manifesto in list_deltas(config, base_dir, base.versao, source_fingerprint(config, base_dir)):
+        try:
+            base = apply_delta(base, *read_delta(diretorio, manifesto), versao=versao)
+        except (OSError, ValueError) as e:
+            raise DatabaseLoadError(f"Erro ao aplicar a atualização {versao} de {config.nome}: {e}") from e
+    return base
+
+
+def _copiar_atomico(origem, destino):
+    shutil.copyfile(origem, f'{destino}.parcial')
+    os.replace(f'{destino}.parcial', destino)
+
+
+def publish_delta(config, base_dir='.', x_file=None, y_file=None):
+    """Valida o delta contra a base atual (com os deltas anteriores) e o publica com a próxima versão.
+
+    Retorna o manifesto gravado.
+    """
+    if x_file is None and y_file is None:
+        raise ValueError("Informe as linhas novas de X, as métricas de Y ou ambas.")
+    from .ingestao import read_chunks
+
+    lidos = {}
+    for tipo, caminho in (('x', x_file), ('y', y_file)):
+        if caminho is not None:
+            partes = list(read_chunks(caminho))
+            lidos[tipo] = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    atual = apply_pending(Database.load(config, base_dir), base_dir)
+    apply_delta(atual, lidos.get('x'), lidos.get('y'))
+
+    diretorio = deltas_dir_for(config, base_dir)
+    os.makedirs(diretorio, exist_ok=True)
+    tmp = os.path.join(diretorio, f'.{os.getpid()}.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    manifesto = {
+        'formato': FORMATO_DELTA,
+        'sistema': config.nome,
+        'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'fontes': source_fingerprint(config, base_dir),
+        'arquivos': {},
+        'linhas_x': len(lidos['x']) if 'x' in lidos else 0,
+        'linhas_y': len(lidos['y']) if 'y' in lidos else 0,
+    }
+    try:
+        for tipo, caminho in (('x', x_file), ('y', y_file)):
+            if caminho is not None:
+                manifesto['arquivos'][tipo] = tipo + os.path.splitext(caminho)[1].lower()
+                _copiar_atomico(caminho, os.path.join(tmp, manifesto['arquivos'][tipo]))
+        # Próximo número livre; se outro processo publicou antes, o rename falha e tenta o seguinte
+        versao = max(_versoes(diretorio), default=0)
+        while True:
+            versao += 1
+            manifesto['versao'] = versao
+            with open(os.path.join(tmp, MANIFESTO), 'w', encoding='utf-8') as f:
+                json.dump(manifesto, f, ensure_ascii=False, indent=1)
+            try:
+                os.rename(tmp, os.path.join(diretorio, f'{versao:06d}'))
+                break
+            except OSError:
+                if not os.path.isdir(os.path.join(diretorio, f'{versao:06d}')):
+                    raise
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return manifesto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publica atualizações incrementais das bases X/Y de um sistema.")
+    parser.add_argument('sistema', choices=sorted(SISTEMAS), help="Sistema do catálogo")
+    parser.add_argument('--base-dir', default='.', help="Diretório com as bases X/Y/parâmetros")
+    parser.add_argument('--x', default=None, help="Linhas novas de X (.csv, .parquet ou .xlsx)")
+    parser.add_argument('--y', default=None, help="Métricas das linhas novas ou de ajustes novos (.csv, .parquet ou .xlsx)")
+    parser.add_argument('--listar', action='store_true', help="Lista os deltas publicados e sai")
+    args = parser.parse_args(argv)
+
+    config = SISTEMAS[args.sistema]
+    if args.listar:
+        impressao = source_fingerprint(config, args.base_dir)
+        validos = {versao for versao, _, _ in list_deltas(config, args.base_dir, impressao=impressao)}
+        for versao, _, manifesto in list_deltas(config, args.base_dir):
+            estado = 'ativo' if versao in validos else 'obsoleto (bases de origem mudaram)'
+            print(f"{versao:6d}  {manifesto['criado_em']}  X +{manifesto['linhas_x']}  "
+                  f"Y {manifesto['linhas_y']}  {estado}")
+        return 0
+    if args.x is None and args.y is None:
+        parser.error("informe --x, --y ou --listar")
+    try:
+        manifesto = publish_delta(config, args.base_dir, args.x, args.y)
+    except (ValueError, DatabaseLoadError) as e:
+        parser.exit(1, f"Delta rejeitado: {e}\n")
+    print(f"{config.nome}: versão {manifesto['versao']} publicada "
+          f"(X +{manifesto['linhas_x']} linhas, Y {manifesto['linhas_y']} linhas)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,443 @@
+"""Recomendação em lote a partir de um arquivo de cenários (CSV, Parquet ou Excel).
+
+Uso::
+
+    python -m recomendador.batch cenarios.csv recomendacoes.csv
+
+Colunas esperadas na entrada: ``capacidade_kw``, ``tensao_kv``, ``tipo_gd``,
+``bloqueio_tensao``, ``req_suportabilidade``, ``tecnica_ativa``,
+``curva_regulacao``, ``cenario_geracao`` e, opcionalmente, ``inercia`` (vazio =
+inércia desconhecida). As colunas categóricas aceitam tanto os textos da barra
+lateral do app quanto os códigos numéricos.
+
+Linhas repetidas são resolvidas uma única vez, e a avaliação de métricas/regras
+é reaproveitada entre linhas que caem nos mesmos cenários simulados. Com
+``--workers N`` os cenários únicos são divididos entre N processos, que abrem as
+bases gravadas no formato do armazém (``armazem``) em modo somente leitura via mmap.
+
+Com ``--top-k``, ``--pesos`` ou ``--pareto``, a saída ganha o ranking dos ajustes
+válidos e os quase aprovados (``pontuacao.Scoring``), pontuados numa única passada
+vetorizada sobre as avaliações de cada sistema.
+
+Com ``--vizinhos K``, as métricas de cada linha vêm dos K cenários simulados mais
+próximos do grupo categórico, ponderadas pelo inverso da distância; as consultas de
+um mesmo grupo vão juntas para a árvore k-d do grupo.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .armazem import open_database, save_database
+from .catalogo import (
+    INERCIA_DESCONHECIDA, bloqueio_tensao_map, cenario_geracao_map, curvas_regulacao_map,
+    req_suportabilidade_map, system_name_for, tecnica_ativa_map, tipo_gd_map, valid_adjustments,
+)
+from .engine import (
+    HEADER_DROPOUT, HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO, METRICAS, MODO_MEDIA, MODO_UNICO,
+    MODO_VIZINHOS, STATUS_INCONSISTENTE, STATUS_OK, STATUS_SEM_AJUSTE, STATUS_SEM_CENARIO, Recommender,
+    Scenario, inverse_distance_weights, mean_metrics, validate_scenario, weighted_metrics,
+)
+from .pontuacao import K_PADRAO, PESOS_PADRAO, Scoring
+from .saida import COLUNAS_PONTUACAO, COLUNAS_SAIDA, STATUS_ENTRADA_INVALIDA, output_row, plain_text
+
+COLUNAS_CATEGORICAS = [
+    ('tipo_gd', tipo_gd_map),
+    ('bloqueio_tensao', bloqueio_tensao_map),
+    ('req_suportabilidade', req_suportabilidade_map),
+    ('tecnica_ativa', tecnica_ativa_map),
+    ('curva_regulacao', curvas_regulacao_map),
+    ('cenario_geracao', cenario_geracao_map),
+]
+COLUNAS_NUMERICAS = ['capacidade_kw', 'tensao_kv']
+COLUNA_INERCIA = 'inercia'
+
+# Ordem dos campos de Scenario
+CAMPOS_CENARIO = ['capacidade_kw', 'tensao_kv'] + [nome for nome, _ in COLUNAS_CATEGORICAS] + [COLUNA_INERCIA]
+
+def read_scenarios(caminho):
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.parquet':
+        return pd.read_parquet(caminho)
+    if extensao in ('.xlsx', '.xls'):
+        return pd.read_excel(caminho)
+    return pd.read_csv(caminho)
+
+
+def write_results(df, caminho):
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.parquet':
+        df.to_parquet(caminho, index=False)
+    elif extensao in ('.xlsx', '.xls'):
+        df.to_excel(caminho, index=False)
+    else:
+        df.to_csv(caminho, index=False)
+
+
+def category_label(valor, mapa, mapa_inv):
+    """Texto do mapa para um valor de entrada (texto ou código numérico); None se inválido."""
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if valor in mapa:
+            return valor
+        try:
+            valor = float(valor)
+        except ValueError:
+            return None
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        return None
+    if np.isnan(valor) or not valor.is_integer():
+        return None
+    return mapa_inv.get(int(valor))
+
+
+def normalize_categorical(serie, mapa):
+    """Converte uma coluna (textos ou códigos) para os textos do mapa; inválidos viram None."""
+    mapa_inv = {v: k for k, v in mapa.items()}
+    fatores, unicos = pd.factorize(serie, use_na_sentinel=True)
+    rotulos = np.array([category_label(v, mapa, mapa_inv) for v in unicos] + [None], dtype=object)
+    return rotulos[fatores]
+
+
+class CompiledSystem:
+    """Arrays de uma ``Database`` usados no lote e na tabela pré-computada: índice, métricas e
+    parâmetros dos candidatos.
+
+    Os processos de trabalho abrem a base no formato do armazém (``armazem.open_database``,
+    ``mmap_mode='r'``) e passam a compartilhar as mesmas páginas (somente leitura): as métricas
+    dos candidatos são lidas do tensor da base a cada avaliação, sem cópia.
+    """
+
+    def __init__(self, base):
+        config = base.config
+        self.config = config
+        self.indice = base.indice
+        self.metricas = base.metricas
+        self.colunas = base.candidate_columns
+        self.aprovacao = base.aprovacao
+        self.ajustes = np.array(config.ajustes_candidatos)
+        self.labels = [config.label(a) for a in config.ajustes_candidatos]
+        self.nomes = base.X_total_sim['NomeCenario'].astype(str).to_numpy(dtype=str)
+        # Equivalente ao merge "left" com a base de parâmetros
+        self.parametros = base.df_params.reindex(self.ajustes)[
+            [HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO, HEADER_DROPOUT]].to_numpy(dtype=float)
+
+    def elegiveis(self, bloqueio_codigo, req_sup_codigo):
+        return self.config.eligible(bloqueio_codigo, req_sup_codigo)
+
+    def evaluate(self, posicoes, bloqueio_codigo, req_sup_codigo, pesos=None):
+        """Retorna (índice do vencedor ou None, métricas por candidato [n_ajustes x 3])."""
+        bloco = self.metricas[posicoes][:, self.colunas, :].reshape(len(posicoes), -1)
+        valores = (mean_metrics(bloco) if pesos is None
+                   else weighted_metrics(bloco, pesos)).reshape(len(self.colunas), len(METRICAS))
+        # Cenário único: os limiares já estão no bitmap de aprovação
+        aprovacao = self.aprovacao[posicoes[0]] if pesos is None and len(posicoes) == 1 else None
+        ordem = valid_adjustments(self.config, valores, bloqueio_codigo, req_sup_codigo, aprovacao)
+        return (int(ordem[0]) if len(ordem) else None), valores
+
+
+class _AvaliadorLote:
+    """Resolve cenários únicos reaproveitando validação e avaliação entre linhas."""
+
+    def __init__(self, sistemas, system_for=system_name_for, vizinhos=None):
+        self.sistemas = sistemas
+        self.system_for = system_for
+        # k do modo k-NN (None = cascata de empates exatos, como no app)
+        self.vizinhos = vizinhos
+        self._validacoes = {}
+        self._avaliacoes = {}
+
+    def _inconsistencias(self, cenario):
+        chave = (cenario.tipo_gd, cenario.tecnica_ativa, cenario.cenario_geracao)
+        inconsistencias = self._validacoes.get(chave)
+        if inconsistencias is None:
+            inconsistencias = validate_scenario(cenario)
+            self._validacoes[chave] = inconsistencias
+        return inconsistencias
+
+    def _avaliar(self, nome_sistema, posicoes, codigos, pesos=None):
+        chave = (nome_sistema, posicoes.tobytes(), codigos[1], codigos[2],
+                 None if pesos is None else pesos.tobytes())
+        linha = self._avaliacoes.get(chave)
+        if linha is not None:
+            return linha
+
+        sistema = self.sistemas[nome_sistema]
+        vencedor, valores = sistema.evaluate(posicoes, codigos[1], codigos[2], pesos)
+        linha = output_row(nome_sistema, STATUS_OK if vencedor is not None else STATUS_SEM_AJUSTE)
+        if pesos is not None:
+            linha['modo'] = MODO_VIZINHOS
+        else:
+            linha['modo'] = MODO_UNICO if len(posicoes) == 1 else MODO_MEDIA
+        linha['n_cenarios'] = len(posicoes)
+        linha['cenario_proximo'] = '; '.join(sistema.nomes[posicoes].tolist())
+        # Métricas e elegibilidade por candidato, para a pontuação do lote (fora das colunas de saída)
+        linha['_valores'] = valores
+        linha['_elegiveis'] = sistema.elegiveis(codigos[1], codigos[2])
+        if vencedor is None:
+            linha['mensagem'] = "Nenhum ajuste cumpriu todos os critérios de regras e desempenho."
+        else:
+            linha['vencedor'] = sistema.labels[vencedor]
+            linha['Ajuste_ID'] = sistema.ajustes[vencedor].item()
+            linha['BAC'], linha['FNR'], linha['FPR'] = valores[vencedor].tolist()
+            (linha[HEADER_ROCOF], linha[HEADER_TEMPO],
+             linha[HEADER_TENSAO_BLOQUEIO], linha[HEADER_DROPOUT]) = sistema.parametros[vencedor].tolist()
+        self._avaliacoes[chave] = linha
+        return linha
+
+    def _linha_inconsistente(self, cenario):
+        inconsistencias = self._inconsistencias(cenario)
+        if inconsistencias:
+            return output_row(None, STATUS_INCONSISTENTE, ' | '.join(plain_text(m) for m in inconsistencias))
+        return None
+
+    @staticmethod
+    def _sem_cenario(nome_sistema):
+        return output_row(nome_sistema, STATUS_SEM_CENARIO,
+                            "Nenhum cenário compatível foi encontrado com os filtros fornecidos.")
+
+    def resolve(self, cenario):
+        if self.vizinhos is not None:
+            return self._resolve_vizinhos([cenario])[0]
+        linha = self._linha_inconsistente(cenario)
+        if linha is not None:
+            return linha
+
+        nome_sistema = self.system_for(cenario.tensao_kv)
+        codigos = cenario.categorical_codes()
+        posicoes = self.sistemas[nome_sistema].indice.nearest(
+            codigos, cenario.capacidade_kw, cenario.tensao_kv, cenario.inercia_busca)
+        if len(posicoes) == 0:
+            return self._sem_cenario(nome_sistema)
+        return self._avaliar(nome_sistema, posicoes, codigos)
+
+    def _resolve_vizinhos(self, cenarios):
+        """Modo k-NN: uma consulta em lote por sistema (``ScenarioIndex.nearest_k_many``)."""
+        linhas = [None] * len(cenarios)
+        por_sistema = {}
+        for i, cenario in enumerate(cenarios):
+            linhas[i] = self._linha_inconsistente(cenario)
+            if linhas[i] is None:
+                por_sistema.setdefault(self.system_for(cenario.tensao_kv), []).append(i)
+        for nome_sistema, indices in por_sistema.items():
+            codigos = [cenarios[i].categorical_codes() for i in indices]
+            alvos = [(cenarios[i].capacidade_kw, cenarios[i].tensao_kv, cenarios[i].inercia_busca) for i in indices]
+            vizinhos = self.sistemas[nome_sistema].indice.nearest_k_many(codigos, alvos, self.vizinhos)
+            for i, codigos_i, (posicoes, distancias) in zip(indices, codigos, vizinhos):
+                if len(posicoes) == 0:
+                    linhas[i] = self._sem_cenario(nome_sistema)
+                else:
+                    linhas[i] = self._avaliar(nome_sistema, posicoes, codigos_i, inverse_distance_weights(distancias))
+        return linhas
+
+    def resolve_many(self, unicos):
+        if self.vizinhos is not None:
+            return self._resolve_vizinhos([Scenario(*valores) for valores in unicos])
+        return [self.resolve(Scenario(*valores)) for valores in unicos]
+
+
+# Estado de cada processo de trabalho (montado uma vez, no inicializador do pool)
+_avaliador_processo = None
+
+
+def _iniciar_processo(diretorios, registro, vizinhos=None):
+    global _avaliador_processo
+    sistemas = {nome: CompiledSystem(open_database(config, diretorio))
+                for nome, (config, diretorio) in diretorios.items()}
+    # Faixas de tensão do Recommender que chamou o lote, não as do catálogo global
+    _avaliador_processo = _AvaliadorLote(sistemas, lambda tensao_kv: system_name_for(tensao_kv, registro), vizinhos)
+
+
+def _resolver_bloco(unicos):
+    return _avaliador_processo.resolve_many(unicos)
+
+
+def _resolve_parallel(bases, unicos, workers, registro, vizinhos=None):
+    """Distribui os cenários únicos entre processos; a ordem da saída é a da entrada.
+
+    ``bases`` ({sistema: ``Database``}) vão para um armazém temporário, aberto por cada processo.
+    ``registro`` são as configurações de sistema (faixas de tensão) do ``Recommender``.
+    """
+    n_blocos = min(len(unicos), workers * 4)
+    limites = np.linspace(0, len(unicos), n_blocos + 1).astype(int)
+    blocos = [unicos[a:b] for a, b in zip(limites[:-1], limites[1:])]
+    with tempfile.TemporaryDirectory(prefix='recomendador_lote_') as tmp:
+        diretorios = {}
+        for nome, base in bases.items():
+            diretorios[nome] = (base.config, os.path.join(tmp, nome))
+            save_database(base, diretorios[nome][1], base_dir=None)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_processo,
+                                 initargs=(diretorios, registro, vizinhos)) as pool:
+            return [linha for linhas in pool.map(_resolver_bloco, blocos) for linha in linhas]
+
+
+def prepare_scenarios(cenarios):
+    """Normaliza as colunas de entrada. Retorna (entradas normalizadas, mensagens de erro por linha)."""
+    obrigatorias = COLUNAS_NUMERICAS + [nome for nome, _ in COLUNAS_CATEGORICAS]
+    faltando = [c for c in obrigatorias if c not in cenarios.columns]
+    if faltando:
+        raise ValueError(f"Colunas ausentes no arquivo de cenários: {faltando}")
+
+    entradas = pd.DataFrame(index=cenarios.index)
+    erros = pd.Series('', index=cenarios.index, dtype=object)
+    for nome in COLUNAS_NUMERICAS:
+        entradas[nome] = pd.to_numeric(cenarios[nome], errors='coerce').astype(float)
+        erros[entradas[nome].isna()] += f"{nome} inválido; "
+    for nome, mapa in COLUNAS_CATEGORICAS:
+        entradas[nome] = normalize_categorical(cenarios[nome], mapa)
+        erros[entradas[nome].isna()] += f"{nome} inválido; "
+
+    if COLUNA_INERCIA in cenarios.columns:
+        inercia = pd.to_numeric(cenarios[COLUNA_INERCIA], errors='coerce').to_numpy(dtype=float)
+    else:
+        inercia = np.full(len(cenarios), np.nan)
+    # Mesmo valor de H usado pelo motor: GBI não usa H; vazio = inércia desconhecida
+    sincrono = (entradas['tipo_gd'] == 'Gerador Síncrono').to_numpy()
+    entradas[COLUNA_INERCIA] = np.where(~sincrono, 0.0, np.where(np.isnan(inercia), INERCIA_DESCONHECIDA, inercia))
+    return entradas, erros.str.rstrip('; ')
+
+
+def _pontuar(recomendador, linhas, pontuacao):
+    """Preenche ``ranking`` e ``quase_aprovados`` das linhas avaliadas, um ``rank`` por sistema."""
+    por_sistema = {}
+    vistas = set()
+    for linha in linhas:
+        # Linhas que caem na mesma avaliação compartilham o mesmo dicionário
+        if '_valores' in linha and id(linha) not in vistas:
+            vistas.add(id(linha))
+            por_sistema.setdefault(linha['sistema'], []).append(linha)
+    for nome, avaliadas in por_sistema.items():
+        config = recomendador.sistemas[nome]
+        labels = [config.label(a) for a in config.ajustes_candidatos]
+        ranking = pontuacao.rank(np.stack([linha['_valores'] for linha in avaliadas]),
+                                 np.stack([linha['_elegiveis'] for linha in avaliadas]))
+        for i, linha in enumerate(avaliadas):
+            pontos, folgas = ranking.pontuacoes[i], ranking.folgas[i]
+            linha['ranking'] = '; '.join(f"{labels[j]} ({pontos[j]:.2f})" for j in ranking.topo[i] if j >= 0)
+            linha['quase_aprovados'] = '; '.join(
+                f"{labels[j]} (" + ', '.join(f"{metrica} {folgas[j, m]:+.2f}"
+                                             for m, metrica in enumerate(METRICAS) if folgas[j, m] <= 0)
+                + ")"
+                for j in ranking.quase[i] if j >= 0)
+
+
+def recommend_batch(recomendador, cenarios, workers=1, pontuacao=None, vizinhos=None):
+    """Uma linha de saída (vencedor, métricas e parâmetros) por linha de ``cenarios``.
+
+    Com ``workers > 1`` os cenários únicos são resolvidos em um pool de processos; o
+    resultado é idêntico, linha a linha, ao da execução serial. Com ``pontuacao`` (um
+    ``pontuacao.Scoring``), entram as colunas ``ranking`` (top-k dos válidos, com a
+    pontuação) e ``quase_aprovados`` (elegíveis reprovados e a folga de cada métrica
+    que ficou fora do limiar). Com ``vizinhos`` = k, cada linha usa a média dos k
+    cenários simulados mais próximos, ponderada pelo inverso da distância (modo
+    ``vizinhos``), como ``Recommender.recommend(cenario, vizinhos=k)``.
+    """
+    if vizinhos is not None:
+        if int(vizinhos) < 1:
+            raise ValueError(f"O número de vizinhos deve ser pelo menos 1: {vizinhos!r}")
+        vizinhos = int(vizinhos)
+    entradas, erros = prepare_scenarios(cenarios)
+    sistema_por_tensao = {}
+    for tensao in entradas['tensao_kv'].dropna().unique():
+        try:
+            sistema_por_tensao[tensao] = recomendador.system_for(tensao)
+        except ValueError as e:
+            sistema_por_tensao[tensao] = None
+            erros[(entradas['tensao_kv'] == tensao) & (erros == '')] = str(e)
+    validas = (erros == '').to_numpy()
+
+    linhas = []
+    posicao = np.zeros(len(cenarios), dtype=np.int64)
+    if validas.any():
+        recomendador.check_sources()
+        # Cada combinação distinta de entradas é resolvida uma única vez
+        ids, unicos = pd.MultiIndex.from_frame(entradas[validas][CAMPOS_CENARIO]).factorize()
+        unicos = list(unicos)
+        por_sistema = {}
+        for i, valores in enumerate(unicos):
+            por_sistema.setdefault(sistema_por_tensao[valores[1]], []).append(i)
+        # Um sistema por vez: só a base da vez precisa estar em memória
+        linhas = [None] * len(unicos)
+        for nome in sorted(por_sistema):
+            indices = por_sistema[nome]
+            base = recomendador.database(nome)
+            subconjunto = [unicos[i] for i in indices]
+            if workers > 1 and len(subconjunto) > 1:
+                resolvidas = _resolve_parallel({nome: base}, subconjunto, workers, recomendador.sistemas, vizinhos)
+            else:
+                resolvidas = _AvaliadorLote({nome: CompiledSystem(base)}, recomendador.system_for,
+                                            vizinhos).resolve_many(subconjunto)
+            for i, linha in zip(indices, resolvidas):
+                linhas[i] = linha
+            del base
+        posicao[validas] = ids
+        if pontuacao is not None:
+            _pontuar(recomendador, linhas, pontuacao)
+    posicao[~validas] = len(linhas)
+    linhas.append(output_row(None, STATUS_ENTRADA_INVALIDA))
+
+    colunas = COLUNAS_SAIDA if pontuacao is None else COLUNAS_SAIDA + COLUNAS_PONTUACAO
+    saida = pd.DataFrame(linhas, columns=colunas).iloc[posicao]
+    saida.index = cenarios.index
+    saida.loc[~validas, 'mensagem'] = erros[~validas]
+    saida['Ajuste_ID'] = saida['Ajuste_ID'].astype('Int64')
+    return pd.concat([cenarios, saida], axis=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recomendação de ajustes em lote.")
+    parser.add_argument('entrada', help="Arquivo de cenários (.csv, .parquet ou .xlsx)")
+    parser.add_argument('saida', help="Arquivo de saída (.csv, .parquet ou .xlsx)")
+    parser.add_argument('--base-dir', default='.', help="Diretório com as bases X/Y/parâmetros")
+    parser.add_argument('--compilada', action='append', default=[], metavar='SISTEMA=DIR',
+                        help="Usa a base gravada pela ingestão em blocos (python -m recomendador.ingestao) "
+                             "no lugar das planilhas do sistema; pode ser repetido")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processos em paralelo (0 = um por núcleo; padrão: 1, serial)")
+    parser.add_argument('--top-k', type=int, default=None,
+                        help=f"Inclui o ranking dos k melhores ajustes válidos e os k quase aprovados (padrão: {K_PADRAO})")
+    parser.add_argument('--pesos', default=None, metavar='BAC,FNR,FPR',
+                        help="Pesos da pontuação do ranking (padrão: %s)" % ','.join(f'{p:g}' for p in PESOS_PADRAO))
+    parser.add_argument('--pareto', action='store_true',
+                        help="Ordena o ranking pelas frentes de Pareto de BAC, FNR e FPR")
+    parser.add_argument('--vizinhos', type=int, default=None, metavar='K',
+                        help="Média dos K cenários simulados mais próximos, ponderada pelo inverso da distância")
+    args = parser.parse_args(argv)
+    if args.vizinhos is not None and args.vizinhos < 1:
+        parser.error("--vizinhos deve ser pelo menos 1")
+    compiladas = {}
+    for valor in args.compilada:
+        sistema, separador, diretorio = valor.partition('=')
+        if not separador or not sistema or not diretorio:
+            parser.error(f"--compilada deve ser SISTEMA=DIR: {valor!r}")
+        compiladas[sistema] = diretorio
+
+    pontuacao = None
+    if args.top_k is not None or args.pesos is not None or args.pareto:
+        try:
+            pesos = PESOS_PADRAO if args.pesos is None else tuple(float(p) for p in args.pesos.split(','))
+            pontuacao = Scoring(pesos, args.pareto, K_PADRAO if args.top_k is None else args.top_k)
+        except ValueError as e:
+            parser.error(str(e))
+
+    t0 = time.perf_counter()
+    cenarios = read_scenarios(args.entrada)
+    workers = args.workers or os.cpu_count() or 1
+    recomendador = Recommender(base_dir=args.base_dir, compiladas=compiladas)
+    resultado = recommend_batch(recomendador, cenarios, workers=workers, pontuacao=pontuacao, vizinhos=args.vizinhos)
+    write_results(resultado, args.saida)
+    segundos = time.perf_counter() - t0
+    print(f"{len(resultado)} cenários em {segundos:.2f} s -> {args.saida}")
+    print(resultado['status'].value_counts().to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""Cache colunar em disco para as bases .xlsx do recomendador.
+
+Cada planilha (arquivo + aba) é compilada uma única vez para blocos ``.npy``
+(um por coluna) acompanhados de um manifesto JSON com o tamanho, o mtime e o
+hash SHA-256 do arquivo de origem. Nas cargas seguintes os blocos são lidos
+diretamente, e o ``pd.read_excel`` só volta a ser chamado quando o arquivo de
+origem muda de conteúdo.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+FORMATO_CACHE = 1
+DIRETORIO_CACHE_PADRAO = '.cache_bases'
+VARIAVEL_AMBIENTE_CACHE = 'RECOMENDADOR_CACHE_DIR'
+
+# Planilhas usadas pelo app (arquivo, aba)
+PLANILHAS_PADRAO = [
+    ('results_AT_DT.xlsx', 0),
+    ('X_dados_AT.xlsx', 'X_total'),
+    ('Metricas_Y_AT.xlsx', 0),
+    ('results_MT_DT.xlsx', 0),
+    ('X_dados_MT.xlsx', 'X_total'),
+    ('Metricas_Y_MT.xlsx', 0),
+]
+
+
+def cache_dir_for(file_path, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.environ.get(VARIAVEL_AMBIENTE_CACHE)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), DIRETORIO_CACHE_PADRAO)
+    return cache_dir
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for bloco in iter(lambda: f.read(block_size), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _chave(file_path, sheet_name):
+    nome = os.path.splitext(os.path.basename(file_path))[0]
+    return f"{nome}__{sheet_name}"
+
+
+def _caminho_manifesto(cache_dir, chave):
+    return os.path.join(cache_dir, chave + '.json')
+
+
+def _ler_manifesto(cache_dir, chave):
+    try:
+        with open(_caminho_manifesto(cache_dir, chave), encoding='utf-8') as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifesto.get('formato') != FORMATO_CACHE:
+        return None
+    return manifesto
+
+
+def _gravar_json_atomico(caminho, dados):
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, caminho)
+
+
+def _manifesto_atual(file_path, sheet_name, cache_dir):
+    """Retorna o manifesto válido para o arquivo, ou None se o cache estiver velho."""
+    chave = _chave(file_path, sheet_name)
+    manifesto = _ler_manifesto(cache_dir, chave)
+    if manifesto is None:
+        return None
+    st_fonte = os.stat(file_path)
+    if manifesto['tamanho'] == st_fonte.st_size and manifesto['mtime_ns'] == st_fonte.st_mtime_ns:
+        return manifesto
+    # mtime mudou (ex.: checkout ou cópia): só recompila se o conteúdo mudou
+    if manifesto['tamanho'] == st_fonte.st_size and manifesto['sha256'] == file_sha256(file_path):
+        manifesto['mtime_ns'] = st_fonte.st_mtime_ns
+        try:
+            _gravar_json_atomico(_caminho_manifesto(cache_dir, chave), manifesto)
+        except OSError:
+            pass
+        return manifesto
+    return None
+
+
+def column_to_array(serie):
+    """Valores de uma coluna prontos para um .npy e a máscara de nulos (None se não há nulos).
+
+    Colunas numéricas, booleanas e de datas vão como estão; colunas de texto vão como texto
+    (nulos = ''). Qualquer outra coluna (ex.: números e textos misturados) não voltaria igual
+    do .npy e levanta ``ValueError``: quem grava cai de volta na planilha.
+    """
+    if (pd.api.types.is_numeric_dtype(serie.dtype) or pd.api.types.is_bool_dtype(serie.dtype)
+            or pd.api.types.is_datetime64_dtype(serie.dtype)):
+        return serie.to_numpy(), None
+    nulos = serie.isna().to_numpy()
+    if not (pd.api.types.is_object_dtype(serie.dtype) or pd.api.types.is_string_dtype(serie.dtype)) \
+            or not all(isinstance(v, str) for v in serie.to_numpy()[~nulos]):
+        raise ValueError(f"Coluna {serie.name!r} ({serie.dtype}) não pode ser gravada sem perda de tipos")
+    valores = serie.astype(object).where(~nulos, '').astype(str).to_numpy(dtype=str)
+    return valores, (nulos if nulos.any() else None)
+
+
+def _validar_nomes(colunas):
+    # Os nomes vão para o manifesto JSON e precisam voltar iguais
+    for nome in colunas:
+        if not isinstance(nome, (str, int)) or isinstance(nome, bool):
+            raise ValueError(f"Nome de coluna {nome!r} não pode ser gravado no manifesto")
+
+
+def write_cache(df, file_path, sheet_name=0, cache_dir=None, sha256=None):
+    """Compila um DataFrame lido de ``file_path`` para blocos .npy no cache."""
+    cache_dir = cache_dir_for(file_path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    chave = _chave(file_path, sheet_name)
+    st_fonte = os.stat(file_path)
+    if sha256 is None:
+        sha256 = file_sha256(file_path)
+    # Convertidas antes de criar o diretório: uma coluna que não pode ser gravada não deixa lixo
+    _validar_nomes(df.columns)
+    arrays = [column_to_array(df[nome]) for nome in df.columns]
+
+    nome_blocos = f"{chave}.{sha256[:16]}"
+    dir_final = os.path.join(cache_dir, nome_blocos)
+    dir_tmp = f"{dir_final}.{os.getpid()}.tmp"
+    shutil.rmtree(dir_tmp, ignore_errors=True)
+    os.makedirs(dir_tmp)
+
+    colunas = []
+    for i, (nome, (valores, nulos)) in enumerate(zip(df.columns, arrays)):
+        arquivo = f"col_{i:04d}.npy"
+        np.save(os.path.join(dir_tmp, arquivo), valores, allow_pickle=False)
+        coluna = {'nome': nome, 'arquivo': arquivo}
+        if nulos is not None:
+            coluna['nulos'] = f"nulos_{i:04d}.npy"
+            np.save(os.path.join(dir_tmp, coluna['nulos']), nulos, allow_pickle=False)
+        colunas.append(coluna)
+
+    if os.path.isdir(dir_final):
+        # Outro processo já compilou o mesmo conteúdo
+        shutil.rmtree(dir_tmp, ignore_errors=True)
+    else:
+        os.replace(dir_tmp, dir_final)
+
+    manifesto_antigo = _ler_manifesto(cache_dir, chave)
+    manifesto = {
+        'formato': FORMATO_CACHE,
+        'fonte': os.path.basename(file_path),
+        'aba': sheet_name,
+        'tamanho': st_fonte.st_size,
+        'mtime_ns': st_fonte.st_mtime_ns,
+        'sha256': sha256,
+        'blocos': nome_blocos,
+        'linhas': int(len(df)),
+        'colunas': colunas,
+    }
+    _gravar_json_atomico(_caminho_manifesto(cache_dir, chave), manifesto)
+
+    if manifesto_antigo is not None and manifesto_antigo['blocos'] != nome_blocos:
+        shutil.rmtree(os.path.join(cache_dir, manifesto_antigo['blocos']), ignore_errors=True)
+    return manifesto
+
+
+def read_cache(manifesto, cache_dir):
+    dir_blocos = os.path.join(cache_dir, manifesto['blocos'])
+    dados = {}
+    for coluna in manifesto['colunas']:
+        valores = np.load(os.path.join(dir_blocos, coluna['arquivo']), allow_pickle=False)
+        if 'nulos' in coluna:
+            nulos = np.load(os.path.join(dir_blocos, coluna['nulos']), allow_pickle=False)
+            valores = pd.Series(valores).where(~nulos).to_numpy()
+        dados[coluna['nome']] = valores
+    return pd.DataFrame(dados, columns=[c['nome'] for c in manifesto['colunas']])
+
+
+def read_excel_cached(file_path, sheet_name=0, cache_dir=None):
+    """Equivalente a ``pd.read_excel(file_path, sheet_name=...)`` usando o cache colunar.
+
+    O xlsx só é lido quando não há cache ou quando o conteúdo do arquivo mudou.
+    Falhas de escrita no cache (ex.: diretório somente leitura, ou colunas de tipos
+    misturados, que não voltariam iguais dos blocos) não impedem a carga: a planilha
+    é lida direto.
+    """
+    cache_dir = cache_dir_for(file_path, cache_dir)
+    try:
+        manifesto = _manifesto_atual(file_path, sheet_name, cache_dir)
+        if manifesto is not None:
+            return read_cache(manifesto, cache_dir)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    try:
+        write_cache(df, file_path, sheet_name, cache_dir)
+    except (OSError, TypeError, ValueError):
+        pass
+    return df
+
+
+def compile_all(planilhas=None, base_dir='.', cache_dir=None, force=False):
+    """Compila (ou valida) o cache de todas as planilhas do app. Retorna [(arquivo, aba, segundos, status)]."""
+    resultados = []
+    for arquivo, aba in (planilhas or PLANILHAS_PADRAO):
+        caminho = os.path.join(base_dir, arquivo)
+        destino = cache_dir_for(caminho, cache_dir)
+        t0 = time.perf_counter()
+        if not force and _manifesto_atual(caminho, aba, destino) is not None:
+            status = 'atualizado'
+        else:
+            df = pd.read_excel(caminho, sheet_name=aba)
+            write_cache(df, caminho, aba, destino)
+            status = 'compilado'
+        resultados.append((arquivo, aba, time.perf_counter() - t0, status))
+    return resultados
+
+
+if __name__ == '__main__':
+    forcar = '--force' in sys.argv[1:]
+    for arquivo, aba, segundos, status in compile_all(force=forcar):
+        print(f"{arquivo} [{aba}]: {status} em {segundos:.2f} s")
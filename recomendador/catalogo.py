@@ -0,0 +1,262 @@
+"""Mapeamentos de categorias e catálogo de ajustes por sistema (AT/MT).
+
+Os ajustes candidatos, seus rótulos e as regras de especialista vêm de um arquivo
+JSON versionado (``catalogo_ajustes.json``, ou o caminho em ``RECOMENDADOR_CATALOGO``),
+validado uma única vez na importação.
+"""
+import json
+import os
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+
+# --- MAPEAMENTO DE CATEGORIAS PARA CÓDIGOS NUMÉRICOS ---
+# !!! VERIFIQUE E AJUSTE ESTES CÓDIGOS DE ACORDO COM SEUS DADOS DE TREINO !!!
+tipo_gd_map = {'Gerador Síncrono': 0, 'Gerador Baseado em Inversor': 1}
+bloqueio_tensao_map = {'Habilitado': 1, 'Desabilitado': 0}
+req_suportabilidade_map = {'Sem Requisitos': 4, 'Categoria I': 1, 'Categoria II': 2, 'Categoria III': 3}
+tecnica_ativa_map = {'Desabilitada': 3, 'GEFS': 1, 'GEVS': 2, 'Desconhecido': 4}
+cenario_geracao_map = {'Apenas Gerador Síncrono': 1, 'Apenas Gerador Baseado em Inversores': 2, 'Cenário Híbrido (Maior contribuição de GS)': 3, 'Cenário Híbrido (Maior contribuição de GBI)': 4, 'Desconhecido': 5}
+curvas_regulacao_map = {'Desabilitada': 1, 'hertz-watt': 2, 'volt-var': 3, 'volt-watt': 4, 'Desconhecido': 5}
+
+# Mapeamentos Inversos de Código para Texto (para a saída)
+tipo_gd_map_inv = {v: k for k, v in tipo_gd_map.items()}
+bloqueio_tensao_map_inv = {v: k for k, v in bloqueio_tensao_map.items()}
+req_suportabilidade_map_inv = {v: k for k, v in req_suportabilidade_map.items()}
+tecnica_ativa_map_inv = {v: k for k, v in tecnica_ativa_map.items()}
+cenario_geracao_map_inv = {v: k for k, v in cenario_geracao_map.items()}
+curvas_regulacao_map_inv = {v: k for k, v in curvas_regulacao_map.items()}
+
+# Sinaliza "inércia desconhecida" (ignora o critério de H nas buscas)
+INERCIA_DESCONHECIDA = 100
+
+# Sistemas com tensão igual ou acima deste valor (kV) usam a base de Alta Tensão
+TENSAO_MINIMA_AT = 69.0
+
+# Filtro de desempenho (regras "soft")
+LIMIAR_BAC = 90
+LIMIAR_FNR = 10
+LIMIAR_FPR = 10
+
+
+# Catálogo versionado de ajustes candidatos, rótulos e regras de especialista
+CATALOGO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalogo_ajustes.json')
+VARIAVEL_AMBIENTE_CATALOGO = 'RECOMENDADOR_CATALOGO'
+VERSOES_CATALOGO = (1, 2)
+REGRAS_CATALOGO = ('vb', 'svb', 'rs1', 'rs2', 'rs3')
+
+
+class CatalogError(ValueError):
+    """Catálogo de ajustes inválido."""
+
+
+def mask_flags(mascara, n):
+    """Vetor booleano de ``n`` posições com o bit i da máscara na posição i."""
+    return np.array([bool(mascara >> i & 1) for i in range(n)], dtype=bool)
+
+
+def descending_order(chave):
+    """Posições do maior para o menor valor de ``chave`` (no último eixo).
+
+    A ordenação é estável: empates ficam na ordem dos ajustes candidatos do catálogo.
+    É o desempate do vencedor do motor (``bac_order``) e do ranking de ``pontuacao.Scoring``.
+    """
+    return np.argsort(-np.asarray(chave, dtype=float), axis=-1, kind='stable')
+
+
+def bac_order(indices, bac):
+    """``indices`` do maior para o menor ``bac`` (empates na ordem de ``indices``)."""
+    return indices[descending_order(bac[indices])]
+
+
+def valid_adjustments(config, valores, bloqueio_codigo, req_sup_codigo, aprovacao=None):
+    """Posições dos ajustes válidos de ``config``, do maior para o menor BAC (o vencedor é a primeira).
+
+    Válido = elegível pelas regras de especialista e dentro dos limiares de desempenho.
+    ``valores`` são as métricas (BAC, FNR, FPR) de cada candidato. Com ``aprovacao`` (o
+    bitmap de um cenário único, ver ``engine.pass_bitmaps``), os limiares já estão nos bits
+    e basta o AND com a máscara das regras.
+    """
+    if aprovacao is not None:
+        validos = mask_flags(int(aprovacao) & config.allowed_mask(bloqueio_codigo, req_sup_codigo),
+                             len(config.ajustes_candidatos))
+    else:
+        with np.errstate(invalid='ignore'):
+            validos = (config.eligible(bloqueio_codigo, req_sup_codigo) & (valores[:, 0] > LIMIAR_BAC)
+                       & (valores[:, 1] < LIMIAR_FNR) & (valores[:, 2] < LIMIAR_FPR))
+    return bac_order(np.flatnonzero(validos), valores[:, 0])
+
+
+@dataclass(frozen=True)
+class SystemConfig:
+    nome: str
+    arquivos: dict
+    ajustes_candidatos: tuple
+    labels: dict
+    aj_vb: frozenset
+    aj_svb: frozenset
+    aj_rs1: frozenset
+    aj_rs2: frozenset
+    aj_rs3: frozenset
+    descricao: str = None
+    # Faixa de tensão atendida pela base: [mínimo, máximo), None = sem limite
+    tensao_min_kv: float = None
+    tensao_max_kv: float = None
+    # Máscaras de bits sobre as posições de ``ajustes_candidatos`` (bit i = i-ésimo candidato)
+    mascaras: dict = field(init=False, repr=False, compare=False)
+    # Máscara das regras de especialista de cada combinação (código de VB, código de RS)
+    mascaras_regras: dict = field(init=False, repr=False, compare=False)
+    _elegiveis: dict = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        mascaras = {regra: self.mask(getattr(self, f'aj_{regra}')) for regra in REGRAS_CATALOGO}
+        # Sem requisitos = todos são permitidos inicialmente
+        mascaras['rs4'] = (1 << len(self.ajustes_candidatos)) - 1
+        object.__setattr__(self, 'mascaras', mascaras)
+        # Vazio enquanto é montado: ``allowed_mask`` cai no cálculo a partir de ``mascaras``
+        object.__setattr__(self, 'mascaras_regras', {})
+        object.__setattr__(self, 'mascaras_regras', {
+            (vb, rs): self.allowed_mask(vb, rs)
+            for vb in bloqueio_tensao_map.values() for rs in req_suportabilidade_map.values()})
+        object.__setattr__(self, '_elegiveis', {})
+
+    @property
+    def aj_rs4(self):
+        # Sem requisitos = todos são permitidos inicialmente
+        return frozenset(self.ajustes_candidatos)
+
+    def covers(self, tensao_kv):
+        return ((self.tensao_min_kv is None or tensao_kv >= self.tensao_min_kv)
+                and (self.tensao_max_kv is None or tensao_kv < self.tensao_max_kv))
+
+    def label(self, ajuste_id):
+        return self.labels.get(ajuste_id, f"ID {ajuste_id}")
+
+    def mask(self, ajustes):
+        mascara = 0
+        for i, ajuste_id in enumerate(self.ajustes_candidatos):
+            if ajuste_id in ajustes:
+                mascara |= 1 << i
+        return mascara
+
+    def allowed_mask(self, bloqueio_codigo, req_sup_codigo):
+        """Máscara dos ajustes elegíveis pelas regras rígidas de especialista (VB e RS)."""
+        mascara = self.mascaras_regras.get((bloqueio_codigo, req_sup_codigo))
+        if mascara is not None:
+            return mascara
+        # Filtro Rígido 1 (Bloqueio de Tensão)
+        mascara_vb = self.mascaras['vb'] if bloqueio_codigo == 1 else self.mascaras['svb']
+        # Filtro Rígido 2 (Requisito de Suportabilidade)
+        mascara_rs = self.mascaras.get(f'rs{req_sup_codigo}', self.mascaras['rs4'])
+        return mascara_vb & mascara_rs
+
+    def eligible(self, bloqueio_codigo, req_sup_codigo):
+        """Vetor booleano (um por candidato) dos ajustes elegíveis; reaproveitado entre chamadas."""
+        chave = (bloqueio_codigo, req_sup_codigo)
+        elegiveis = self._elegiveis.get(chave)
+        if elegiveis is None:
+            elegiveis = mask_flags(self.allowed_mask(bloqueio_codigo, req_sup_codigo), len(self.ajustes_candidatos))
+            elegiveis.flags.writeable = False
+            self._elegiveis[chave] = elegiveis
+        return elegiveis
+
+    def allowed_adjustments(self, bloqueio_codigo, req_sup_codigo):
+        """Ajustes elegíveis pelas regras rígidas de especialista (VB e RS)."""
+        mascara = self.allowed_mask(bloqueio_codigo, req_sup_codigo)
+        return frozenset(a for i, a in enumerate(self.ajustes_candidatos) if mascara >> i & 1)
+
+
+def _ids(valores, onde):
+    if not isinstance(valores, list) or not all(isinstance(v, int) and not isinstance(v, bool) for v in valores):
+        raise CatalogError(f"{onde}: esperada uma lista de ids inteiros")
+    return valores
+
+
+def system_from_dict(nome, dados):
+    """``SystemConfig`` de uma entrada de sistema no formato do catálogo (validada)."""
+    try:
+        arquivos = dict(dados['arquivos'])
+        ajustes = dados['ajustes']
+        regras = dados['regras']
+    except (KeyError, TypeError) as e:
+        raise CatalogError(f"Sistema {nome}: campo obrigatório ausente ({e})") from None
+    if set(arquivos) != {'params', 'x', 'y'}:
+        raise CatalogError(f"Sistema {nome}: 'arquivos' deve ter as chaves params, x e y")
+
+    candidatos = _ids([a.get('id') for a in ajustes], f"Sistema {nome}, ajustes")
+    if len(set(candidatos)) != len(candidatos):
+        raise CatalogError(f"Sistema {nome}: ajustes candidatos repetidos")
+    labels = {a['id']: a['label'] for a in ajustes if a.get('label') is not None}
+
+    conjuntos = {}
+    for regra in REGRAS_CATALOGO:
+        conjunto = frozenset(_ids(regras.get(regra), f"Sistema {nome}, regra {regra}"))
+        fora = sorted(conjunto - set(candidatos))
+        if fora:
+            raise CatalogError(f"Sistema {nome}, regra {regra}: ajustes fora dos candidatos {fora}")
+        conjuntos[f'aj_{regra}'] = conjunto
+    faixa = dados.get('tensao_kv') or {}
+    limites = {}
+    for chave, campo in (('min', 'tensao_min_kv'), ('max', 'tensao_max_kv')):
+        valor = faixa.get(chave)
+        if valor is not None and (isinstance(valor, bool) or not isinstance(valor, (int, float))):
+            raise CatalogError(f"Sistema {nome}: tensao_kv.{chave} deve ser numérico")
+        limites[campo] = None if valor is None else float(valor)
+    return SystemConfig(nome=nome, arquivos=arquivos, ajustes_candidatos=tuple(candidatos), labels=labels,
+                        descricao=dados.get('descricao', nome), **conjuntos, **limites)
+
+
+def system_to_dict(config):
+    """Entrada de ``config`` no formato do catálogo (inversa de ``system_from_dict``)."""
+    return {
+        'descricao': config.descricao,
+        'tensao_kv': {'min': config.tensao_min_kv, 'max': config.tensao_max_kv},
+        'arquivos': dict(config.arquivos),
+        'ajustes': [{'id': int(a), 'label': config.labels.get(a)} for a in config.ajustes_candidatos],
+        'regras': {regra: sorted(int(a) for a in getattr(config, f'aj_{regra}')) for regra in REGRAS_CATALOGO},
+    }
+
+
+def _validar_faixas(sistemas):
+    faixas = sorted(sistemas.values(), key=lambda c: -np.inf if c.tensao_min_kv is None else c.tensao_min_kv)
+    for anterior, proximo in zip(faixas[:-1], faixas[1:]):
+        fim = np.inf if anterior.tensao_max_kv is None else anterior.tensao_max_kv
+        inicio = -np.inf if proximo.tensao_min_kv is None else proximo.tensao_min_kv
+        if inicio < fim:
+            raise CatalogError(f"Faixas de tensão sobrepostas: {anterior.nome} e {proximo.nome}")
+
+
+def load_catalogue(caminho=None):
+    """Lê e valida o catálogo. Retorna (versão, {nome do sistema: SystemConfig})."""
+    if caminho is None:
+        caminho = os.environ.get(VARIAVEL_AMBIENTE_CATALOGO) or CATALOGO_PADRAO
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            dados = json.load(f)
+    except (OSError, ValueError) as e:
+        raise CatalogError(f"Não foi possível ler o catálogo {caminho}: {e}") from e
+    versao = dados.get('versao')
+    if versao not in VERSOES_CATALOGO:
+        raise CatalogError(f"Versão de catálogo não suportada: {versao!r}")
+    sistemas = {nome: system_from_dict(nome, d) for nome, d in dados.get('sistemas', {}).items()}
+    if not sistemas:
+        raise CatalogError("O catálogo não define nenhum sistema")
+    if versao == 1:
+        # Versão 1 não tinha faixas de tensão: AT a partir de 69 kV, MT abaixo
+        faixas = {'AT': {'tensao_min_kv': TENSAO_MINIMA_AT}, 'MT': {'tensao_max_kv': TENSAO_MINIMA_AT}}
+        sistemas = {nome: replace(config, **faixas.get(nome, {})) for nome, config in sistemas.items()}
+    _validar_faixas(sistemas)
+    return versao, sistemas
+
+
+VERSAO_CATALOGO, SISTEMAS = load_catalogue()
+SISTEMA_AT = SISTEMAS.get('AT')
+SISTEMA_MT = SISTEMAS.get('MT')
+
+
+def system_name_for(tensao_kv, sistemas=None):
+    """Seleção de base baseada na tensão do sistema (primeira classe cuja faixa contém a tensão)."""
+    for nome, config in (SISTEMAS if sistemas is None else sistemas).items():
+        if config.covers(tensao_kv):
+            return nome
+    raise ValueError(f"Nenhuma base cobre a tensão de {tensao_kv} kV")
@@ -0,0 +1,301 @@
+"""Relatório de cobertura da base de simulação: onde a busca cai em fallback e onde não há ajuste válido.
+
+Todas as combinações das caixas de seleção da barra lateral passam pela cascata
+categórica de cada sistema e, para cada uma, uma grade de capacidades (entre a menor e
+a maior da base), as tensões da base e uma grade de inércias (Gerador Síncrono, mais a
+inércia desconhecida) passam pela busca numérica. Para cada combinação o relatório
+traz:
+
+* as colunas que caíram no código "desconhecido" (``FALLBACK_POR_COLUNA``) e as que
+  ficaram fora do filtro por falta de cenário;
+* a distância do cenário simulado mais próximo aos pontos da grade (euclidiana, com
+  cada eixo dividido pela amplitude da base, como no k-NN; H só conta quando é
+  conhecido no ponto e no cenário) e o pior ponto;
+* quantos pontos da grade ficam sem ajuste válido.
+
+Combinações que resolvem para o mesmo grupo categórico compartilham a busca da grade
+(``NumericGroup.nearest_grid``), cada conjunto distinto de cenários selecionados é
+avaliado uma única vez (bitmap de aprovação nos limiares) e a regra de especialista de
+cada combinação é só um AND com esse bitmap. Uso::
+
+    python -m recomendador.cobertura cobertura.csv
+    python -m recomendador.cobertura cobertura.csv --pontos pontos.csv --maximo-sem-ajuste 0.3
+"""
+import argparse
+import itertools
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .batch import COLUNAS_CATEGORICAS, write_results
+from .catalogo import INERCIA_DESCONHECIDA
+from .engine import (
+    METRICAS, MODO_MEDIA, MODO_UNICO, STATUS_INCONSISTENTE, STATUS_OK, STATUS_SEM_AJUSTE, STATUS_SEM_CENARIO,
+    Recommender, Scenario, mean_metrics, pass_bitmaps, validate_scenario,
+)
+
+PONTOS_CAPACIDADE = 25
+PONTOS_INERCIA = 9
+
+COLUNAS_RESUMO = (
+    ['sistema'] + [nome for nome, _ in COLUNAS_CATEGORICAS]
+    + ['status', 'desconhecido', 'ignoradas', 'cenarios_grupo', 'pontos', 'pontos_media', 'pontos_sem_ajuste',
+       'fracao_sem_ajuste', 'distancia_media', 'distancia_maxima', 'pior_capacidade_kw', 'pior_tensao_kv',
+       'pior_inercia']
+)
+COLUNAS_PONTOS = (
+    ['sistema'] + [nome for nome, _ in COLUNAS_CATEGORICAS]
+    + ['capacidade_kw', 'tensao_kv', 'inercia', 'status', 'modo', 'n_cenarios', 'distancia',
+       'dist_capacidade_kw', 'dist_tensao_kv', 'dist_inercia']
+)
+
+
+@dataclass
+class CoverageReport:
+    """Resultado de ``coverage``: uma linha por (sistema, combinação) e, se pedido, uma por ponto da grade."""
+    resumo: pd.DataFrame
+    pontos: pd.DataFrame = None
+
+    def summary(self):
+        """Totais por sistema (combinações consistentes, fallbacks e pontos sem ajuste)."""
+        totais = {}
+        for nome, linhas in self.resumo.groupby('sistema', sort=False):
+            consistentes = linhas[linhas['status'] != STATUS_INCONSISTENTE]
+            pontos = int(consistentes['pontos'].sum())
+            sem_ajuste = int(consistentes['pontos_sem_ajuste'].sum())
+            totais[nome] = {
+                'combinacoes': int(len(consistentes)),
+                'inconsistentes': int(len(linhas) - len(consistentes)),
+                'sem_cenario': int((consistentes['status'] == STATUS_SEM_CENARIO).sum()),
+                'sem_ajuste': int((consistentes['status'] == STATUS_SEM_AJUSTE).sum()),
+                'desconhecido': {coluna: int(consistentes['desconhecido'].str.contains(coluna, regex=False).sum())
+                                 for coluna, _ in COLUNAS_CATEGORICAS},
+                'ignoradas': {coluna: int(consistentes['ignoradas'].str.contains(coluna, regex=False).sum())
+                              for coluna, _ in COLUNAS_CATEGORICAS},
+                'pontos': pontos,
+                'pontos_sem_ajuste': sem_ajuste,
+                'fracao_sem_ajuste': sem_ajuste / pontos if pontos else 0.0,
+                'distancia_maxima': float(consistentes['distancia_maxima'].max()) if pontos else None,
+            }
+        return totais
+
+
+def coverage_grid(base, pontos_capacidade=PONTOS_CAPACIDADE, pontos_inercia=PONTOS_INERCIA):
+    """Grade (capacidades em kW, tensões em kV, inércias de Gerador Síncrono) a partir dos valores da base."""
+    numerico = base.indice.numerico
+    capacidades = np.linspace(numerico.capacidade_kw.min(), numerico.capacidade_kw.max(), int(pontos_capacidade))
+    tensoes = np.unique(numerico.vn_kv)
+    h = numerico.h[numerico.h != INERCIA_DESCONHECIDA]
+    inercias = np.unique(np.linspace(h.min(), h.max(), int(pontos_inercia))) if len(h) else np.empty(0)
+    return capacidades, tensoes, np.append(inercias, INERCIA_DESCONHECIDA)
+
+
+class _GradeGrupo:
+    """Busca da grade inteira em um grupo categórico: conjunto de cenários e distância de cada ponto."""
+
+    def __init__(self, base, chave, posicoes_grupo, capacidades, tensoes, inercias, usa_inercia, conjuntos):
+        numerico = base.indice.numerico
+        h_desconhecida = numerico.h == INERCIA_DESCONHECIDA
+        escalas = np.asarray(numerico.escalas)
+        grupo = numerico.group(chave, posicoes_grupo)
+        n = len(capacidades) * len(tensoes) * len(inercias)
+        # Mesma ordem dos laços abaixo: tensão, inércia e, por dentro, a capacidade
+        self.alvos = np.array(list(itertools.product(tensoes, inercias, capacidades))).reshape(n, 3)[:, [2, 0, 1]]
+        self.conjunto = np.empty(n, dtype=np.int64)
+        self.diferencas = np.empty((n, 3))
+        self.distancia = np.empty(n)
+        pontos_base = np.column_stack([numerico.capacidade_kw, numerico.vn_kv, numerico.h])
+        inicio = 0
+        for tensao in tensoes.tolist():
+            for inercia in inercias.tolist():
+                fim = inicio + len(capacidades)
+                classes, selecionados = grupo.nearest_grid(0, capacidades, capacidades[0], tensao, inercia)
+                for classe, posicoes in enumerate(selecionados):
+                    pontos = inicio + np.flatnonzero(classes == classe)
+                    self.conjunto[pontos] = conjuntos.setdefault(posicoes.tobytes(), (len(conjuntos), posicoes))[0]
+                    # Cenário selecionado mais próximo de cada ponto (com empates, o de menor distância)
+                    diferencas = self.alvos[pontos][:, None, :] - pontos_base[posicoes][None, :, :]
+                    normalizadas = diferencas / escalas
+                    # H só entra na distância quando é conhecido dos dois lados (e o usuário informa H)
+                    normalizadas[:, :, 2] *= usa_inercia and inercia != INERCIA_DESCONHECIDA
+                    normalizadas[:, h_desconhecida[posicoes], 2] = 0.0
+                    distancias = np.sqrt((normalizadas ** 2).sum(axis=2))
+                    mais_proximo = distancias.argmin(axis=1)
+                    linhas = np.arange(len(pontos))
+                    self.distancia[pontos] = distancias[linhas, mais_proximo]
+                    self.diferencas[pontos] = np.abs(diferencas[linhas, mais_proximo])
+                inicio = fim
+
+
+def _aprovacao_conjuntos(base, conjuntos):
+    """Bitmap de aprovação nos limiares de cada conjunto de cenários (média das métricas quando há empate)."""
+    colunas = base.candidate_columns
+    bitmaps = np.zeros(len(conjuntos), dtype=base.aprovacao.dtype)
+    n_cenarios = np.zeros(len(conjuntos), dtype=np.int64)
+    for i, posicoes in conjuntos.values():
+        n_cenarios[i] = len(posicoes)
+        if len(posicoes) == 1:
+            bitmaps[i] = base.aprovacao[posicoes[0]]
+        else:
+            medias = mean_metrics(base.metricas[posicoes][:, colunas, :].reshape(len(posicoes), -1))
+            bitmaps[i] = pass_bitmaps(medias.reshape(1, len(colunas), len(METRICAS)), range(len(colunas)))[0]
+    return bitmaps, n_cenarios
+
+
+def _colunas_fallback(chave, codigos):
+    desconhecido, ignoradas = [], []
+    for (coluna, _), valor, codigo in zip(COLUNAS_CATEGORICAS, chave, codigos):
+        if valor is None:
+            ignoradas.append(coluna)
+        elif valor != codigo:
+            desconhecido.append(coluna)
+    return ', '.join(desconhecido), ', '.join(ignoradas)
+
+
+def _cobertura_sistema(base, pontos_capacidade, pontos_inercia, detalhe):
+    config = base.config
+    categorico = base.indice.categorico
+    capacidades, tensoes, inercias = coverage_grid(base, pontos_capacidade, pontos_inercia)
+    # Gerador Baseado em Inversor não usa H (``Scenario.inercia_busca``)
+    inercias_por_tipo = {'Gerador Síncrono': inercias}
+
+    inconsistencias = {}
+    grades = {}
+    conjuntos = {}
+    combinacoes = []
+    for rotulos in itertools.product(*[list(mapa) for _, mapa in COLUNAS_CATEGORICAS]):
+        cenario = Scenario(float(capacidades[0]), float(tensoes[0]), *rotulos)
+        chave_validacao = (cenario.tipo_gd, cenario.tecnica_ativa, cenario.cenario_geracao)
+        if chave_validacao not in inconsistencias:
+            inconsistencias[chave_validacao] = bool(validate_scenario(cenario))
+        if inconsistencias[chave_validacao]:
+            combinacoes.append((rotulos, None, None, None))
+            continue
+        codigos = cenario.categorical_codes()
+        chave = categorico.resolve_key(codigos)
+        posicoes_grupo = categorico.group(chave)
+        grade = None
+        if posicoes_grupo is not None:
+            usa_inercia = cenario.tipo_gd in inercias_por_tipo
+            grade = grades.get((chave, usa_inercia))
+            if grade is None:
+                grade = grades[(chave, usa_inercia)] = _GradeGrupo(
+                    base, chave, posicoes_grupo, capacidades, tensoes,
+                    inercias_por_tipo.get(cenario.tipo_gd, np.zeros(1)), usa_inercia, conjuntos)
+        combinacoes.append((rotulos, codigos, chave, grade))
+
+    bitmaps, n_cenarios = _aprovacao_conjuntos(base, conjuntos)
+    resumo, pontos = [], []
+    for rotulos, codigos, chave, grade in combinacoes:
+        linha = dict.fromkeys(COLUNAS_RESUMO)
+        linha.update(zip(COLUNAS_RESUMO[1:7], rotulos), sistema=config.nome)
+        if codigos is None:
+            linha['status'] = STATUS_INCONSISTENTE
+            resumo.append(linha)
+            continue
+        linha['desconhecido'], linha['ignoradas'] = _colunas_fallback(chave, codigos)
+        if grade is None:
+            linha.update(status=STATUS_SEM_CENARIO, cenarios_grupo=0, pontos=0, pontos_media=0, pontos_sem_ajuste=0)
+            resumo.append(linha)
+            continue
+        # Regras de especialista da combinação: AND com o bitmap de cada conjunto de cenários
+        validos = (bitmaps & config.allowed_mask(codigos[1], codigos[2])) != 0
+        validos_ponto = validos[grade.conjunto]
+        pior = int(grade.distancia.argmax())
+        linha.update(
+            status=STATUS_OK if validos_ponto.any() else STATUS_SEM_AJUSTE,
+            cenarios_grupo=len(categorico.group(chave)),
+            pontos=len(validos_ponto),
+            pontos_media=int((n_cenarios[grade.conjunto] > 1).sum()),
+            pontos_sem_ajuste=int((~validos_ponto).sum()),
+            fracao_sem_ajuste=float((~validos_ponto).mean()),
+            distancia_media=float(grade.distancia.mean()),
+            distancia_maxima=float(grade.distancia[pior]),
+            pior_capacidade_kw=float(grade.alvos[pior, 0]),
+            pior_tensao_kv=float(grade.alvos[pior, 1]),
+            pior_inercia=float(grade.alvos[pior, 2]),
+        )
+        resumo.append(linha)
+        if detalhe:
+            tabela = pd.DataFrame({
+                'capacidade_kw': grade.alvos[:, 0], 'tensao_kv': grade.alvos[:, 1], 'inercia': grade.alvos[:, 2],
+                'status': np.where(validos_ponto, STATUS_OK, STATUS_SEM_AJUSTE),
+                'modo': np.where(n_cenarios[grade.conjunto] > 1, MODO_MEDIA, MODO_UNICO),
+                'n_cenarios': n_cenarios[grade.conjunto], 'distancia': grade.distancia,
+                'dist_capacidade_kw': grade.diferencas[:, 0], 'dist_tensao_kv': grade.diferencas[:, 1],
+                'dist_inercia': grade.diferencas[:, 2],
+            })
+            for coluna in reversed(COLUNAS_PONTOS[:7]):
+                tabela.insert(0, coluna, linha[coluna])
+            pontos.append(tabela)
+    return resumo, pontos
+
+
+def coverage(recomendador=None, sistemas=None, pontos_capacidade=PONTOS_CAPACIDADE,
+             pontos_inercia=PONTOS_INERCIA, detalhe=False, base_dir='.'):
+    """Relatório de cobertura (``CoverageReport``) das bases de ``sistemas`` (padrão: todas).
+
+    Com ``detalhe``, ``pontos`` traz uma linha por ponto da grade de cada combinação
+    consistente (status, modo, número de cenários e distância ao cenário mais próximo).
+    """
+    recomendador = Recommender(base_dir=base_dir) if recomendador is None else recomendador
+    resumo, pontos = [], []
+    for nome in (recomendador.sistemas if sistemas is None else sistemas):
+        linhas, tabelas = _cobertura_sistema(recomendador.database(nome), pontos_capacidade, pontos_inercia, detalhe)
+        resumo.extend(linhas)
+        pontos.extend(tabelas)
+    resumo = pd.DataFrame(resumo, columns=COLUNAS_RESUMO)
+    for coluna in ('cenarios_grupo', 'pontos', 'pontos_media', 'pontos_sem_ajuste'):
+        resumo[coluna] = resumo[coluna].astype('Int64')
+    if not detalhe:
+        return CoverageReport(resumo)
+    pontos = pd.concat(pontos, ignore_index=True) if pontos else pd.DataFrame(columns=COLUNAS_PONTOS)
+    return CoverageReport(resumo, pontos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório de cobertura e lacunas da base de simulação.")
+    parser.add_argument('saida', help="Resumo por combinação (.csv, .parquet ou .xlsx)")
+    parser.add_argument('--pontos', default=None, help="Arquivo com uma linha por ponto da grade (opcional)")
+    parser.add_argument('--base-dir', default='.', help="Diretório com as bases X/Y/parâmetros")
+    parser.add_argument('--sistemas', default=None, help="Sistemas analisados (separados por vírgula)")
+    parser.add_argument('--pontos-capacidade', type=int, default=PONTOS_CAPACIDADE,
+                        help=f"Pontos da grade de capacidade (padrão: {PONTOS_CAPACIDADE})")
+    parser.add_argument('--pontos-inercia', type=int, default=PONTOS_INERCIA,
+                        help=f"Pontos da grade de inércia, além da inércia desconhecida (padrão: {PONTOS_INERCIA})")
+    parser.add_argument('--maximo-sem-ajuste', type=float, default=None, metavar='FRACAO',
+                        help="Termina com erro se a fração de pontos sem ajuste válido de algum sistema passar disso")
+    args = parser.parse_args(argv)
+    if args.pontos_capacidade < 1 or args.pontos_inercia < 1:
+        parser.error("As grades precisam de pelo menos um ponto.")
+
+    t0 = time.perf_counter()
+    recomendador = Recommender(base_dir=args.base_dir)
+    sistemas = None if args.sistemas is None else [s.strip() for s in args.sistemas.split(',')]
+    relatorio = coverage(recomendador, sistemas, args.pontos_capacidade, args.pontos_inercia,
+                         detalhe=args.pontos is not None)
+    write_results(relatorio.resumo, args.saida)
+    if args.pontos is not None:
+        write_results(relatorio.pontos, args.pontos)
+
+    falhou = False
+    for nome, totais in relatorio.summary().items():
+        print(f"{nome}: {totais['combinacoes']} combinações consistentes ({totais['inconsistentes']} inconsistentes), "
+              f"{totais['sem_cenario']} sem cenário, {totais['sem_ajuste']} sem ajuste em toda a grade")
+        for tipo in ('desconhecido', 'ignoradas'):
+            contagens = ', '.join(f"{coluna} {n}" for coluna, n in totais[tipo].items() if n)
+            print(f"  {tipo}: {contagens or '-'}")
+        distancia = '-' if totais['distancia_maxima'] is None else f"{totais['distancia_maxima']:.3f}"
+        print(f"  pontos sem ajuste: {totais['pontos_sem_ajuste']}/{totais['pontos']} "
+              f"({100 * totais['fracao_sem_ajuste']:.1f}%), distância máxima {distancia}")
+        if args.maximo_sem_ajuste is not None and totais['fracao_sem_ajuste'] > args.maximo_sem_ajuste:
+            falhou = True
+    print(f"Relatório gravado em {args.saida} ({time.perf_counter() - t0:.2f} s)")
+    return 1 if falhou else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,645 @@
+"""Motor de recomendação de ajustes, independente da interface (sem Streamlit).
+
+Uso típico::
+
+    recomendador = Recommender()
+    resultado = recomendador.recommend(Scenario(capacidade_kw=1500, tensao_kv=13.8, ...))
+    if resultado.status == 'ok':
+        print(resultado.vencedor['Label'])
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .cache import read_excel_cached
+from .catalogo import (
+    INERCIA_DESCONHECIDA, LIMIAR_BAC, LIMIAR_FNR, LIMIAR_FPR, SISTEMAS,
+    bloqueio_tensao_map, cenario_geracao_map, curvas_regulacao_map, req_suportabilidade_map,
+    system_name_for, tecnica_ativa_map, tipo_gd_map, valid_adjustments,
+)
+from .indice import ScenarioIndex
+from .instrumentacao import TELEMETRIA
+from .memo import source_signature
+from .pontuacao import Scoring
+
+COLUNA_ID_AJUSTE = 'Ajustes'  # Coluna com os números 2, 5, 32...
+HEADER_ROCOF = 'DF_th'
+HEADER_TEMPO = 'TD'
+HEADER_TENSAO_BLOQUEIO = 'Vblock'
+HEADER_DROPOUT = 'tdropout'
+
+# Status possíveis de uma recomendação
+STATUS_OK = 'ok'
+STATUS_INCONSISTENTE = 'inconsistente'
+STATUS_SEM_CENARIO = 'sem_cenario'
+STATUS_SEM_AJUSTE = 'sem_ajuste'
+
+# Métricas por ajuste na base Y (colunas largas ``BAC_Ajuste_{id}`` etc.)
+METRICAS = ('BAC', 'FNR', 'FPR')
+PADRAO_COLUNA_METRICA = re.compile(r'^(BAC|FNR|FPR)_Ajuste_(\d+)$')
+# float32 reduz a memória pela metade, mas altera o arredondamento exibido (ex.: 0.155 -> "0.16%")
+DTYPE_METRICAS = np.float64
+
+# Origem das métricas: um único cenário, a média dos cenários empatados ou a média dos k
+# vizinhos mais próximos ponderada pelo inverso da distância
+MODO_UNICO = 'unico'
+MODO_MEDIA = 'media'
+MODO_VIZINHOS = 'vizinhos'
+
+
+class DatabaseLoadError(Exception):
+    """Falha ao carregar uma das bases (parâmetros, X ou Y) de um sistema."""
+
+
+def load_parameter_database(file_path):
+    df = read_excel_cached(file_path)
+    df[COLUNA_ID_AJUSTE] = df[COLUNA_ID_AJUSTE].astype(str).str.replace('#', '').str.strip()
+    df[COLUNA_ID_AJUSTE] = pd.to_numeric(df[COLUNA_ID_AJUSTE], errors='coerce')
+    df.dropna(subset=[COLUNA_ID_AJUSTE], inplace=True)
+    df[COLUNA_ID_AJUSTE] = df[COLUNA_ID_AJUSTE].astype(int)
+    return df.set_index(COLUNA_ID_AJUSTE)
+
+
+def load_simulation_database(x_file, y_file, sheet='X_total'):
+    x_total_sim = read_excel_cached(x_file, sheet_name=sheet)
+    y_total_sim = read_excel_cached(y_file)
+    return x_total_sim, y_total_sim
+
+
+def build_metrics_tensor(y_total_sim, indice_cenarios, dtype=DTYPE_METRICAS):
+    """Converte as colunas largas de Y em um array (cenário x ajuste x métrica).
+
+    As linhas seguem ``indice_cenarios`` (o índice de X). Retorna (tensor, {id do ajuste: coluna}).
+    Colunas duplicadas renomeadas pelo pandas (``BAC_Ajuste_27.1``) são ignoradas, como no
+    acesso por nome; métricas ausentes ficam NaN.
+    """
+    colunas = {}
+    for nome in y_total_sim.columns:
+        encontrado = PADRAO_COLUNA_METRICA.match(str(nome))
+        if encontrado:
+            colunas[(int(encontrado.group(2)), METRICAS.index(encontrado.group(1)))] = nome
+    ids = sorted({ajuste_id for ajuste_id, _ in colunas})
+    coluna_ajuste = {ajuste_id: i for i, ajuste_id in enumerate(ids)}
+
+    linhas = y_total_sim.reindex(indice_cenarios)
+    tensor = np.full((len(indice_cenarios), len(ids), len(METRICAS)), np.nan, dtype=dtype)
+    for (ajuste_id, m), nome in colunas.items():
+        tensor[:, coluna_ajuste[ajuste_id], m] = linhas[nome].to_numpy(dtype=float)
+    return tensor, coluna_ajuste
+
+
+def pass_bitmaps(metricas, colunas):
+    """Bitmap por cenário dos ajustes de ``colunas`` que passam nos limiares de desempenho.
+
+    O bit i de cada inteiro é o i-ésimo ajuste de ``colunas`` (mesma convenção das máscaras
+    do catálogo), de modo que os válidos de um cenário são ``bitmap & máscara das regras``.
+    O tipo é o menor inteiro sem sinal que comporta os bits (objeto acima de 64 ajustes).
+    """
+    tipo = np.min_scalar_type((1 << len(colunas)) - 1)
+    bitmaps = np.zeros(len(metricas), dtype=tipo)
+    for i, coluna in enumerate(colunas):
+        valores = metricas[:, coluna, :]
+        with np.errstate(invalid='ignore'):
+            passa = (valores[:, 0] > LIMIAR_BAC) & (valores[:, 1] < LIMIAR_FNR) & (valores[:, 2] < LIMIAR_FPR)
+        bitmaps |= passa.astype(tipo) << i
+    return bitmaps
+
+
+def mean_metrics(bloco):
+    """Média por coluna ignorando NaN (como o ``.mean()`` do pandas) de um bloco (cenários x valores).
+
+    A soma é feita em float64, linha a linha, para que todos os caminhos (motor, lote,
+    tabela) cheguem exatamente aos mesmos valores.
+    """
+    bloco = np.ascontiguousarray(bloco, dtype=float)
+    if len(bloco) == 1:
+        return bloco[0]
+    nulos = np.isnan(bloco)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(nulos, 0.0, bloco).sum(axis=0) / (~nulos).sum(axis=0)
+
+
+def inverse_distance_weights(distancias):
+    """Pesos 1/d normalizados; se algum cenário está à distância zero, só os coincidentes contam (pesos iguais)."""
+    distancias = np.asarray(distancias, dtype=float)
+    coincidentes = distancias <= 1e-12
+    pesos = coincidentes.astype(float) if coincidentes.any() else 1.0 / distancias
+    return pesos / pesos.sum()
+
+
+def weighted_metrics(bloco, pesos):
+    """Média ponderada por coluna de um bloco (cenários x valores), ignorando NaN como ``mean_metrics``."""
+    bloco = np.ascontiguousarray(bloco, dtype=float)
+    nulos = np.isnan(bloco)
+    pesos = np.where(nulos, 0.0, np.asarray(pesos, dtype=float)[:, None])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.where(nulos, 0.0, bloco) * pesos).sum(axis=0) / pesos.sum(axis=0)
+
+
+@dataclass
+class Database:
+    config: object
+    df_params: pd.DataFrame
+    X_total_sim: pd.DataFrame
+    indice: ScenarioIndex
+    # Métricas de Y alinhadas às linhas de X: (cenário x ajuste x métrica), e id do ajuste -> coluna
+    metricas: np.ndarray
+    coluna_ajuste: dict
+    # Versão da base: 0 = só os arquivos de origem; n = com as atualizações incrementais até a n
+    # (``atualizacao``). Cada versão é um objeto novo; as anteriores não mudam
+    versao: int = 0
+    # Memória aproximada ocupada pela base (bytes), usada no limite de memória do Recommender
+    nbytes: int = field(init=False)
+    # Colunas da tabela de candidatos já juntadas com a base de parâmetros (uma vez, na carga);
+    # por requisição só entram as métricas
+    colunas_candidatos: dict = field(init=False, repr=False)
+    indice_candidatos: pd.Index = field(init=False, repr=False)
+    # Ajustes candidatos que passam nos limiares em cada cenário de X (``pass_bitmaps``)
+    aprovacao: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        numerico = self.indice.numerico
+        self.aprovacao = pass_bitmaps(self.metricas, self.candidate_columns)
+        self.nbytes = int(
+            self.X_total_sim.memory_usage(deep=True).sum() + self.df_params.memory_usage(deep=True).sum()
+            + self.metricas.nbytes + self.indice.categorico.codigos.nbytes
+            + numerico.capacidade_kw.nbytes + numerico.vn_kv.nbytes + numerico.h.nbytes
+            + self.aprovacao.nbytes
+        )
+        ajustes = list(self.config.ajustes_candidatos)
+        modelo = pd.DataFrame({
+            'Ajuste_ID': ajustes,
+            'Label': [self.config.label(a) for a in ajustes],
+            **{metrica: np.full(len(ajustes), np.nan) for metrica in METRICAS},
+        })
+        juntas = pd.merge(modelo, self.df_params, left_on='Ajuste_ID', right_index=True, how='left')
+        self.colunas_candidatos = {nome: juntas[nome] for nome in juntas.columns}
+        self.indice_candidatos = juntas.index
+
+    @property
+    def candidate_columns(self):
+        """Colunas do tensor de métricas dos ajustes candidatos, na ordem do catálogo."""
+        return np.array([self.coluna_ajuste[a] for a in self.config.ajustes_candidatos], dtype=np.intp)
+
+    @classmethod
+    def load(cls, config, base_dir='.'):
+        arquivos = {k: os.path.join(base_dir, v) for k, v in config.arquivos.items()}
+        try:
+            df_params = load_parameter_database(arquivos["params"])
+        except Exception as e:
+            raise DatabaseLoadError(f"Erro ao carregar parâmetros: {e}") from e
+        try:
+            x_total_sim, y_total_sim = load_simulation_database(arquivos["x"], arquivos["y"])
+        except Exception as e:
+            raise DatabaseLoadError(f"Erro ao carregar base de simulação: {e}") from e
+        metricas, coluna_ajuste = build_metrics_tensor(y_total_sim, x_total_sim.index)
+        ausentes = [a for a in config.ajustes_candidatos if a not in coluna_ajuste]
+        if ausentes:
+            raise DatabaseLoadError(f"Métricas ausentes na base de simulação para os ajustes {ausentes}")
+        # Só o tensor de métricas fica em memória; o DataFrame largo de Y é descartado
+        return cls(config, df_params, x_total_sim, ScenarioIndex.from_frame(x_total_sim), metricas, coluna_ajuste)
+
+
+def _codigo(mapa, campo, valor):
+    try:
+        return mapa[valor]
+    except KeyError:
+        raise ValueError(f"Valor inválido para '{campo}': {valor!r}. Opções: {list(mapa)}") from None
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Entradas do usuário, com os mesmos textos das opções da barra lateral."""
+    capacidade_kw: float
+    tensao_kv: float
+    tipo_gd: str
+    bloqueio_tensao: str
+    req_suportabilidade: str
+    tecnica_ativa: str
+    curva_regulacao: str
+    cenario_geracao: str
+    inercia: float = None  # None = inércia desconhecida (só vale para Gerador Síncrono)
+
+    @property
+    def inercia_busca(self):
+        """Valor de H usado na busca (100 sinaliza inércia desconhecida; GBI não usa H)."""
+        if self.tipo_gd != 'Gerador Síncrono':
+            return 0
+        if self.inercia is None:
+            return INERCIA_DESCONHECIDA
+        return self.inercia
+
+    def categorical_codes(self):
+        """Códigos na ordem das colunas de X: Tipo_gd, VB, RS, TecAt, CR, Cgd."""
+        return (
+            _codigo(tipo_gd_map, 'Tipo da GD', self.tipo_gd),
+            _codigo(bloqueio_tensao_map, 'Bloqueio de Tensão', self.bloqueio_tensao),
+            _codigo(req_suportabilidade_map, 'Requisito de Suportabilidade', self.req_suportabilidade),
+            _codigo(tecnica_ativa_map, 'Técnica Ativa', self.tecnica_ativa),
+            _codigo(curvas_regulacao_map, 'Curvas de Regulação', self.curva_regulacao),
+            _codigo(cenario_geracao_map, 'Cenário de Geração', self.cenario_geracao),
+        )
+
+
+def validate_scenario(cenario):
+    """Regras de consistência entre as entradas. Retorna a lista de mensagens (markdown)."""
+    inconsistencias = []
+
+    # Regra 1: Cenário apenas com Gerador Síncrono (GS)
+    if cenario.cenario_geracao == 'Apenas Gerador Síncrono':
+        # Checa se o Tipo da GD é compatível
+        if cenario.tipo_gd != 'Gerador Síncrono':
+            inconsistencias.append(
+                f"**Inconsistência:** Você selecionou o cenário **'{cenario.cenario_geracao}'**, mas o Tipo da GD é **'{cenario.tipo_gd}'**.\n\n  "
+                "Para este cenário, o Tipo da GD deve ser 'Gerador Síncrono'."
+            )
+        # Checa se a Técnica Ativa é compatível (não pode ter técnica ativa)
+        if cenario.tecnica_ativa != 'Desabilitada':
+            inconsistencias.append(
+                f"**Inconsistência:** Você selecionou o cenário **'{cenario.cenario_geracao}'**, que não foi avaliado com técnicas ativas.\n\n "
+                f"Por favor, mude a 'Técnica Ativa' para 'Desabilitada'."
+            )
+
+    # Regra 2: Cenário apenas com Gerador Baseado em Inversor (GBI)
+    elif cenario.cenario_geracao == 'Apenas Gerador Baseado em Inversores':
+        # Checa se o Tipo da GD é compatível
+        if cenario.tipo_gd != 'Gerador Baseado em Inversor':
+            inconsistencias.append(
+                f"**Inconsistência:** Você selecionou o cenário **'{cenario.cenario_geracao}'**, mas o Tipo da GD é **'{cenario.tipo_gd}'**.\n\n  "
+                "Para este cenário, o Tipo da GD deve ser 'Gerador Baseado em Inversor'."
+            )
+
+    # Adicione outras regras aqui se necessário.
+    return inconsistencias
+
+
+@dataclass
+class Recommendation:
+    cenario: Scenario
+    status: str
+    sistema: str = None
+    inconsistencias: list = field(default_factory=list)
+    modo: str = None
+    # Posições (em X_total_sim) dos cenários simulados mais próximos
+    posicoes: np.ndarray = None
+    # Só no modo k-NN: linhas de X_total_sim dos vizinhos, com a distância (normalizada) e o peso nas médias
+    vizinhos: pd.DataFrame = None
+    cenario_proximo: pd.Series = None
+    # Todos os candidatos com métricas e parâmetros; válidos ordenados por BAC
+    candidatos: pd.DataFrame = None
+    validos: pd.DataFrame = None
+    # Candidatos que passam nas regras de especialista (um booleano por linha de ``candidatos``)
+    elegiveis: np.ndarray = None
+
+    @property
+    def n_cenarios(self):
+        return 0 if self.posicoes is None else len(self.posicoes)
+
+    @property
+    def nome_cenario(self):
+        return None if self.cenario_proximo is None else self.cenario_proximo['NomeCenario']
+
+    @property
+    def vencedor(self):
+        if self.validos is None or self.validos.empty:
+            return None
+        return self.validos.iloc[0]
+
+    @property
+    def alternativas(self):
+        if self.validos is None:
+            return None
+        return self.validos.iloc[1:]
+
+    def ranking(self, pontuacao=None):
+        """(top-k dos válidos, quase aprovados) segundo ``pontuacao`` (um ``pontuacao.Scoring``).
+
+        Sem ``pontuacao``, os válidos vêm pelo maior BAC, como em ``validos``.
+        """
+        if self.candidatos is None:
+            return None, None
+        return (Scoring() if pontuacao is None else pontuacao).tables(self.candidatos, self.elegiveis)
+
+
+class Recommender:
+    """Carrega as bases uma única vez (sob demanda) e responde recomendações.
+
+    Cada sistema (classe de tensão do catálogo) só é carregado quando recebe a
+    primeira consulta. Com ``memoria_maxima`` (bytes), as bases usadas há mais tempo
+    são descartadas sempre que o total carregado passa do limite (a base em uso
+    nunca é descartada, mesmo que sozinha passe do limite).
+
+    Com ``armazem`` (diretório, ou True para o padrão de ``armazem.store_dir_for``),
+    as bases são abertas do armazém mmap compartilhado entre os processos da máquina
+    em vez de lidas para a memória de cada processo.
+
+    Com ``compiladas`` ({sistema: diretório}), esses sistemas são abertos (mmap) dos diretórios
+    gravados pela ingestão em blocos (``ingestao.ingest``), e não das planilhas do catálogo.
+
+    Com ``cache`` (um ``memo.ResultCache``), a avaliação dos candidatos é reaproveitada
+    entre cenários que caem nos mesmos cenários simulados (a busca em si sempre roda,
+    de modo que entradas próximas de um ponto de corte nunca trocam de resultado). Bases e cache são descartados quando algum
+    dos arquivos de origem muda (verificação a cada ``intervalo_verificacao`` s).
+
+    Atualizações incrementais publicadas em ``deltas/`` (``atualizacao``) entram na carga
+    e, depois, a cada verificação das fontes: a versão seguinte da base é montada ao lado
+    da atual e trocada de uma vez, sem segurar as consultas em andamento.
+
+    Os tempos de cada etapa (carga, validação, filtro categórico, vizinho numérico,
+    agregação e filtro de regras) e os contadores de status e de cache vão para
+    ``telemetria`` (por padrão a ``instrumentacao.TELEMETRIA`` do processo).
+    """
+
+    def __init__(self, base_dir='.', sistemas=None, cache=None, intervalo_verificacao=1.0, memoria_maxima=None,
+                 armazem=None, telemetria=None, compiladas=None):
+        self.base_dir = base_dir
+        self.compiladas = dict(compiladas or {})
+        self.telemetria = TELEMETRIA if telemetria is None else telemetria
+        self.armazem = armazem
+        self.sistemas = SISTEMAS if sistemas is None else sistemas
+        self.cache = cache
+        self.intervalo_verificacao = intervalo_verificacao
+        self.memoria_maxima = memoria_maxima
+        self.descartes = 0
+        self._bases = OrderedDict()
+        # ``_lock`` serializa as cargas; ``_lock_lru`` protege a ordem de uso das bases (leituras
+        # de bases já carregadas não esperam uma carga em andamento). Ordem: ``_lock`` antes de ``_lock_lru``
+        self._lock = threading.Lock()
+        self._lock_lru = threading.Lock()
+        # Uma thread por vez monta as versões novas; as demais seguem com a versão carregada
+        self._lock_versoes = threading.Lock()
+        # Última falha ao aplicar uma atualização incremental, por sistema (a versão anterior continua no ar)
+        self.falhas_atualizacao = {}
+        self._assinatura = None
+        self._verificado_em = None
+
+    def system_for(self, tensao_kv):
+        return system_name_for(tensao_kv, self.sistemas)
+
+    def database(self, nome_sistema):
+        with self._lock_lru:
+            base = self._bases.get(nome_sistema)
+            if base is not None:
+                self._bases.move_to_end(nome_sistema)
+                return base
+        with self._lock:
+            with self._lock_lru:
+                base = self._bases.get(nome_sistema)
+            if base is None:
+                with self.telemetria.stage('carga'):
+                    base = self._load(self.sistemas[nome_sistema])
+                    from .atualizacao import apply_pending  # atualizacao importa este módulo
+                    base = apply_pending(base, self.base_dir)
+                self.telemetria.count('cargas', sistema=nome_sistema)
+                with self._lock_lru:
+                    self._bases[nome_sistema] = base
+                    self._descartar_excedente(nome_sistema)
+        return base
+
+    def _load(self, config):
+        diretorio = self.compiladas.get(config.nome)
+        if diretorio is not None:
+            from .armazem import open_database  # armazem importa este módulo
+            try:
+                return open_database(config, diretorio)
+            except (OSError, KeyError, ValueError) as e:
+                raise DatabaseLoadError(f"Erro ao abrir a base compilada em {diretorio}: {e}") from e
+        if self.armazem is None or self.armazem is False:
+            return Database.load(config, self.base_dir)
+        from .armazem import load_shared  # armazem importa este módulo
+        return load_shared(config, self.base_dir, None if self.armazem is True else self.armazem)
+
+    def _descartar_excedente(self, manter):
+        # Chamado com ``_lock_lru``
+        if self.memoria_maxima is None:
+            return
+        while len(self._bases) > 1 and sum(base.nbytes for base in self._bases.values()) > self.memoria_maxima:
+            nome = next(n for n in list(self._bases) if n != manter)
+            del self._bases[nome]
+            self.descartes += 1
+
+    def loaded_systems(self):
+        """Sistemas carregados, do usado há mais tempo para o mais recente."""
+        with self._lock_lru:
+            return list(self._bases)
+
+    def memory_usage(self):
+        with self._lock_lru:
+            bases = list(self._bases.values())
+        return sum(base.nbytes for base in bases)
+
+    def warm(self, sistemas=None):
+        """Carrega os sistemas pedidos (todos por padrão), na ordem, respeitando o limite de memória.
+
+        Com ``memoria_maxima``, para assim que as bases carregadas chegam ao limite (a primeira
+        sempre sobe): as seguintes só descartariam as já aquecidas e ficam para a primeira consulta.
+        """
+        self.check_sources()
+        for nome in (self.sistemas if sistemas is None else sistemas):
+            self.database(nome)
+            if self.memoria_maxima is not None and self.memory_usage() >= self.memoria_maxima:
+                break
+        return self
+
+    def source_files(self):
+        return [os.path.join(self.base_dir, caminho)
+                for config in self.sistemas.values() for caminho in config.arquivos.values()]
+
+    def versions(self):
+        """Versão (``Database.versao``) de cada sistema carregado."""
+        with self._lock_lru:
+            bases = list(self._bases.items())
+        return {nome: base.versao for nome, base in bases}
+
+    def update_versions(self):
+        """Aplica os deltas publicados desde a versão carregada de cada sistema. Retorna os sistemas trocados.
+
+        Se outra thread já está montando uma versão, retorna na hora (sem esperar).
+        """
+        if not self._lock_versoes.acquire(blocking=False):
+            return []
+        from .atualizacao import apply_pending
+        trocados = []
+        try:
+            with self._lock_lru:
+                bases = list(self._bases.items())
+            for nome, base in bases:
+                inicio = time.perf_counter()
+                try:
+                    nova = apply_pending(base, self.base_dir)
+                except DatabaseLoadError as e:
+                    self.falhas_atualizacao[nome] = str(e)
+                    self.telemetria.count('atualizacoes', sistema=nome, status='erro')
+                    continue
+                self.falhas_atualizacao.pop(nome, None)
+                if nova is base:
+                    continue
+                with self._lock, self._lock_lru:
+                    # Só troca se a base não foi descartada (ou recarregada) nesse meio tempo
+                    if self._bases.get(nome) is base:
+                        self._bases[nome] = nova
+                        trocados.append(nome)
+                        self.telemetria.observe('atualizacao', time.perf_counter() - inicio)
+                        self.telemetria.count('atualizacoes', sistema=nome, status='ok')
+        finally:
+            self._lock_versoes.release()
+        return trocados
+
+    def check_sources(self, forcar=False):
+        """Descarta bases e resultados em cache se algum arquivo de origem mudou. Retorna True nesse caso.
+
+        Sem mudança nas origens, aplica as atualizações incrementais publicadas (``update_versions``).
+        """
+        agora = time.monotonic()
+        if not forcar and self._verificado_em is not None and agora - self._verificado_em < self.intervalo_verificacao:
+            return False
+        self._verificado_em = agora
+        assinatura = source_signature(self.source_files())
+        with self._lock:
+            mudou = self._assinatura is not None and assinatura != self._assinatura
+            self._assinatura = assinatura
+            if mudou:
+                with self._lock_lru:
+                    self._bases = OrderedDict()
+        if mudou and self.cache is not None:
+            self.cache.clear()
+        if not mudou:
+            self.update_versions()
+        return mudou
+
+    def cache_key(self, base, chave, posicoes, bloqueio_codigo, req_sup_codigo, pesos=None):
+        """Chave da avaliação: sistema e versão da base, chave categórica resolvida, cenários simulados
+        selecionados (``posicoes``), códigos de VB e RS e, no modo k-NN, os pesos de cada cenário."""
+        chave = (base.config.nome, base.versao, tuple(chave), np.asarray(posicoes, dtype=np.int64).tobytes(),
+                 bloqueio_codigo, req_sup_codigo)
+        return chave if pesos is None else chave + ((MODO_VIZINHOS, np.asarray(pesos, dtype=float).tobytes()),)
+
+    def recommend(self, cenario, vizinhos=None):
+        """Recomendação para ``cenario``.
+
+        Com ``vizinhos`` = k, as métricas vêm dos k cenários simulados mais próximos do
+        grupo categórico (capacidade, tensão e inércia normalizadas pela amplitude da base),
+        ponderadas pelo inverso da distância, em vez da cascata de empates exatos.
+        """
+        if vizinhos is not None and int(vizinhos) < 1:
+            raise ValueError(f"O número de vizinhos deve ser pelo menos 1: {vizinhos!r}")
+        vizinhos = None if vizinhos is None else int(vizinhos)
+        with self.telemetria.stage('validacao'):
+            inconsistencias = validate_scenario(cenario)
+        if inconsistencias:
+            return self._contar(Recommendation(cenario, STATUS_INCONSISTENTE, inconsistencias=inconsistencias))
+
+        self.check_sources()
+        sistema = self.system_for(cenario.tensao_kv)
+        base = self.database(sistema)
+        return self._contar(self._recommend(cenario, sistema, base, vizinhos))
+
+    def _contar(self, resultado):
+        self.telemetria.count('recomendacoes', status=resultado.status, sistema=resultado.sistema or '')
+        rastro = self.telemetria.current()
+        if rastro is not None:
+            rastro.atributos.update(status=resultado.status, sistema=resultado.sistema)
+        return resultado
+
+    def _contar_cache(self, acerto):
+        self.telemetria.count('cache', resultado='acerto' if acerto else 'falta')
+        rastro = self.telemetria.current()
+        if rastro is not None:
+            rastro.atributos['cache'] = acerto
+
+    def _recommend(self, cenario, sistema, base, vizinhos=None):
+        codigos = cenario.categorical_codes()
+        pesos = vizinhos_tabela = None
+
+        # --- BUSCA PELO CENÁRIO MAIS PRÓXIMO ---
+        # Mesma busca de ``ScenarioIndex.nearest``, com as duas etapas medidas separadamente
+        with self.telemetria.stage('filtro_categorico'):
+            chave = base.indice.categorico.resolve_key(codigos)
+            posicoes = base.indice.categorico.group(chave)
+        if posicoes is None:
+            posicoes = np.empty(0, dtype=np.int64)
+        else:
+            with self.telemetria.stage('vizinho_numerico'):
+                grupo = base.indice.numerico.group(chave, posicoes)
+                alvos = (cenario.capacidade_kw, cenario.tensao_kv, cenario.inercia_busca)
+                if vizinhos is None:
+                    posicoes = grupo.nearest(*alvos)
+                else:
+                    posicoes, distancias = grupo.nearest_k([alvos], vizinhos, base.indice.numerico.escalas)
+                    posicoes, distancias = posicoes[0], distancias[0]
+                    pesos = inverse_distance_weights(distancias)
+        if len(posicoes) == 0:
+            return Recommendation(cenario, STATUS_SEM_CENARIO, sistema=sistema, posicoes=posicoes)
+
+        modo, cenario_proximo, df_candidatos_completo, df_final_ordenado = self._evaluate_cached(
+            base, chave, posicoes, codigos[1], codigos[2], pesos)
+        if pesos is not None:
+            vizinhos_tabela = base.X_total_sim.iloc[posicoes].assign(Distancia=distancias, Peso=pesos)
+        status = STATUS_OK if not df_final_ordenado.empty else STATUS_SEM_AJUSTE
+        return Recommendation(
+            cenario, status, sistema=sistema, modo=modo, posicoes=posicoes, vizinhos=vizinhos_tabela,
+            cenario_proximo=cenario_proximo, candidatos=df_candidatos_completo, validos=df_final_ordenado,
+            elegiveis=base.config.eligible(codigos[1], codigos[2]),
+        )
+
+    def _evaluate_cached(self, base, chave, posicoes, bloqueio_codigo, req_sup_codigo, pesos=None):
+        # A chave vem do resultado da busca (e não das entradas arredondadas): dois cenários só
+        # compartilham a avaliação se selecionaram exatamente os mesmos cenários simulados
+        if self.cache is None:
+            return self.evaluate(base, posicoes, bloqueio_codigo, req_sup_codigo, pesos)
+        chave = self.cache_key(base, chave, posicoes, bloqueio_codigo, req_sup_codigo, pesos)
+        avaliacao = self.cache.get(chave)
+        self._contar_cache(avaliacao is not None)
+        if avaliacao is None:
+            avaliacao = self.evaluate(base, posicoes, bloqueio_codigo, req_sup_codigo, pesos)
+            self.cache.put(chave, avaliacao)
+        return avaliacao
+
+    def evaluate(self, base, posicoes, bloqueio_codigo, req_sup_codigo, pesos=None):
+        """Métricas, regras e limiares para os cenários simulados em ``posicoes`` da ``base``.
+
+        Com ``pesos`` (um por posição, modo k-NN), as métricas são a média ponderada e o
+        cenário mais próximo é o primeiro de ``posicoes``. Retorna (modo, cenário mais
+        próximo ou None, candidatos completos, válidos ordenados por BAC).
+        """
+        config = base.config
+        telemetria = self.telemetria
+        if pesos is not None:
+            modo = MODO_VIZINHOS
+            cenario_proximo = base.X_total_sim.iloc[posicoes[0]]
+        elif len(posicoes) == 1:
+            modo = MODO_UNICO
+            cenario_proximo = base.X_total_sim.iloc[posicoes[0]]
+        else:
+            # Vários cenários empatados: usa as médias de desempenho
+            modo = MODO_MEDIA
+            cenario_proximo = None
+
+        # --- MÉTRICAS DOS CANDIDATOS (uma linha por ajuste: BAC, FNR, FPR) ---
+        # Só as linhas de ``posicoes`` são lidas do tensor; nada de X ou de Y é copiado
+        with telemetria.stage('agregacao'):
+            colunas = base.candidate_columns
+            bloco = base.metricas[posicoes][:, colunas, :].reshape(len(posicoes), -1)
+            valores = (mean_metrics(bloco) if pesos is None
+                       else weighted_metrics(bloco, pesos)).reshape(len(colunas), len(METRICAS))
+
+            # Tabela de candidatos: colunas de parâmetros pré-juntadas na carga + as métricas calculadas
+            dados = dict(base.colunas_candidatos)
+            dados.update({metrica: valores[:, m] for m, metrica in enumerate(METRICAS)})
+            df_candidatos_completo = pd.DataFrame(dados, index=base.indice_candidatos, copy=False)
+
+        with telemetria.stage('filtro_regras'):
+            # --- APLICAR FILTROS DE ESPECIALISTA ---
+            # Cenário único: os limiares já estão no bitmap de aprovação do cenário (pré-calculado na
+            # carga); vários cenários: filtro de desempenho (regras "soft") sobre as médias.
+            # Ordena pelo maior BAC: o vencedor é o primeiro da lista
+            aprovacao = base.aprovacao[posicoes[0]] if modo == MODO_UNICO else None
+            ordem = valid_adjustments(config, valores, bloqueio_codigo, req_sup_codigo, aprovacao)
+            df_final_ordenado = df_candidatos_completo.take(ordem)
+        return modo, cenario_proximo, df_candidatos_completo, df_final_ordenado
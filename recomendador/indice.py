@@ -0,0 +1,562 @@
+"""Índices pré-computados sobre a base X para a busca do cenário mais próximo."""
+import numpy as np
+
+from .catalogo import INERCIA_DESCONHECIDA
+
+# Posição das colunas categóricas em X_total: Tipo_gd, VB, RS, TecAt, CR, Cgd
+COLUNAS_CATEGORICAS = slice(4, 10)
+
+# Pontos por folha da árvore k-d (grupos menores que isso são uma única folha)
+TAMANHO_FOLHA = 32
+
+# Código "desconhecido" tentado quando não há match exato (posição dentro das categóricas)
+FALLBACK_POR_COLUNA = {
+    3: 4,  # TecAt
+    4: 5,  # CR
+    5: 5,  # Cgd
+}
+
+
+class CategoricalIndex:
+    """Mapeia combinações de códigos categóricos para as posições das linhas de X.
+
+    As chaves são tuplas com um valor por coluna categórica, onde ``None`` significa
+    "coluna não filtrada". Isso cobre todos os estados possíveis da cascata de filtros
+    (colunas já filtradas, colunas ignoradas por falta de match e colunas ainda não
+    visitadas). Os grupos de prefixos estritos são montados na construção; os que
+    envolvem colunas ignoradas são montados no primeiro uso.
+    """
+
+    def __init__(self, codigos, fallback_por_coluna=None, grupos_prefixos=None):
+        self.codigos = np.asarray(codigos)
+        self.n_linhas, self.n_colunas = self.codigos.shape
+        self.fallback_por_coluna = FALLBACK_POR_COLUNA if fallback_por_coluna is None else fallback_por_coluna
+        self._grupos = {}
+        self._padroes_montados = set()
+        self._resolvidos = {}
+        if grupos_prefixos is not None:
+            # Grupos dos prefixos já montados fora (``CategoricalIndexBuilder``, ingestão em blocos)
+            self._grupos.update(grupos_prefixos)
+            self._padroes_montados.update(tuple(range(n)) for n in range(1, self.n_colunas + 1))
+        for n_prefixo in range(self.n_colunas + 1):
+            self._montar_padrao(tuple(range(n_prefixo)))
+
+    @classmethod
+    def from_frame(cls, x_total_sim, fallback_por_coluna=None):
+        return cls(x_total_sim.iloc[:, COLUNAS_CATEGORICAS].to_numpy(), fallback_por_coluna)
+
+    def _montar_padrao(self, colunas):
+        if colunas in self._padroes_montados:
+            return
+        if self.n_linhas and not colunas:
+            self._grupos[(None,) * self.n_colunas] = np.arange(self.n_linhas, dtype=np.int64)
+        elif self.n_linhas:
+            self._agrupar(colunas)
+        # Só marca como montado depois de preencher (o índice é compartilhado entre sessões)
+        self._padroes_montados.add(colunas)
+
+    def _agrupar(self, colunas):
+        sub = self.codigos[:, colunas]
+        # lexsort é estável: dentro de cada grupo as posições ficam em ordem crescente
+        ordem = np.lexsort(sub.T[::-1])
+        sub_ordenado = sub[ordem]
+        quebra = np.flatnonzero((sub_ordenado[1:] != sub_ordenado[:-1]).any(axis=1)) + 1
+        inicios = np.concatenate(([0], quebra))
+        fins = np.concatenate((quebra, [self.n_linhas]))
+        for inicio, fim in zip(inicios, fins):
+            chave = [None] * self.n_colunas
+            for j, col in enumerate(colunas):
+                chave[col] = sub_ordenado[inicio, j].item()
+            self._grupos[tuple(chave)] = ordem[inicio:fim]
+
+    def full_groups(self):
+        """Pares (chave, posições) das combinações com todas as colunas preenchidas."""
+        return [(chave, posicoes) for chave, posicoes in list(self._grupos.items())
+                if None not in chave]
+
+    def prefix_groups(self):
+        """Pares (chave, posições) dos grupos de prefixos (as primeiras colunas preenchidas, as demais livres)."""
+        grupos = []
+        for chave, posicoes in list(self._grupos.items()):
+            nivel = sum(v is not None for v in chave)
+            if nivel and all(v is not None for v in chave[:nivel]):
+                grupos.append((chave, posicoes))
+        return grupos
+
+    def group(self, chave):
+        """Posições das linhas que batem com a chave (``None`` = coluna livre), ou None."""
+        chave = tuple(chave)
+        padrao = tuple(i for i, v in enumerate(chave) if v is not None)
+        if padrao not in self._padroes_montados:
+            self._montar_padrao(padrao)
+        return self._grupos.get(chave)
+
+    def resolve_key(self, valores_usuario):
+        """Aplica a cascata de filtros e retorna a chave do grupo final."""
+        valores_usuario = tuple(valores_usuario)
+        chave = self._resolvidos.get(valores_usuario)
+        if chave is not None:
+            return chave
+
+        atual = [None] * self.n_colunas
+        for i, valor_usuario in enumerate(valores_usuario):
+            # Tente filtro exato
+            atual[i] = valor_usuario
+            if self.group(atual) is not None:
+                continue
+            # Se esta coluna tem fallback, tenta "desconhecido"
+            if i in self.fallback_por_coluna:
+                atual[i] = self.fallback_por_coluna[i]
+                if self.group(atual) is not None:
+                    continue
+            # Sem match nem com fallback: não reduzimos por esta coluna
+            atual[i] = None
+
+        chave = tuple(atual)
+        self._resolvidos[valores_usuario] = chave
+        return chave
+
+    def lookup(self, valores_usuario):
+        """Posições (em ordem crescente) dos cenários compatíveis com as entradas do usuário."""
+        posicoes = self.group(self.resolve_key(valores_usuario))
+        if posicoes is None:
+            return np.empty(0, dtype=np.int64)
+        return posicoes
+
+    def extended(self, codigos_novos):
+        """Novo índice com as linhas de ``codigos_novos`` anexadas ao fim (este continua válido).
+
+        Só os grupos de prefixos que recebem linhas são refeitos (posições antigas seguidas
+        das novas, ainda crescentes); os demais arrays de posições são compartilhados.
+        """
+        codigos_novos = np.asarray(codigos_novos, dtype=self.codigos.dtype).reshape(-1, self.n_colunas)
+        construtor = CategoricalIndexBuilder(self.n_colunas, self.fallback_por_coluna, inicio=self.n_linhas)
+        construtor.add(codigos_novos)
+        grupos = dict(self.prefix_groups())
+        for chave, posicoes in construtor.groups().items():
+            antigas = grupos.get(chave)
+            grupos[chave] = posicoes if antigas is None else np.concatenate([antigas, posicoes])
+        return CategoricalIndex(np.concatenate([self.codigos, codigos_novos]), self.fallback_por_coluna, grupos)
+
+
+class CategoricalIndexBuilder:
+    """Monta os grupos de prefixos de um ``CategoricalIndex`` bloco a bloco.
+
+    Usado na ingestão em streaming: cada bloco de linhas de X é agrupado ao chegar e só
+    as posições ficam guardadas. Como os blocos chegam em ordem, as posições de cada
+    grupo continuam crescentes, como no ``lexsort`` estável da construção direta.
+    """
+
+    def __init__(self, n_colunas, fallback_por_coluna=None, inicio=0):
+        self.n_colunas = n_colunas
+        self.fallback_por_coluna = fallback_por_coluna
+        # Posição da primeira linha (diferente de zero quando as linhas são anexadas a uma base existente)
+        self.inicio = inicio
+        self.n_linhas = inicio
+        self._partes = {tuple(range(n)): {} for n in range(1, n_colunas + 1)}
+
+    def add(self, codigos):
+        codigos = np.asarray(codigos)
+        if not len(codigos):
+            return
+        for colunas, partes in self._partes.items():
+            chaves, inverso = np.unique(codigos[:, colunas], axis=0, return_inverse=True)
+            inverso = inverso.reshape(-1)
+            ordem = np.argsort(inverso, kind='stable') + self.n_linhas
+            fins = np.cumsum(np.bincount(inverso, minlength=len(chaves)))
+            for valores, posicoes in zip(chaves.tolist(), np.split(ordem, fins[:-1])):
+                chave = [None] * self.n_colunas
+                for col, valor in zip(colunas, valores):
+                    chave[col] = valor
+                partes.setdefault(tuple(chave), []).append(posicoes)
+        self.n_linhas += len(codigos)
+
+    def groups(self):
+        """Grupos de prefixos montados até aqui: chave -> posições crescentes."""
+        return {chave: np.concatenate(posicoes).astype(np.int64, copy=False)
+                for partes in self._partes.values() for chave, posicoes in partes.items()}
+
+    def build(self, codigos):
+        """Índice final sobre ``codigos`` (o array completo, ex.: um memmap gravado pela ingestão)."""
+        if len(codigos) != self.n_linhas:
+            raise ValueError(f"Índice montado com {self.n_linhas} linhas, mas a base tem {len(codigos)}")
+        return CategoricalIndex(codigos, self.fallback_por_coluna, self.groups())
+
+
+def _faixa_igual(valores, inicio, fim, valor):
+    return (inicio + int(np.searchsorted(valores[inicio:fim], valor, 'left')),
+            inicio + int(np.searchsorted(valores[inicio:fim], valor, 'right')))
+
+
+def _mais_proximos(valores, faixas, alvo, distancia, lado='left'):
+    """Dentro de faixas ordenadas por ``valores``, seleciona as linhas de menor distância ao alvo.
+
+    ``distancia`` retorna None para valores inadmissíveis. A busca parte da posição de
+    inserção do alvo (O(log n)) e só anda sobre valores distintos empatados.
+    Retorna (menor distância, faixas selecionadas).
+    """
+    melhor = None
+    escolhidas = []
+    for inicio, fim in faixas:
+        k = inicio + int(np.searchsorted(valores[inicio:fim], alvo, lado))
+        for j, passo in ((k - 1, -1), (k, 1)):
+            while inicio <= j < fim:
+                d = distancia(valores[j])
+                if d is None or (melhor is not None and d > melhor):
+                    break
+                if melhor is None or d < melhor:
+                    melhor = d
+                    escolhidas = []
+                a, b = _faixa_igual(valores, inicio, fim, valores[j])
+                escolhidas.append((a, b))
+                j = a - 1 if passo < 0 else b
+    return melhor, escolhidas
+
+
+def _n_linhas(faixas):
+    return sum(b - a for a, b in faixas)
+
+
+def _mais_proximos_grade(valores, grade):
+    """Versão vetorizada de ``_mais_proximos`` sobre valores distintos ordenados, para uma grade de alvos.
+
+    Retorna (i, j) por alvo: índice do valor mais próximo e do empatado do outro lado (-1 se não houver).
+    """
+    k = np.searchsorted(valores, grade, 'left')
+    abaixo = np.clip(k - 1, 0, len(valores) - 1)
+    acima = np.clip(k, 0, len(valores) - 1)
+    d_abaixo, d_acima = np.abs(valores[abaixo] - grade), np.abs(valores[acima] - grade)
+    i = np.where(d_acima < d_abaixo, acima, abaixo)
+    j = np.where((d_acima == d_abaixo) & (acima != abaixo), acima, -1)
+    return i, j
+
+
+def _chaves_grade(valores, grade, inercia):
+    """Chave (regra, i, j) por alvo da grade: alvos de mesma chave selecionam as mesmas linhas."""
+    i, j = _mais_proximos_grade(valores, grade)
+    if not inercia:
+        return np.stack([np.zeros_like(i), i, j], axis=1)
+    # Regras da inércia: H igual (exato, ou só próximo, que não seleciona nada), menor H acima, mais próximo abaixo
+    igual = np.isclose(np.abs(valores[i] - grade), 0.0, atol=1e-9)
+    k = np.searchsorted(valores, grade, 'right')
+    tem_acima = k < len(valores)
+    regra = np.where(igual, np.where(valores[i] == grade, 0, 1), np.where(tem_acima, 2, 3))
+    primeiro = np.where(~igual & tem_acima, k, i)
+    segundo = np.where(igual | tem_acima, -1, j)
+    return np.stack([regra, primeiro, segundo], axis=1)
+
+
+class KDTree:
+    """Árvore k-d (divisão pela mediana da coordenada de maior amplitude) para k vizinhos mais próximos.
+
+    Só as folhas (até ``tamanho_folha`` pontos) e suas caixas são guardadas, com os
+    pontos de cada folha num bloco de tamanho fixo. A consulta é vetorizada sobre o lote
+    de alvos: os pontos da folha mais próxima de cada alvo dão um raio (a k-ésima
+    distância encontrada nela); só as folhas cuja caixa está dentro desse raio são
+    examinadas, e só os pontos dentro do raio entram na ordenação final.
+    """
+
+    # Alvos por bloco numa consulta em lote (limita a matriz alvo x folha)
+    BLOCO_CONSULTA = 4096
+
+    def __init__(self, pontos, tamanho_folha=TAMANHO_FOLHA):
+        pontos = np.asarray(pontos, dtype=float)
+        self.n, dimensoes = pontos.shape
+        folhas = []
+        pilha = [np.arange(self.n)]
+        while pilha:
+            indices = pilha.pop()
+            if not len(indices):
+                continue
+            sub = pontos[indices]
+            amplitude = sub.max(axis=0) - sub.min(axis=0)
+            if len(indices) <= tamanho_folha or not amplitude.any():
+                folhas.append(indices)
+                continue
+            coordenada = int(np.argmax(amplitude))
+            meio = len(indices) // 2
+            particao = np.argpartition(sub[:, coordenada], meio)
+            pilha += [indices[particao[meio:]], indices[particao[:meio]]]
+        # Folhas em blocos (folha x ponto): posições vagas com índice -1 e coordenadas infinitas
+        largura = max((len(f) for f in folhas), default=0)
+        self.indices = np.full((len(folhas), largura), -1, dtype=np.int64)
+        self.pontos = np.full((len(folhas), largura, dimensoes), np.inf)
+        for i, folha in enumerate(folhas):
+            self.indices[i, :len(folha)] = folha
+            self.pontos[i, :len(folha)] = pontos[folha]
+        self.menor_folha = min((len(f) for f in folhas), default=1)
+        self.minimos = np.array([pontos[f].min(axis=0) for f in folhas]).reshape(-1, dimensoes)
+        self.maximos = np.array([pontos[f].max(axis=0) for f in folhas]).reshape(-1, dimensoes)
+
+    def __len__(self):
+        return self.n
+
+    def query(self, alvos, k):
+        """(índices, distâncias) dos ``min(k, n)`` pontos mais próximos de cada alvo, do mais perto ao mais longe.
+
+        ``alvos`` é (n_alvos, n_coordenadas); empates de distância saem na ordem dos pontos.
+        """
+        alvos = np.atleast_2d(np.asarray(alvos, dtype=float))
+        k = min(int(k), self.n)
+        indices = np.full((len(alvos), k), -1, dtype=np.int64)
+        distancias = np.full((len(alvos), k), np.inf)
+        if not k:
+            return indices, distancias
+        if len(self.indices) == 1:
+            # Uma folha só (o caso dos grupos pequenos): força bruta
+            d = self._distancias(alvos, np.zeros(len(alvos), dtype=np.int64))
+            escolha = np.lexsort((np.broadcast_to(self.indices[0], d.shape), d), axis=-1)[:, :k]
+            return self.indices[0][escolha], np.take_along_axis(d, escolha, axis=1)
+        for inicio in range(0, len(alvos), self.BLOCO_CONSULTA):
+            bloco = slice(inicio, inicio + self.BLOCO_CONSULTA)
+            indices[bloco], distancias[bloco] = self._consultar(alvos[bloco], k)
+        return indices, distancias
+
+    def _distancias(self, alvos, folhas):
+        """(alvo, ponto) para a(s) folha(s) de cada alvo; ``folhas`` é (n_alvos,) ou (n_alvos, n_folhas)."""
+        pontos = self.pontos[folhas].reshape(len(alvos), -1, self.pontos.shape[2]) if len(alvos) else self.pontos[:0]
+        with np.errstate(invalid='ignore'):
+            return np.sqrt(((pontos - alvos[:, None]) ** 2).sum(axis=-1))
+
+    def _consultar(self, alvos, k):
+        m, n_folhas = len(alvos), len(self.indices)
+        # Distância mínima de cada alvo à caixa de cada folha
+        fora = (np.maximum(self.minimos[None] - alvos[:, None], 0.0)
+                + np.maximum(alvos[:, None] - self.maximos[None], 0.0))
+        limite = np.sqrt((fora ** 2).sum(axis=-1))
+        # As folhas mais próximas de cada alvo, em número suficiente para somar k pontos: a k-ésima
+        # distância encontrada nelas é um raio que contém os k vizinhos
+        n_proximas = min(n_folhas, -(-k // self.menor_folha))
+        if n_proximas < n_folhas:
+            proximas = np.argpartition(limite, n_proximas - 1, axis=1)[:, :n_proximas]
+        else:
+            proximas = np.broadcast_to(np.arange(n_folhas), (m, n_folhas))
+        d = self._distancias(alvos, proximas)
+        raio = np.partition(d, k - 1, axis=1)[:, k - 1]
+        candidatas = limite <= raio[:, None]
+        candidatas[np.arange(m)[:, None], proximas] = False
+        consultas, folhas = np.nonzero(candidatas)
+
+        largura = self.indices.shape[1]
+        consulta = np.concatenate([np.repeat(np.arange(m), d.shape[1]), np.repeat(consultas, largura)])
+        distancia = np.concatenate([d.ravel(), self._distancias(alvos[consultas], folhas).ravel()])
+        indice = np.concatenate([self.indices[proximas].ravel(), self.indices[folhas].ravel()])
+        dentro = distancia <= raio[consulta]
+        consulta, distancia, indice = consulta[dentro], distancia[dentro], indice[dentro]
+        # Por alvo: menor distância primeiro, empates pelo índice do ponto; ficam os k primeiros
+        ordem = np.lexsort((indice, distancia, consulta))
+        contagem = np.bincount(consulta, minlength=m)
+        posicao = np.arange(len(ordem)) - np.repeat(np.cumsum(contagem) - contagem, contagem)
+        escolhidos = ordem[posicao < k]
+        return indice[escolhidos].reshape(m, k), distancia[escolhidos].reshape(m, k)
+
+
+class NumericGroup:
+    """Linhas de um grupo categórico ordenadas por (capacidade, tensão, inércia)."""
+
+    def __init__(self, posicoes, capacidade_kw, vn_kv, h):
+        ordem = np.lexsort((h[posicoes], vn_kv[posicoes], capacidade_kw[posicoes]))
+        self.posicoes = posicoes[ordem]
+        self.capacidade_kw = capacidade_kw[self.posicoes]
+        self.vn_kv = vn_kv[self.posicoes]
+        self.h = h[self.posicoes]
+        self._arvores = {}
+
+    def nearest_k(self, alvos, k, escalas):
+        """k cenários mais próximos de cada alvo (capacidade, tensão, inércia) e as distâncias.
+
+        A distância é euclidiana, com cada coordenada dividida pela escala correspondente;
+        a árvore k-d do grupo é montada no primeiro uso. Retorna (posições, distâncias),
+        ambas (n_alvos, min(k, linhas do grupo)).
+        """
+        escalas = tuple(escalas)
+        arvore = self._arvores.get(escalas)
+        if arvore is None:
+            arvore = KDTree(np.column_stack([self.capacidade_kw, self.vn_kv, self.h]) / np.asarray(escalas))
+            self._arvores[escalas] = arvore
+        indices, distancias = arvore.query(np.atleast_2d(np.asarray(alvos, dtype=float)) / np.asarray(escalas), k)
+        return self.posicoes[indices], distancias
+
+    def nearest(self, f1_capacidade, f2_tensao, f3_inercia):
+        if not len(self.posicoes):
+            return self.posicoes
+
+        # 1. Capacidade mais próxima (empates ficam todos)
+        _, faixas = _mais_proximos(self.capacidade_kw, [(0, len(self.posicoes))], f1_capacidade,
+                                   lambda v: abs(v - f1_capacidade))
+
+        # 2. Desempate por tensão; dentro de cada faixa de capacidade a tensão está ordenada
+        if _n_linhas(faixas) > 1:
+            _, faixas = _mais_proximos(self.vn_kv, faixas, f2_tensao, lambda v: abs(v - f2_tensao))
+
+        # 3. Desempate por inércia: H igual ao alvo, senão o menor H acima do alvo,
+        #    senão o(s) mais próximo(s) abaixo
+        if _n_linhas(faixas) > 1:
+            min_diff_h, faixas_abs = _mais_proximos(self.h, faixas, f3_inercia, lambda v: abs(v - f3_inercia))
+            if np.isclose(min_diff_h, 0.0, atol=1e-9):
+                faixas = [_faixa_igual(self.h, a, b, f3_inercia) for a, b in faixas]
+            else:
+                menor_positivo, faixas_acima = _mais_proximos(
+                    self.h, faixas, f3_inercia,
+                    lambda v: v - f3_inercia if v - f3_inercia > 0 else None, lado='right')
+                faixas = faixas_acima if menor_positivo is not None else faixas_abs
+
+        if not faixas:
+            return self.posicoes[:0]
+        return np.sort(np.concatenate([self.posicoes[a:b] for a, b in faixas]))
+
+    def _faixas_ate(self, etapa, f1_capacidade, f2_tensao):
+        """Faixas que chegam à etapa da cascata (0 capacidade, 1 tensão, 2 inércia) com os alvos anteriores."""
+        faixas = [(0, len(self.posicoes))]
+        if etapa >= 1:
+            _, faixas = _mais_proximos(self.capacidade_kw, faixas, f1_capacidade, lambda v: abs(v - f1_capacidade))
+        if etapa >= 2 and _n_linhas(faixas) > 1:
+            _, faixas = _mais_proximos(self.vn_kv, faixas, f2_tensao, lambda v: abs(v - f2_tensao))
+        return faixas
+
+    def nearest_grid(self, eixo, grade, f1_capacidade, f2_tensao, f3_inercia):
+        """``nearest`` para cada alvo de ``grade`` no eixo ``eixo`` (0 capacidade, 1 tensão, 2 inércia).
+
+        Os outros dois alvos ficam fixos. Um único ``searchsorted`` da grade sobre os
+        valores distintos do eixo (nas linhas que chegam a essa etapa da cascata) separa
+        os alvos em classes que selecionam as mesmas linhas; ``nearest`` roda uma vez por
+        classe. Retorna (classe de cada alvo, posições de cada classe).
+        """
+        grade = np.asarray(grade, dtype=float)
+        if not len(grade):
+            return np.empty(0, dtype=np.int64), []
+        alvos = [f1_capacidade, f2_tensao, f3_inercia]
+        faixas = self._faixas_ate(eixo, f1_capacidade, f2_tensao)
+        if not len(self.posicoes) or (eixo > 0 and _n_linhas(faixas) <= 1):
+            # O eixo varrido nem chega a ser usado no desempate: o resultado é o mesmo em toda a grade
+            classes, representantes = np.zeros(len(grade), dtype=np.int64), grade[:1]
+        else:
+            valores = (self.capacidade_kw, self.vn_kv, self.h)[eixo]
+            distintos = np.unique(np.concatenate([valores[a:b] for a, b in faixas]))
+            chaves = _chaves_grade(distintos, grade, inercia=eixo == 2)
+            _, primeiros, classes = np.unique(chaves, axis=0, return_index=True, return_inverse=True)
+            representantes = grade[primeiros]
+        posicoes = []
+        for alvo in representantes.tolist():
+            alvos[eixo] = alvo
+            posicoes.append(self.nearest(*alvos))
+        return classes.reshape(-1), posicoes
+
+
+class NumericIndex:
+    """Índices numéricos ordenados por grupo categórico (chave do ``CategoricalIndex``)."""
+
+    def __init__(self, capacidade_kw, vn_kv, h):
+        self.capacidade_kw = np.asarray(capacidade_kw, dtype=float)
+        self.vn_kv = np.asarray(vn_kv, dtype=float)
+        self.h = np.asarray(h, dtype=float)
+        self._grupos = {}
+        self._escalas = None
+
+    @property
+    def escalas(self):
+        """Escala de cada coordenada na distância do k-NN: a amplitude dos valores da base (1 se constante).
+
+        A inércia desconhecida (``INERCIA_DESCONHECIDA``) fica fora da amplitude de H.
+        """
+        if self._escalas is None:
+            h = self.h[self.h != INERCIA_DESCONHECIDA]
+            escalas = []
+            for valores in (self.capacidade_kw, self.vn_kv, h):
+                amplitude = float(valores.max() - valores.min()) if len(valores) else 0.0
+                escalas.append(amplitude if amplitude > 0 else 1.0)
+            self._escalas = tuple(escalas)
+        return self._escalas
+
+    @classmethod
+    def from_frame(cls, x_total_sim):
+        # Base em W e V; entradas do usuário em kW e kV
+        return cls(x_total_sim.iloc[:, 1].to_numpy() / 1000.0,
+                   x_total_sim.iloc[:, 2].to_numpy() / 1000.0,
+                   x_total_sim.iloc[:, 3].to_numpy())
+
+    def group(self, chave, posicoes):
+        grupo = self._grupos.get(chave)
+        if grupo is None:
+            grupo = NumericGroup(posicoes, self.capacidade_kw, self.vn_kv, self.h)
+            self._grupos[chave] = grupo
+        return grupo
+
+    def extended(self, capacidade_kw, vn_kv, h, codigos_novos):
+        """Novo índice com linhas anexadas ao fim; ``codigos_novos`` são os códigos categóricos delas.
+
+        Os grupos cuja chave não casa com nenhuma linha nova são reaproveitados como estão;
+        os demais são remontados no primeiro uso.
+        """
+        numerico = NumericIndex(np.concatenate([self.capacidade_kw, np.asarray(capacidade_kw, dtype=float)]),
+                                np.concatenate([self.vn_kv, np.asarray(vn_kv, dtype=float)]),
+                                np.concatenate([self.h, np.asarray(h, dtype=float)]))
+        codigos_novos = np.asarray(codigos_novos)
+        for chave, grupo in list(self._grupos.items()):
+            colunas = [i for i, v in enumerate(chave) if v is not None]
+            valores = [chave[i] for i in colunas]
+            if not (codigos_novos[:, colunas] == valores).all(axis=1).any():
+                numerico._grupos[chave] = grupo
+        return numerico
+
+
+class ScenarioIndex:
+    """Índice completo da base X: cascata categórica + desempate numérico."""
+
+    def __init__(self, categorico, numerico):
+        self.categorico = categorico
+        self.numerico = numerico
+        # Pré-monta os grupos numéricos das combinações categóricas completas
+        for chave, posicoes in categorico.full_groups():
+            numerico.group(chave, posicoes)
+
+    @classmethod
+    def from_frame(cls, x_total_sim):
+        return cls(CategoricalIndex.from_frame(x_total_sim), NumericIndex.from_frame(x_total_sim))
+
+    def extended(self, codigos, capacidade_kw, vn_kv, h):
+        """Índice com linhas novas anexadas ao fim da base, sem remontar os grupos que elas não tocam.
+
+        Este índice não muda: quem já o está usando continua vendo a base anterior.
+        """
+        codigos = np.asarray(codigos).reshape(-1, self.categorico.n_colunas)
+        return ScenarioIndex(self.categorico.extended(codigos),
+                             self.numerico.extended(capacidade_kw, vn_kv, h, codigos))
+
+    def candidates(self, valores_usuario):
+        return self.categorico.lookup(valores_usuario)
+
+    def nearest(self, valores_usuario, f1_capacidade, f2_tensao, f3_inercia):
+        """Posições dos cenários mais próximos (vazio se não houver cenário compatível)."""
+        chave = self.categorico.resolve_key(valores_usuario)
+        posicoes = self.categorico.group(chave)
+        if posicoes is None:
+            return np.empty(0, dtype=np.int64)
+        return self.numerico.group(chave, posicoes).nearest(f1_capacidade, f2_tensao, f3_inercia)
+
+    def nearest_k(self, valores_usuario, f1_capacidade, f2_tensao, f3_inercia, k):
+        """(posições, distâncias) dos k cenários mais próximos no grupo categórico, do mais perto ao mais longe."""
+        (posicoes, distancias), = self.nearest_k_many([valores_usuario], [(f1_capacidade, f2_tensao, f3_inercia)], k)
+        return posicoes, distancias
+
+    def nearest_k_many(self, valores_usuario, alvos, k):
+        """``nearest_k`` para um lote: consultas do mesmo grupo categórico vão juntas para a árvore do grupo.
+
+        ``valores_usuario`` traz os códigos categóricos de cada consulta e ``alvos`` a
+        (capacidade, tensão, inércia). Retorna uma lista de (posições, distâncias).
+        """
+        alvos = np.asarray(alvos, dtype=float).reshape(-1, 3)
+        por_chave = {}
+        for i, codigos in enumerate(valores_usuario):
+            por_chave.setdefault(self.categorico.resolve_key(codigos), []).append(i)
+        vazio = (np.empty(0, dtype=np.int64), np.empty(0))
+        saida = [vazio] * len(alvos)
+        for chave, indices in por_chave.items():
+            posicoes = self.categorico.group(chave)
+            if posicoes is None:
+                continue
+            vizinhos, distancias = self.numerico.group(chave, posicoes).nearest_k(
+                alvos[indices], k, self.numerico.escalas)
+            for i, p, d in zip(indices, vizinhos, distancias):
+                saida[i] = (p, d)
+        return saida
@@ -0,0 +1,412 @@
+"""Ingestão em blocos (streaming) das bases X/Y, para campanhas grandes demais para o Excel.
+
+X e Y são lidos em blocos de linhas (CSV, grupos de linhas de Parquet ou .xlsx em modo
+somente leitura do openpyxl). A cada bloco, os códigos categóricos entram no índice
+(``indice.CategoricalIndexBuilder``) e as colunas de X, os eixos numéricos e as métricas
+dos ajustes candidatos são anexados a arquivos em disco. No fim, o diretório tem o
+formato do armazém (``armazem.open_database``): a ``Database`` é aberta com ``mmap``, e o
+motor, o lote e o serviço a usam no lugar das planilhas do sistema com
+``Recommender(compiladas={'AT': destino})`` (no lote, ``--compilada AT=destino``).
+
+A memória de pico fica em um bloco de X e Y mais as posições do índice, independente
+do tamanho dos arquivos. As linhas de Y são casadas com as de X pela posição, como no
+``reindex`` de ``engine.build_metrics_tensor``.
+
+Uso::
+
+    python -m recomendador.ingestao AT --x X_total.csv --y Metricas_Y.parquet --destino bases_AT
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from .armazem import FORMATO_ARMAZEM, MANIFESTO, open_database, save_frame, save_prefix_groups
+from .cache import column_to_array, file_sha256
+from .catalogo import SISTEMAS, VERSAO_CATALOGO
+from .engine import DTYPE_METRICAS, METRICAS, PADRAO_COLUNA_METRICA, DatabaseLoadError, load_parameter_database
+from .indice import COLUNAS_CATEGORICAS, CategoricalIndexBuilder
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TAMANHO_BLOCO = 50_000
+
+
+def _nomes_pandas(cabecalho):
+    """Nomes de coluna como o pandas monta: vazios viram ``Unnamed: i`` e duplicados ganham ``.1``, ``.2``..."""
+    nomes, vistos = [], set()
+    for i, nome in enumerate(cabecalho):
+        nome = f'Unnamed: {i}' if nome is None else str(nome)
+        base, n = nome, 0
+        while nome in vistos:
+            n += 1
+            nome = f'{base}.{n}'
+        vistos.add(nome)
+        nomes.append(nome)
+    return nomes
+
+
+def _colunas_csv(caminho, planilha=None):
+    return list(pd.read_csv(caminho, nrows=0).columns)
+
+
+def _blocos_csv(caminho, tamanho_bloco, planilha=None, colunas=None):
+    # round_trip: o conversor rápido padrão pode errar o último dígito (99.02 != 99.02000000000001)
+    yield from pd.read_csv(caminho, chunksize=tamanho_bloco, usecols=colunas, float_precision='round_trip')
+
+
+def _colunas_parquet(caminho, planilha=None):
+    import pyarrow.parquet as pq
+
+    return list(pq.read_schema(caminho).names)
+
+
+def _blocos_parquet(caminho, tamanho_bloco, planilha=None, colunas=None):
+    import pyarrow.parquet as pq
+
+    arquivo = pq.ParquetFile(caminho)
+    for lote in arquivo.iter_batches(batch_size=tamanho_bloco, columns=colunas):
+        yield lote.to_pandas()
+
+
+def _colunas_xlsx(caminho, planilha=None):
+    import openpyxl
+
+    livro = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        folha = livro[planilha] if planilha else livro.worksheets[0]
+        return _nomes_pandas(next(folha.iter_rows(values_only=True, max_row=1), ()))
+    finally:
+        livro.close()
+
+
+def _blocos_xlsx(caminho, tamanho_bloco, planilha=None, colunas=None):
+    # O openpyxl lê a linha inteira de qualquer jeito; ``colunas`` só é aplicado no fim de cada bloco
+    import openpyxl
+
+    livro = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        folha = livro[planilha] if planilha else livro.worksheets[0]
+        linhas = folha.iter_rows(values_only=True)
+        nomes = _nomes_pandas(next(linhas, ()))
+        largura = len(nomes)
+        vazia = (None,) * largura
+        bloco, vazias_pendentes = [], 0
+        for linha in linhas:
+            if all(v is None for v in linha):
+                # Linhas vazias no fim da planilha são descartadas (como no read_excel)
+                vazias_pendentes += 1
+                continue
+            for _ in range(vazias_pendentes):
+                bloco.append(vazia)
+                if len(bloco) >= tamanho_bloco:
+                    yield _selecionar(pd.DataFrame(bloco, columns=nomes), colunas)
+                    bloco = []
+            vazias_pendentes = 0
+            bloco.append(tuple(linha[:largura]) + (None,) * (largura - len(linha)))
+            if len(bloco) >= tamanho_bloco:
+                yield _selecionar(pd.DataFrame(bloco, columns=nomes), colunas)
+                bloco = []
+        if bloco:
+            yield _selecionar(pd.DataFrame(bloco, columns=nomes), colunas)
+    finally:
+        livro.close()
+
+
+def _selecionar(df, colunas):
+    return df if colunas is None else df[colunas]
+
+
+# Extensão -> (cabeçalho, blocos)
+LEITORES = {
+    '.csv': (_colunas_csv, _blocos_csv),
+    '.parquet': (_colunas_parquet, _blocos_parquet),
+    '.xlsx': (_colunas_xlsx, _blocos_xlsx),
+    '.xlsm': (_colunas_xlsx, _blocos_xlsx),
+}
+
+
+def _leitor(caminho):
+    extensao = os.path.splitext(caminho)[1].lower()
+    leitor = LEITORES.get(extensao)
+    if leitor is None:
+        raise ValueError(f"Formato não suportado na ingestão: {extensao} (use {', '.join(LEITORES)})")
+    return leitor
+
+
+def read_columns(caminho, planilha=None):
+    """Nomes das colunas de ``caminho``, com duplicados renomeados como no pandas."""
+    return _leitor(caminho)[0](caminho, planilha)
+
+
+def read_chunks(caminho, tamanho_bloco=TAMANHO_BLOCO, planilha=None, colunas=None):
+    """Itera sobre ``caminho`` em DataFrames de até ``tamanho_bloco`` linhas (o formato vem da extensão).
+
+    ``colunas`` limita a leitura às colunas pedidas (no CSV e no Parquet, as outras nem são convertidas).
+    """
+    return _leitor(caminho)[1](caminho, tamanho_bloco, planilha, colunas)
+
+
+class _FilaLinhas:
+    """Entrega exatamente ``n`` linhas por vez de blocos de tamanhos quaisquer (ex.: grupos do Parquet)."""
+
+    def __init__(self, blocos):
+        self._blocos = iter(blocos)
+        self._resto = None
+        self.linhas_lidas = 0
+
+    def take(self, n):
+        partes = []
+        while n:
+            if self._resto is None or not len(self._resto):
+                self._resto = next(self._blocos, None)
+                if self._resto is None:
+                    break
+                self.linhas_lidas += len(self._resto)
+            parte, self._resto = self._resto.iloc[:n], self._resto.iloc[n:]
+            partes.append(parte)
+            n -= len(parte)
+        return partes
+
+
+class _ArrayIncremental:
+    """Anexa blocos de um array a um arquivo bruto e monta o .npy final sem juntar tudo em memória.
+
+    Para textos, a largura final é a do maior bloco (cada bloco é gravado na sua largura);
+    com ``dtype=None``, o tipo final é o que comporta todos os blocos (ex.: inteiros e floats).
+    """
+
+    def __init__(self, caminho, dtype, forma=()):
+        self.caminho = caminho
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.forma = tuple(forma)
+        self.n = 0
+        self._segmentos = []
+        self._bruto = open(f'{caminho}.parcial', 'wb')
+
+    def append(self, bloco):
+        if self.dtype is None or self.dtype.kind == 'U':
+            bloco = np.ascontiguousarray(bloco)
+        else:
+            bloco = np.ascontiguousarray(bloco, self.dtype)
+        if bloco.shape[1:] != self.forma:
+            raise ValueError(f"Bloco com forma {bloco.shape[1:]} em {os.path.basename(self.caminho)}; "
+                             f"esperado {self.forma}")
+        self._bruto.write(bloco.tobytes())
+        self._segmentos.append((bloco.dtype, len(bloco)))
+        self.n += len(bloco)
+
+    def finish(self):
+        self._bruto.close()
+        dtype = self.dtype
+        if dtype is None or dtype.kind == 'U':
+            tipos = [d for d, _ in self._segmentos] + ([] if dtype is None else [dtype])
+            try:
+                dtype = np.result_type(*tipos) if tipos else np.dtype(np.float64)
+            except TypeError:
+                raise ValueError(f"Blocos de tipos incompatíveis em {os.path.basename(self.caminho)}: "
+                                 f"{sorted({str(d) for d in tipos})}") from None
+        saida = np.lib.format.open_memmap(self.caminho, mode='w+', dtype=dtype, shape=(self.n,) + self.forma)
+        inicio, deslocamento = 0, 0
+        for dtype_bloco, n in self._segmentos:
+            itens = n * int(np.prod(self.forma, dtype=np.int64))
+            saida[inicio:inicio + n] = np.fromfile(
+                f'{self.caminho}.parcial', dtype=dtype_bloco, count=itens, offset=deslocamento,
+            ).reshape((n,) + self.forma)
+            inicio += n
+            deslocamento += itens * dtype_bloco.itemsize
+        saida.flush()
+        del saida
+        os.remove(f'{self.caminho}.parcial')
+
+    def discard(self):
+        self._bruto.close()
+        os.remove(f'{self.caminho}.parcial')
+
+
+class _ColunaIncremental:
+    """Coluna de X gravada bloco a bloco no formato do armazém (``armazem.save_frame``).
+
+    O tipo de cada bloco é o de ``cache.column_to_array``; a máscara de nulos só fica no
+    diretório se algum bloco tiver nulos.
+    """
+
+    def __init__(self, diretorio, nome, i):
+        self.nome = nome
+        self.arquivo = f'x_{i:04d}.npy'
+        self.arquivo_nulos = f'x_nulos_{i:04d}.npy'
+        self.valores = _ArrayIncremental(os.path.join(diretorio, self.arquivo), None)
+        self.nulos = _ArrayIncremental(os.path.join(diretorio, self.arquivo_nulos), np.bool_)
+        self.com_nulos = False
+
+    def append(self, serie):
+        valores, nulos = column_to_array(serie)
+        self.valores.append(valores)
+        self.nulos.append(np.zeros(len(valores), dtype=bool) if nulos is None else nulos)
+        self.com_nulos = self.com_nulos or nulos is not None
+
+    def finish(self):
+        """Fecha os arquivos. Retorna a entrada da coluna no manifesto."""
+        self.valores.finish()
+        coluna = {'nome': self.nome, 'arquivo': self.arquivo}
+        if self.com_nulos:
+            self.nulos.finish()
+            coluna['nulos'] = self.arquivo_nulos
+        else:
+            self.nulos.discard()
+        return coluna
+
+
+def _colunas_y(colunas, ajustes):
+    """Nome da coluna de Y de cada (ajuste candidato, métrica), na ordem do tensor de métricas."""
+    encontradas = {}
+    for nome in colunas:
+        encontrado = PADRAO_COLUNA_METRICA.match(str(nome))
+        if encontrado:
+            encontradas[(int(encontrado.group(2)), encontrado.group(1))] = nome
+    ausentes = [a for a in ajustes if not any((a, m) in encontradas for m in METRICAS)]
+    if ausentes:
+        raise DatabaseLoadError(f"Métricas ausentes na base de simulação para os ajustes {ausentes}")
+    return [encontradas.get((a, m)) for a in ajustes for m in METRICAS]
+
+
+def _metricas_bloco(partes, n, colunas):
+    """Bloco (n x colunas) de métricas; linhas de X sem linha em Y ficam NaN."""
+    bloco = np.full((n, len(colunas)), np.nan, dtype=DTYPE_METRICAS)
+    inicio = 0
+    for parte in partes:
+        for j, nome in enumerate(colunas):
+            if nome is not None:
+                bloco[inicio:inicio + len(parte), j] = parte[nome].to_numpy(dtype=float)
+        inicio += len(parte)
+    return bloco
+
+
+def _relatar(rotulo, linhas, segundos):
+    taxa = linhas / segundos if segundos > 0 else 0.0
+    print(f"\r{rotulo}: {linhas:,} linhas ({taxa:,.0f} linhas/s)", end='', file=sys.stderr, flush=True)
+
+
+def ingest(config, x_file, y_file, params_file, destino, tamanho_bloco=TAMANHO_BLOCO,
+           planilha_x='X_total', planilha_y=None, progresso=None):
+    """Lê X/Y em blocos e grava a base do sistema em ``destino`` no formato do armazém (substituição atômica).
+
+    ``progresso(linhas, segundos)`` é chamado a cada bloco (padrão: linhas/s no stderr).
+    Retorna (``Database`` aberta com mmap, manifesto).
+    """
+    if progresso is None:
+        progresso = lambda linhas, segundos: _relatar(config.nome, linhas, segundos)  # noqa: E731
+    ajustes = config.ajustes_candidatos
+    df_params = load_parameter_database(params_file)
+
+    destino = os.path.abspath(destino)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    arquivo = lambda nome: os.path.join(tmp, f'{nome}.npy')  # noqa: E731
+
+    n_categoricas = COLUNAS_CATEGORICAS.stop - COLUNAS_CATEGORICAS.start
+    saidas = {
+        'codigos': _ArrayIncremental(arquivo('codigos'), np.int64, (n_categoricas,)),
+        'capacidade_kw': _ArrayIncremental(arquivo('capacidade_kw'), np.float64),
+        'vn_kv': _ArrayIncremental(arquivo('vn_kv'), np.float64),
+        'h': _ArrayIncremental(arquivo('h'), np.float64),
+        # Mesmo tensor de ``Database.metricas`` (cenário x ajuste x métrica), só com os candidatos
+        'metricas': _ArrayIncremental(arquivo('metricas'), DTYPE_METRICAS, (len(ajustes), len(METRICAS))),
+    }
+    colunas_x = [_ColunaIncremental(tmp, nome, i) for i, nome in enumerate(read_columns(x_file, planilha_x))]
+    construtor = CategoricalIndexBuilder(n_categoricas)
+    colunas_y = _colunas_y(read_columns(y_file, planilha_y), ajustes)
+    fila_y = _FilaLinhas(read_chunks(y_file, tamanho_bloco, planilha_y,
+                                     colunas=list(dict.fromkeys(c for c in colunas_y if c is not None))))
+
+    t0 = time.perf_counter()
+    try:
+        for bloco_x in read_chunks(x_file, tamanho_bloco, planilha_x):
+            n = len(bloco_x)
+            partes_y = fila_y.take(n)
+            codigos = bloco_x.iloc[:, COLUNAS_CATEGORICAS].to_numpy(dtype=np.int64)
+            construtor.add(codigos)
+            saidas['codigos'].append(codigos)
+            # Base em W e V; entradas do usuário em kW e kV (como em ``NumericIndex.from_frame``)
+            saidas['capacidade_kw'].append(bloco_x.iloc[:, 1].to_numpy(dtype=float) / 1000.0)
+            saidas['vn_kv'].append(bloco_x.iloc[:, 2].to_numpy(dtype=float) / 1000.0)
+            saidas['h'].append(bloco_x.iloc[:, 3].to_numpy(dtype=float))
+            saidas['metricas'].append(_metricas_bloco(partes_y, n, colunas_y).reshape(n, len(ajustes), len(METRICAS)))
+            for i, coluna in enumerate(colunas_x):
+                coluna.append(bloco_x.iloc[:, i])
+            progresso(construtor.n_linhas, time.perf_counter() - t0)
+        for saida in saidas.values():
+            saida.finish()
+        manifesto_x = [coluna.finish() for coluna in colunas_x]
+        save_prefix_groups(list(construtor.groups().items()), n_categoricas, tmp)
+        manifesto_params = save_frame(df_params.reset_index(), tmp, 'params')
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    segundos = time.perf_counter() - t0
+
+    manifesto = {
+        'formato': FORMATO_ARMAZEM,
+        'sistema': config.nome,
+        'catalogo': VERSAO_CATALOGO,
+        'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        # Sem 'arquivos' (as planilhas do catálogo): o armazém nunca toma este diretório por uma
+        # compilação das planilhas
+        'fontes': {os.path.basename(caminho): file_sha256(caminho) for caminho in (x_file, y_file, params_file)},
+        'coluna_ajuste': [[int(a), i] for i, a in enumerate(ajustes)],
+        'colunas_x': manifesto_x,
+        'colunas_params': manifesto_params,
+        'linhas': construtor.n_linhas,
+        'linhas_y': fila_y.linhas_lidas,
+        'tamanho_bloco': tamanho_bloco,
+        'segundos': round(segundos, 3),
+        'linhas_por_segundo': round(construtor.n_linhas / segundos, 1) if segundos > 0 else None,
+    }
+    with open(os.path.join(tmp, MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=1)
+
+    antigo = f"{destino}.{os.getpid()}.old"
+    if os.path.isdir(destino):
+        os.replace(destino, antigo)
+    os.replace(tmp, destino)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return open_database(config, destino, manifesto), manifesto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestão em blocos das bases X/Y de um sistema.")
+    parser.add_argument('sistema', choices=sorted(SISTEMAS), help="Sistema do catálogo")
+    parser.add_argument('--destino', required=True, help="Diretório dos arrays compilados")
+    parser.add_argument('--base-dir', default='.', help="Diretório com as bases do catálogo (padrão das opções abaixo)")
+    parser.add_argument('--x', default=None, help="Base X (.csv, .parquet ou .xlsx)")
+    parser.add_argument('--y', default=None, help="Base Y de métricas (.csv, .parquet ou .xlsx)")
+    parser.add_argument('--params', default=None, help="Base de parâmetros dos ajustes (.xlsx)")
+    parser.add_argument('--planilha-x', default='X_total', help="Aba de X, quando .xlsx")
+    parser.add_argument('--bloco', type=int, default=TAMANHO_BLOCO, help="Linhas por bloco")
+    args = parser.parse_args(argv)
+
+    config = SISTEMAS[args.sistema]
+    arquivos = {k: os.path.join(args.base_dir, v) for k, v in config.arquivos.items()}
+    _, manifesto = ingest(config, args.x or arquivos['x'], args.y or arquivos['y'],
+                          args.params or arquivos['params'], args.destino, args.bloco, args.planilha_x)
+    print(file=sys.stderr)
+    pico = ''
+    if resource is not None:
+        pico = f", pico de memória {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB"
+    print(f"{manifesto['linhas']} cenários em {manifesto['segundos']:.2f} s "
+          f"({manifesto['linhas_por_segundo'] or 0:,.0f} linhas/s{pico}) -> {args.destino}")
+    print(f"Use com: python -m recomendador.batch ... --compilada {config.nome}={args.destino}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""Tempos por etapa do pipeline de recomendação e contadores, exportáveis para Prometheus ou JSON.
+
+Cada etapa (carga, validação, filtro categórico, vizinho numérico, agregação das
+métricas, filtro de regras e, no app, a renderização) é medida com
+``telemetria.stage(nome)``. Os tempos entram em histogramas acumulados no processo
+e, quando há uma requisição em andamento na thread (``telemetria.request()``), no
+detalhamento dessa requisição. O detalhamento (``Trace``) fica só com quem abriu a
+requisição: ``request()`` o entrega e ``end()`` o devolve, de modo que sessões e
+requisições concorrentes não veem os tempos umas das outras (o tempo total de cada
+requisição entra no histograma como a etapa ``requisicao``).
+
+Exportação:
+
+* ``prometheus_text()``: formato texto do Prometheus (rota ``GET /metrics`` do serviço);
+* ``snapshot()``: o mesmo conteúdo como dicionário JSON;
+* logs estruturados: com o logger ``recomendador.telemetria`` em nível INFO, cada
+  requisição concluída gera uma linha JSON (``enable_json_logs()`` liga no stderr).
+"""
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Etapas na ordem do pipeline (outras podem ser registradas; estas aparecem primeiro)
+ETAPAS = ('carga', 'validacao', 'filtro_categorico', 'vizinho_numerico', 'agregacao', 'filtro_regras', 'render')
+# Limites dos baldes dos histogramas, em segundos
+LIMITES_HISTOGRAMA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                      2.5, 5.0, 10.0)
+PREFIXO = 'recomendador'
+
+logger = logging.getLogger('recomendador.telemetria')
+
+
+class Trace:
+    """Detalhamento de uma requisição: segundos por etapa e atributos (sistema, status, cache...)."""
+
+    def __init__(self, **atributos):
+        self.atributos = dict(atributos)
+        self.etapas = {}
+        self.inicio = time.perf_counter()
+        self.total = None
+
+    def add(self, etapa, segundos):
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + segundos
+
+    def as_dict(self):
+        ordem = sorted(self.etapas, key=lambda e: ETAPAS.index(e) if e in ETAPAS else len(ETAPAS))
+        return {
+            **self.atributos,
+            'etapas_ms': {e: round(self.etapas[e] * 1000, 3) for e in ordem},
+            'total_ms': None if self.total is None else round(self.total * 1000, 3),
+        }
+
+
+class Telemetry:
+    """Histogramas de tempo por etapa e contadores rotulados, seguros entre threads."""
+
+    def __init__(self, limites=LIMITES_HISTOGRAMA):
+        self.limites = tuple(limites)
+        self._histogramas = {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def observe(self, etapa, segundos):
+        """Registra ``segundos`` na etapa (e no detalhamento da requisição em andamento, se houver)."""
+        rastro = getattr(self._local, 'rastro', None)
+        if rastro is not None:
+            rastro.add(etapa, segundos)
+        self._observar(etapa, segundos)
+
+    def _observar(self, etapa, segundos):
+        with self._lock:
+            histograma = self._histogramas.get(etapa)
+            if histograma is None:
+                # Contagem por balde (o último é o +Inf), soma e quantidade
+                histograma = self._histogramas[etapa] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            for i, limite in enumerate(self.limites):
+                if segundos <= limite:
+                    break
+            else:
+                i = len(self.limites)
+            histograma[0][i] += 1
+            histograma[1] += segundos
+            histograma[2] += 1
+
+    @contextmanager
+    def stage(self, etapa):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(etapa, time.perf_counter() - t0)
+
+    def count(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def current(self):
+        """Requisição em andamento nesta thread (ou None)."""
+        return getattr(self._local, 'rastro', None)
+
+    def begin(self, **atributos):
+        """Inicia o detalhamento de uma requisição nesta thread (substitui um anterior não concluído)."""
+        rastro = Trace(**atributos)
+        self._local.rastro = rastro
+        return rastro
+
+    def end(self, rastro=None):
+        """Conclui a requisição: total no histograma ``requisicao`` e a linha de log JSON. Retorna o detalhamento."""
+        rastro = self.current() if rastro is None else rastro
+        if rastro is None:
+            return None
+        if getattr(self._local, 'rastro', None) is rastro:
+            self._local.rastro = None
+        rastro.total = time.perf_counter() - rastro.inicio
+        self._observar('requisicao', rastro.total)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'evento': 'recomendacao', **rastro.as_dict()}, ensure_ascii=False, default=str))
+        return rastro
+
+    @contextmanager
+    def request(self, **atributos):
+        rastro = self.begin(**atributos)
+        try:
+            yield rastro
+        finally:
+            self.end(rastro)
+
+    def snapshot(self):
+        with self._lock:
+            histogramas = {etapa: {'n': h[2], 'soma_s': h[1], 'baldes': dict(zip(
+                [str(limite) for limite in self.limites] + ['+Inf'], h[0]))}
+                for etapa, h in self._histogramas.items()}
+            contadores = [{'nome': nome, 'rotulos': dict(rotulos), 'valor': valor}
+                          for (nome, rotulos), valor in self._contadores.items()]
+        return {'etapas': histogramas, 'contadores': contadores}
+
+    def prometheus_text(self):
+        """Histogramas e contadores no formato texto de exposição do Prometheus (0.0.4)."""
+        with self._lock:
+            histogramas = {etapa: (list(h[0]), h[1], h[2]) for etapa, h in self._histogramas.items()}
+            contadores = dict(self._contadores)
+
+        nome = f'{PREFIXO}_etapa_segundos'
+        linhas = [f'# HELP {nome} Tempo gasto em cada etapa do pipeline de recomendação.',
+                  f'# TYPE {nome} histogram']
+        for etapa, (baldes, soma, n) in sorted(histogramas.items()):
+            acumulado = 0
+            for limite, quantidade in zip([repr(float(limite)) for limite in self.limites] + ['+Inf'], baldes):
+                acumulado += quantidade
+                linhas.append(f'{nome}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+            linhas.append(f'{nome}_sum{{etapa="{etapa}"}} {soma!r}')
+            linhas.append(f'{nome}_count{{etapa="{etapa}"}} {n}')
+
+        for contador in sorted({n for n, _ in contadores}):
+            linhas.append(f'# TYPE {PREFIXO}_{contador}_total counter')
+            for (n, rotulos), valor in sorted(contadores.items()):
+                if n == contador:
+                    texto = ','.join(f'{k}="{_escapar(v)}"' for k, v in rotulos)
+                    linhas.append(f'{PREFIXO}_{contador}_total{{{texto}}} {valor}' if texto
+                                  else f'{PREFIXO}_{contador}_total {valor}')
+        return '\n'.join(linhas) + '\n'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def enable_json_logs(stream=None):
+    """Uma linha JSON por requisição concluída no ``stream`` (stderr por padrão)."""
+    handler = logging.StreamHandler(sys.stderr if stream is None else stream)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return handler
+
+
+# Instância do processo, usada por padrão pelo Recommender, pelo serviço e pelo app
+TELEMETRIA = Telemetry()
@@ -0,0 +1,72 @@
+"""Cache de resultados de recomendação (LRU com TTL opcional) chaveado pelos cenários simulados selecionados."""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def source_signature(caminhos):
+    """Tamanho e data de modificação de cada arquivo (None se não existir)."""
+    assinatura = []
+    for caminho in caminhos:
+        try:
+            st = os.stat(caminho)
+            assinatura.append((caminho, st.st_size, st.st_mtime_ns))
+        except OSError:
+            assinatura.append((caminho, None, None))
+    return tuple(assinatura)
+
+
+class ResultCache:
+    """LRU limitado por número de entradas, com validade opcional (``ttl`` em segundos).
+
+    Seguro para uso entre threads (sessões do Streamlit, requisições do serviço).
+    """
+
+    def __init__(self, capacidade=1024, ttl=None):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidacoes = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def get(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and self.ttl is not None and time.monotonic() - entrada[0] > self.ttl:
+                del self._entradas[chave]
+                entrada = None
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return entrada[1]
+
+    def put(self, chave, valor):
+        with self._lock:
+            self._entradas[chave] = (time.monotonic(), valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+            self.invalidacoes += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': self.hits / total if total else 0.0,
+            'entradas': len(self._entradas),
+            'capacidade': self.capacidade,
+            'invalidacoes': self.invalidacoes,
+        }
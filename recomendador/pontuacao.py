@@ -0,0 +1,185 @@
+"""Pontuação multiobjetivo dos ajustes: ranking top-k e distância dos quase aprovados.
+
+O vencedor do motor é o ajuste válido (regras de especialista + BAC > 90, FNR < 10 e
+FPR < 10) de maior BAC. ``Scoring`` ordena todos os ajustes aprovados por uma soma
+ponderada de BAC, FNR e FPR (ou pelas frentes de Pareto dessas três métricas) e
+devolve os ``k`` primeiros; para os elegíveis que não passaram nos limiares, informa
+quanto falta em cada métrica. Tudo é feito numa única passada vetorizada sobre o
+array de métricas (cenários x ajustes x métrica), de modo que um lote inteiro é
+pontuado de uma vez::
+
+    pontuacao = Scoring(pesos=(1.0, 0.5, 0.5), k=3)
+    ranking = pontuacao.rank(valores, elegiveis)   # valores: (n_cenarios, n_ajustes, 3)
+    ranking.topo[0]                                # colunas dos 3 melhores do 1º cenário
+
+Com os pesos padrão (só BAC), o ranking segue a ordem dos válidos do motor: os dois
+usam ``catalogo.descending_order``, que desempata pela ordem dos ajustes candidatos.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .catalogo import LIMIAR_BAC, LIMIAR_FNR, LIMIAR_FPR, descending_order
+
+METRICAS = ('BAC', 'FNR', 'FPR')
+LIMIARES = np.array([LIMIAR_BAC, LIMIAR_FNR, LIMIAR_FPR], dtype=float)
+# BAC: maior é melhor; FNR e FPR: menor é melhor
+SENTIDO = np.array([1.0, -1.0, -1.0])
+PESOS_PADRAO = (1.0, 0.0, 0.0)
+K_PADRAO = 5
+# Cenários por bloco no cálculo das frentes de Pareto (matriz de dominância por cenário)
+BLOCO_PARETO = 20_000
+
+
+def threshold_margins(valores):
+    """Folga de cada métrica até o limiar: BAC - 90, 10 - FNR e 10 - FPR (positiva = passou)."""
+    return (np.asarray(valores, dtype=float) - LIMIARES) * SENTIDO
+
+
+def threshold_distance(folgas):
+    """Quanto falta, somando as métricas, para passar em todos os limiares (0 = no limiar ou acima)."""
+    distancia = -sum(np.minimum(folgas[..., m], 0.0) for m in range(folgas.shape[-1]))
+    distancia[np.isnan(distancia)] = np.inf
+    return distancia
+
+
+def pareto_fronts(valores, aprovados):
+    """Frente de Pareto (0 = não dominados) de cada ajuste aprovado; os demais ficam com -1.
+
+    ``valores`` é (n_cenarios, n_ajustes, 3) e ``aprovados`` (n_cenarios, n_ajustes).
+    Um ajuste domina outro se não é pior em nenhuma métrica e é melhor em pelo menos uma.
+    """
+    frentes = np.where(aprovados, 0, -1)
+    # Só os aprovados entram na comparação: as linhas são agrupadas pelo número c de aprovados e
+    # cada grupo monta uma matriz de dominância c x c (com um só aprovado não há o que comparar)
+    contagem = aprovados.sum(axis=1)
+    aprovados_primeiro = np.argsort(~aprovados, axis=1, kind='stable')
+    for c in np.unique(contagem[contagem > 1]).tolist():
+        grupo = np.flatnonzero(contagem == c)
+        for inicio in range(0, len(grupo), BLOCO_PARETO):
+            linhas = grupo[inicio:inicio + BLOCO_PARETO]
+            colunas = aprovados_primeiro[linhas, :c]
+            o = np.take_along_axis(valores[linhas], colunas[:, :, None], axis=1) * SENTIDO
+            # domina[l, i, j]: na linha l, o aprovado i domina o aprovado j (uma métrica por vez)
+            nao_pior = np.ones((len(linhas), c, c), dtype=bool)
+            melhor = np.zeros_like(nao_pior)
+            for m in range(o.shape[2]):
+                nao_pior &= o[:, :, None, m] >= o[:, None, :, m]
+                melhor |= o[:, :, None, m] > o[:, None, :, m]
+            domina = nao_pior & melhor
+            # Cada rodada retira a frente atual (não dominados entre os restantes)
+            nivel = np.zeros((len(linhas), c), dtype=np.int64)
+            restantes = np.ones((len(linhas), c), dtype=bool)
+            rodada = 0
+            while restantes.any():
+                atuais = restantes & ~(domina & restantes[:, :, None]).any(axis=1)
+                nivel[atuais] = rodada
+                restantes &= ~atuais
+                rodada += 1
+            frentes[linhas[:, None], colunas] = nivel
+    return frentes
+
+
+@dataclass
+class Ranking:
+    """Resultado de ``Scoring.rank`` para um lote de cenários (uma linha por cenário).
+
+    ``topo`` e ``quase`` trazem as colunas dos ajustes (-1 onde há menos de ``k``);
+    ``pontuacoes``, ``frentes``, ``folgas`` e ``distancias`` são por ajuste.
+    """
+    topo: np.ndarray
+    quase: np.ndarray
+    aprovados: np.ndarray
+    pontuacoes: np.ndarray
+    frentes: np.ndarray
+    folgas: np.ndarray
+    distancias: np.ndarray
+
+
+@dataclass(frozen=True)
+class Scoring:
+    """Critério de ordenação dos ajustes aprovados e tamanho ``k`` do ranking.
+
+    ``pesos`` (BAC, FNR, FPR) multiplicam BAC, -FNR e -FPR; com ``pareto``, os ajustes
+    são ordenados primeiro pela frente de Pareto e, dentro dela, pela soma ponderada.
+    Empates ficam na ordem dos ajustes candidatos do catálogo.
+    """
+    pesos: tuple = PESOS_PADRAO
+    pareto: bool = False
+    k: int = K_PADRAO
+
+    def __post_init__(self):
+        pesos = tuple(float(p) for p in self.pesos)
+        if len(pesos) != len(METRICAS) or not all(np.isfinite(pesos)) or min(pesos) < 0 or not any(pesos):
+            raise ValueError(f"Pesos inválidos: {self.pesos!r}. Informe três pesos (BAC, FNR, FPR) "
+                             "não negativos, com pelo menos um positivo.")
+        if int(self.k) < 1:
+            raise ValueError(f"k deve ser pelo menos 1: {self.k!r}")
+        object.__setattr__(self, 'pesos', pesos)
+        object.__setattr__(self, 'k', int(self.k))
+
+    @classmethod
+    def from_dict(cls, dados):
+        """Monta a partir de ``{"pesos": [..] ou {"BAC": .., ...}, "pareto": bool, "k": int}``."""
+        dados = dict(dados or {})
+        pesos = dados.get('pesos', PESOS_PADRAO)
+        if isinstance(pesos, dict):
+            pesos = tuple(pesos.get(metrica, 0.0) for metrica in METRICAS)
+        return cls(pesos=pesos, pareto=bool(dados.get('pareto', False)), k=dados.get('k', K_PADRAO))
+
+    def scores(self, valores):
+        return (np.asarray(valores, dtype=float) * SENTIDO) @ np.asarray(self.pesos)
+
+    def rank(self, valores, elegiveis):
+        """Top-k dos aprovados e os ``k`` elegíveis reprovados mais próximos dos limiares.
+
+        ``valores``: (n_cenarios, n_ajustes, 3) ou (n_ajustes, 3) para um único cenário;
+        ``elegiveis``: regras de especialista, (n_ajustes,) ou (n_cenarios, n_ajustes).
+        """
+        valores = np.asarray(valores, dtype=float)
+        if valores.ndim == 2:
+            valores = valores[None]
+        elegiveis = np.broadcast_to(np.asarray(elegiveis, dtype=bool), valores.shape[:2])
+
+        folgas = threshold_margins(valores)
+        with np.errstate(invalid='ignore'):
+            aprovados = elegiveis & (folgas[..., 0] > 0) & (folgas[..., 1] > 0) & (folgas[..., 2] > 0)
+        distancias = threshold_distance(folgas)
+        pontuacoes = self.scores(valores)
+        k = min(self.k, valores.shape[1])
+
+        # Ordenações estáveis: empates ficam na ordem dos candidatos
+        if self.pareto:
+            frentes = pareto_fronts(valores, aprovados)
+            # lexsort: a última chave é a principal
+            topo = np.lexsort([np.where(aprovados, -pontuacoes, np.inf),
+                               np.where(aprovados, frentes, valores.shape[1])], axis=-1)[:, :k]
+        else:
+            frentes = None
+            topo = descending_order(np.where(aprovados, pontuacoes, -np.inf))[:, :k]
+        topo = np.where(np.take_along_axis(aprovados, topo, axis=1), topo, -1)
+
+        # Quase aprovados: passam nas regras de especialista, mas não em algum limiar
+        reprovados = elegiveis & ~aprovados & np.isfinite(distancias)
+        quase = np.lexsort([-np.nan_to_num(pontuacoes), np.where(reprovados, distancias, np.inf)], axis=-1)[:, :k]
+        quase = np.where(np.take_along_axis(reprovados, quase, axis=1), quase, -1)
+        return Ranking(topo, quase, aprovados, pontuacoes, frentes, folgas, distancias)
+
+    def tables(self, candidatos, elegiveis):
+        """Ranking de um único cenário como DataFrames (ranking, quase aprovados).
+
+        ``candidatos`` é a tabela de candidatos do motor (colunas BAC, FNR e FPR, uma
+        linha por ajuste candidato); as tabelas ganham as colunas ``Pontuacao``,
+        ``Folga_BAC``, ``Folga_FNR``, ``Folga_FPR`` e, conforme o caso, ``Frente`` ou
+        ``Distancia``.
+        """
+        ranking = self.rank(candidatos[list(METRICAS)].to_numpy(dtype=float), elegiveis)
+        folgas = pd.DataFrame(ranking.folgas[0], index=candidatos.index,
+                              columns=[f'Folga_{metrica}' for metrica in METRICAS])
+        tabela = candidatos.assign(Pontuacao=ranking.pontuacoes[0]).join(folgas)
+        if ranking.frentes is not None:
+            tabela['Frente'] = ranking.frentes[0]
+        topo = tabela.take(ranking.topo[0][ranking.topo[0] >= 0])
+        quase = tabela.assign(Distancia=ranking.distancias[0]).take(ranking.quase[0][ranking.quase[0] >= 0])
+        return topo, quase
@@ -0,0 +1,29 @@
+"""Linhas de saída compartilhadas pelo lote, pela varredura, pela tabela pré-computada e pelo serviço.
+
+Uma linha por cenário com as colunas de ``COLUNAS_SAIDA`` (sistema, status, cenário mais
+próximo, vencedor, métricas e parâmetros do ajuste e a mensagem de erro, se houver).
+"""
+import re
+
+from .engine import HEADER_DROPOUT, HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO
+
+STATUS_ENTRADA_INVALIDA = 'entrada_invalida'
+
+COLUNAS_SAIDA = [
+    'sistema', 'status', 'modo', 'cenario_proximo', 'n_cenarios', 'vencedor', 'Ajuste_ID',
+    'BAC', 'FNR', 'FPR', HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO, HEADER_DROPOUT, 'mensagem',
+]
+# Colunas extras quando o lote é pontuado: top-k dos válidos e elegíveis mais próximos dos limiares
+COLUNAS_PONTUACAO = ['ranking', 'quase_aprovados']
+
+
+def plain_text(mensagem):
+    """Mensagem do app (markdown) em uma linha de texto simples."""
+    return re.sub(r'\s+', ' ', mensagem.replace('**', '')).strip()
+
+
+def output_row(sistema, status, mensagem=None):
+    """Linha de saída vazia (todas as ``COLUNAS_SAIDA``) com sistema, status e mensagem."""
+    linha = dict.fromkeys(COLUNAS_SAIDA)
+    linha.update(sistema=sistema, status=status, n_cenarios=0, mensagem=mensagem)
+    return linha
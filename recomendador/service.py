@@ -0,0 +1,425 @@
+"""Serviço HTTP/JSON local (asyncio, sem dependências extras) sobre o motor de recomendação.
+
+Uso::
+
+    python -m recomendador.service --host 127.0.0.1 --port 8765
+
+Rotas:
+
+* ``POST /recommend``: um cenário (objeto JSON com os mesmos campos de ``Scenario``);
+  com ``"pontuacao": {"k": 5, "pesos": {"BAC": 1, "FNR": 0.5, "FPR": 0.5}, "pareto": false}``
+  a resposta traz também o ranking dos ajustes válidos e os quase aprovados; com
+  ``"vizinhos": k``, as métricas são a média dos k cenários simulados mais próximos,
+  ponderada pelo inverso da distância (a resposta lista os vizinhos e os pesos);
+* ``POST /recommend/batch``: ``{"cenarios": [...]}`` ou uma lista de cenários (aceita
+  os mesmos ``"pontuacao"`` e ``"vizinhos"``);
+* ``POST /sweep``: varredura de sensibilidade, ``{"cenario": {...}, "eixo": "capacidade_kw",
+  "valores": [...]}`` (ou ``"inicio"``, ``"fim"`` e ``"pontos"``; ``"grafico": true`` inclui
+  a figura plotly em JSON);
+* ``GET /health``: estado do processo;
+* ``GET /ready``: 200 quando as bases já estão aquecidas, 503 antes disso (prontidão
+  para o balanceador de carga); enquanto o aquecimento roda, as rotas que usam as bases
+  também respondem 503 na hora, em vez de esperar a carga;
+* ``GET /metrics``: tempos por etapa e contadores no formato texto do Prometheus
+  (``GET /metrics/json`` traz o mesmo conteúdo em JSON).
+
+Com ``--log-json``, cada recomendação gera uma linha JSON no stderr com o tempo de
+cada etapa do pipeline.
+
+As bases X/Y/parâmetros são carregadas uma única vez, em segundo plano logo na subida
+do processo (a porta já aceita conexões; ``/ready`` só responde 200 depois), e
+ficam em memória (ou, com ``--armazem``, mapeadas do armazém compartilhado entre
+os processos da máquina). Com ``--memoria-maxima-mb``, só as bases que cabem no limite
+sobem na partida (pelo menos uma; as demais, na primeira consulta). As colunas categóricas aceitam os textos da barra lateral do
+app ou os códigos numéricos.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from http import HTTPStatus
+
+import numpy as np
+import pandas as pd
+
+from .batch import COLUNA_INERCIA, COLUNAS_CATEGORICAS, COLUNAS_NUMERICAS, category_label, recommend_batch
+from .aquecimento import ESTADO_AQUECENDO, Warmup
+from .engine import (
+    HEADER_DROPOUT, HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO, Recommender, Scenario,
+)
+from .instrumentacao import enable_json_logs
+from .memo import ResultCache
+from .pontuacao import METRICAS, Scoring
+from .saida import COLUNAS_PONTUACAO, COLUNAS_SAIDA, plain_text
+from .tabela import RecommendationTable
+from .varredura import EIXOS, grid, sweep, sweep_chart
+
+COLUNAS_AJUSTE = ['Ajuste_ID', 'Label', 'BAC', 'FNR', 'FPR', HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO, HEADER_DROPOUT]
+COLUNAS_RANKING = COLUNAS_AJUSTE + ['Pontuacao', 'Frente'] + [f'Folga_{metrica}' for metrica in METRICAS]
+
+# Limite do corpo das requisições (lotes grandes devem usar o modo em lote por arquivo)
+TAMANHO_MAXIMO_CORPO = 32 * 1024 * 1024
+
+
+class RequestError(Exception):
+    """Requisição inválida (vira uma resposta 4xx com a mensagem em JSON)."""
+
+    def __init__(self, mensagem, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _valor_json(valor):
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    if valor is pd.NA:
+        return None
+    return valor
+
+
+def _registro(linha, colunas):
+    return {c: _valor_json(linha[c]) for c in colunas if c in linha}
+
+
+def parse_scenario(dados):
+    """Monta um ``Scenario`` a partir de um dicionário JSON (textos ou códigos)."""
+    if not isinstance(dados, dict):
+        raise RequestError("O cenário deve ser um objeto JSON.")
+    faltando = [c for c in COLUNAS_NUMERICAS + [nome for nome, _ in COLUNAS_CATEGORICAS] if c not in dados]
+    if faltando:
+        raise RequestError(f"Campos ausentes: {faltando}")
+
+    campos = {}
+    for nome in COLUNAS_NUMERICAS:
+        try:
+            campos[nome] = float(dados[nome])
+        except (TypeError, ValueError):
+            raise RequestError(f"{nome} inválido: {dados[nome]!r}") from None
+    for nome, mapa in COLUNAS_CATEGORICAS:
+        rotulo = category_label(dados[nome], mapa, {v: k for k, v in mapa.items()})
+        if rotulo is None:
+            raise RequestError(f"{nome} inválido: {dados[nome]!r}. Opções: {list(mapa)}")
+        campos[nome] = rotulo
+
+    inercia = dados.get(COLUNA_INERCIA)
+    if inercia is not None:
+        try:
+            inercia = float(inercia)
+        except (TypeError, ValueError):
+            raise RequestError(f"{COLUNA_INERCIA} inválido: {inercia!r}") from None
+    return Scenario(inercia=inercia, **campos)
+
+
+def parse_scoring(dados):
+    """``pontuacao.Scoring`` a partir do campo ``"pontuacao"`` do corpo (None se ausente)."""
+    if dados is None:
+        return None
+    if not isinstance(dados, dict):
+        raise RequestError("\"pontuacao\" deve ser um objeto JSON (k, pesos, pareto).")
+    try:
+        return Scoring.from_dict(dados)
+    except (TypeError, ValueError) as e:
+        raise RequestError(str(e)) from None
+
+
+def parse_neighbors(dados):
+    """k do modo k-NN a partir do campo ``"vizinhos"`` do corpo (None se ausente)."""
+    if dados is None:
+        return None
+    if isinstance(dados, bool) or not isinstance(dados, int) or dados < 1:
+        raise RequestError(f"\"vizinhos\" deve ser um inteiro positivo: {dados!r}")
+    return dados
+
+
+def recommendation_to_dict(resultado, pontuacao=None):
+    """Resumo serializável de uma ``Recommendation``: cenário mais próximo, vencedor e alternativas.
+
+    Com ``pontuacao``, inclui ``ranking`` (top-k dos válidos) e ``quase_aprovados``; no
+    modo k-NN, ``vizinhos`` traz cada cenário usado com a distância e o peso.
+    """
+    saida = {
+        'status': resultado.status,
+        'sistema': resultado.sistema,
+        'modo': resultado.modo,
+        'inconsistencias': [plain_text(m) for m in resultado.inconsistencias],
+        'n_cenarios': resultado.n_cenarios,
+        'cenario_proximo': None,
+        'vencedor': None,
+        'alternativas': [],
+    }
+    if resultado.cenario_proximo is not None:
+        saida['cenario_proximo'] = _valor_json(resultado.nome_cenario)
+    if resultado.vencedor is not None:
+        saida['vencedor'] = _registro(resultado.vencedor, COLUNAS_AJUSTE)
+        saida['alternativas'] = [_registro(linha, COLUNAS_AJUSTE) for _, linha in resultado.alternativas.iterrows()]
+    if resultado.vizinhos is not None:
+        saida['vizinhos'] = [_registro(linha, ['NomeCenario', 'Distancia', 'Peso'])
+                             for _, linha in resultado.vizinhos.iterrows()]
+    if pontuacao is not None:
+        ranking, quase = resultado.ranking(pontuacao)
+        saida['ranking'] = [] if ranking is None else [_registro(linha, COLUNAS_RANKING)
+                                                       for _, linha in ranking.iterrows()]
+        saida['quase_aprovados'] = [] if quase is None else [_registro(linha, COLUNAS_RANKING + ['Distancia'])
+                                                             for _, linha in quase.iterrows()]
+    return saida
+
+
+class RecommendationService:
+    """Despacha as rotas para um ``Recommender`` mantido aquecido durante toda a vida do processo."""
+
+    def __init__(self, recomendador=None, tabela=None, aquecimento=None):
+        self.recomendador = Recommender(cache=ResultCache()) if recomendador is None else recomendador
+        # Tabela pré-computada (``tabela.RecommendationTable``), se houver: responde /recommend sem o motor
+        self.tabela = tabela
+        # ``aquecimento.Warmup`` das bases, se houver: /ready só responde 200 quando ele termina
+        self.aquecimento = aquecimento
+        self.inicio = time.time()
+
+    def _exigir_bases(self):
+        # Durante o aquecimento, a consulta só esperaria a carga na thread do executor; com erro no
+        # aquecimento, as bases ainda sobem sob demanda
+        if self.aquecimento is not None and self.aquecimento.estado == ESTADO_AQUECENDO:
+            raise RequestError(f"Bases ainda não aquecidas ({self.aquecimento.estado}).",
+                               HTTPStatus.SERVICE_UNAVAILABLE)
+
+    def recommend(self, corpo):
+        cenario = parse_scenario(corpo)
+        self._exigir_bases()
+        try:
+            self.recomendador.system_for(cenario.tensao_kv)
+        except ValueError as e:
+            raise RequestError(str(e)) from None
+        pontuacao = parse_scoring(corpo.get('pontuacao'))
+        vizinhos = parse_neighbors(corpo.get('vizinhos'))
+        with self.recomendador.telemetria.request(rota='/recommend'):
+            # A tabela pré-computada só guarda o vencedor da cascata exata: ranking e k-NN saem do motor
+            if self.tabela is not None and pontuacao is None and vizinhos is None:
+                return self.tabela.recommend(cenario)
+            return recommendation_to_dict(self.recomendador.recommend(cenario, vizinhos), pontuacao)
+
+    def recommend_batch(self, corpo):
+        cenarios = corpo.get('cenarios') if isinstance(corpo, dict) else corpo
+        if not isinstance(cenarios, list) or not all(isinstance(c, dict) for c in cenarios):
+            raise RequestError("Envie uma lista de cenários (ou {\"cenarios\": [...]}).")
+        if not cenarios:
+            return {'resultados': []}
+        self._exigir_bases()
+        pontuacao = parse_scoring(corpo.get('pontuacao') if isinstance(corpo, dict) else None)
+        vizinhos = parse_neighbors(corpo.get('vizinhos') if isinstance(corpo, dict) else None)
+        try:
+            resultado = recommend_batch(self.recomendador, pd.DataFrame(cenarios), pontuacao=pontuacao,
+                                        vizinhos=vizinhos)
+        except ValueError as e:
+            raise RequestError(str(e)) from None
+        # Só as colunas de saída (os campos de entrada voltam na mesma ordem do pedido)
+        colunas = COLUNAS_SAIDA if pontuacao is None else COLUNAS_SAIDA + COLUNAS_PONTUACAO
+        return {'resultados': [_registro(linha, colunas)
+                               for linha in resultado.iloc[:, -len(colunas):].to_dict('records')]}
+
+    def sweep(self, corpo):
+        if not isinstance(corpo, dict) or not isinstance(corpo.get('cenario'), dict):
+            raise RequestError("Envie {\"cenario\": {...}, \"eixo\": ..., \"valores\": [...]}.")
+        eixo = corpo.get('eixo')
+        if eixo not in EIXOS:
+            raise RequestError(f"Eixo inválido: {eixo!r}. Opções: {list(EIXOS)}")
+        try:
+            if 'valores' in corpo:
+                valores = np.asarray(corpo['valores'], dtype=float).reshape(-1)
+            else:
+                valores = grid(corpo['inicio'], corpo['fim'], corpo.get('pontos', 50))
+        except (KeyError, TypeError, ValueError):
+            raise RequestError("Informe \"valores\" ou \"inicio\", \"fim\" e \"pontos\" numéricos.") from None
+        if not len(valores):
+            raise RequestError("A grade da varredura está vazia.")
+        # O campo varrido pode faltar no cenário
+        cenario = parse_scenario({eixo: valores[0].item(), **corpo['cenario']})
+        self._exigir_bases()
+        try:
+            tabela = sweep(self.recomendador, cenario, eixo, valores)
+        except ValueError as e:
+            raise RequestError(str(e)) from None
+        saida = {'eixo': eixo, 'resultados': [_registro(linha, [eixo] + COLUNAS_SAIDA)
+                                              for linha in tabela.to_dict('records')]}
+        if corpo.get('grafico'):
+            saida['grafico'] = json.loads(sweep_chart(tabela, eixo).to_json())
+        return saida
+
+    def health(self, corpo=None):
+        saida = {'status': 'ok', 'sistemas': sorted(self.recomendador.sistemas),
+                 'carregados': self.recomendador.loaded_systems(),
+                 'versoes': self.recomendador.versions(),
+                 'memoria_bases_mb': round(self.recomendador.memory_usage() / 2**20, 1),
+                 'uptime_s': round(time.time() - self.inicio, 1)}
+        if self.recomendador.falhas_atualizacao:
+            saida['falhas_atualizacao'] = dict(self.recomendador.falhas_atualizacao)
+        if self.recomendador.cache is not None:
+            saida['cache'] = self.recomendador.cache.stats()
+        if self.tabela is not None:
+            saida['tabela'] = self.tabela.manifesto['criado_em']
+        if self.aquecimento is not None:
+            saida['aquecimento'] = self.aquecimento.estado
+        return saida
+
+    def ready(self, corpo=None):
+        if self.aquecimento is None:
+            return {'status': 'pronto'}
+        if not self.aquecimento.ready:
+            raise RequestError(f"Bases ainda não aquecidas ({self.aquecimento.estado}).",
+                               HTTPStatus.SERVICE_UNAVAILABLE)
+        return self.aquecimento.status()
+
+    def metrics(self, corpo=None):
+        # Texto: vai como text/plain, no formato de exposição do Prometheus
+        return self.recomendador.telemetria.prometheus_text()
+
+    def metrics_json(self, corpo=None):
+        return self.recomendador.telemetria.snapshot()
+
+    def route(self, metodo, caminho):
+        """Retorna (função, roda fora do loop?) para a rota pedida."""
+        rotas = {
+            ('POST', '/recommend'): (self.recommend, True),
+            ('POST', '/recommend/batch'): (self.recommend_batch, True),
+            ('POST', '/sweep'): (self.sweep, True),
+            ('GET', '/health'): (self.health, False),
+            ('GET', '/ready'): (self.ready, False),
+            ('GET', '/metrics'): (self.metrics, False),
+            ('GET', '/metrics/json'): (self.metrics_json, False),
+        }
+        rota = rotas.get((metodo, caminho.split('?', 1)[0].rstrip('/') or '/'))
+        if rota is None:
+            raise RequestError(f"Rota não encontrada: {metodo} {caminho}", HTTPStatus.NOT_FOUND)
+        return rota
+
+
+async def _ler_requisicao(reader):
+    linha = await reader.readline()
+    if not linha:
+        return None
+    try:
+        metodo, caminho, _ = linha.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise RequestError("Linha de requisição inválida.") from None
+    cabecalhos = {}
+    while True:
+        linha = await reader.readline()
+        if linha in (b'\r\n', b'\n', b''):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(':')
+        cabecalhos[nome.strip().lower()] = valor.strip()
+    tamanho = int(cabecalhos.get('content-length') or 0)
+    if tamanho > TAMANHO_MAXIMO_CORPO:
+        raise RequestError("Corpo da requisição muito grande.", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    corpo = await reader.readexactly(tamanho) if tamanho else b''
+    return metodo.upper(), caminho, cabecalhos, corpo
+
+
+def _resposta(status, dados, manter_conexao):
+    if isinstance(dados, str):
+        corpo, tipo = dados.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+    else:
+        corpo, tipo = json.dumps(dados, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8'
+    cabecalho = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {tipo}\r\n"
+        f"Content-Length: {len(corpo)}\r\n"
+        f"Connection: {'keep-alive' if manter_conexao else 'close'}\r\n\r\n"
+    )
+    return cabecalho.encode('latin-1') + corpo
+
+
+async def _atender(servico, reader, writer):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            manter_conexao = False
+            try:
+                requisicao = await _ler_requisicao(reader)
+                if requisicao is None:
+                    break
+                metodo, caminho, cabecalhos, corpo = requisicao
+                manter_conexao = cabecalhos.get('connection', '').lower() != 'close'
+                funcao, pesada = servico.route(metodo, caminho)
+                try:
+                    dados = json.loads(corpo) if corpo else {}
+                except json.JSONDecodeError as e:
+                    raise RequestError(f"JSON inválido: {e}") from None
+                if pesada:
+                    # Rotas que usam as bases rodam fora do loop: lotes e cargas frias (a primeira consulta
+                    # a um sistema lê as bases) não seguram /health, /ready e /metrics
+                    resposta = await loop.run_in_executor(None, funcao, dados)
+                else:
+                    resposta = funcao(dados)
+                status = HTTPStatus.OK
+            except RequestError as e:
+                status, resposta = e.status, {'erro': str(e)}
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                status, resposta = HTTPStatus.INTERNAL_SERVER_ERROR, {'erro': f"{type(e).__name__}: {e}"}
+            writer.write(_resposta(status, resposta, manter_conexao))
+            await writer.drain()
+            if not manter_conexao:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(servico, host='127.0.0.1', port=8765):
+    servidor = await asyncio.start_server(lambda r, w: _atender(servico, r, w), host, port)
+    enderecos = ', '.join(str(s.getsockname()) for s in servidor.sockets)
+    print(f"Recomendador ouvindo em {enderecos}", flush=True)
+    async with servidor:
+        await servidor.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP/JSON de recomendação de ajustes.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--base-dir', default='.', help="Diretório com as bases X/Y/parâmetros")
+    parser.add_argument('--cache', type=int, default=4096, help="Entradas no cache de resultados (0 = sem cache)")
+    parser.add_argument('--memoria-maxima-mb', type=float, default=None,
+                        help="Limite de memória das bases carregadas; as menos usadas são descartadas")
+    parser.add_argument('--tabela', default=None,
+                        help="Diretório da tabela pré-computada (python -m recomendador.tabela) para /recommend")
+    parser.add_argument('--cache-ttl', type=float, default=None, help="Validade das entradas do cache, em segundos")
+    parser.add_argument('--armazem', nargs='?', const=True, default=None, metavar='DIR',
+                        help="Abre as bases do armazém mmap compartilhado (python -m recomendador.armazem)")
+    parser.add_argument('--log-json', action='store_true',
+                        help="Uma linha JSON por recomendação no stderr, com o tempo de cada etapa")
+    args = parser.parse_args(argv)
+
+    if args.log_json:
+        enable_json_logs()
+    t0 = time.perf_counter()
+    cache = ResultCache(args.cache, args.cache_ttl) if args.cache > 0 else None
+    memoria_maxima = None if args.memoria_maxima_mb is None else int(args.memoria_maxima_mb * 1024 * 1024)
+    recomendador = Recommender(base_dir=args.base_dir, cache=cache, memoria_maxima=memoria_maxima,
+                               armazem=args.armazem)
+    aquecimento = None
+    if args.tabela:
+        # Com a tabela, as bases só são carregadas se alguém chamar /recommend/batch
+        tabela = RecommendationTable.load(args.tabela)
+    else:
+        tabela = None
+        # As bases sobem já na partida (em segundo plano); com limite de memória, só as que cabem
+        # (pelo menos uma), e /ready espera por elas
+        aquecimento = Warmup(recomendador).start()
+    servico = RecommendationService(recomendador, tabela, aquecimento)
+    print(f"Subida em {time.perf_counter() - t0:.2f} s"
+          + (" (bases aquecendo em segundo plano; acompanhe GET /ready)" if aquecimento is not None else ""),
+          flush=True)
+    try:
+        asyncio.run(serve(servico, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Tabela de recomendações pré-computada (artefato offline).
+
+Para cada sistema, todas as combinações das caixas de seleção da barra lateral são
+resolvidas pela cascata categórica, e cada ponto numérico distinto (capacidade, Vn,
+H) de cada grupo resultante é avaliado contra as regras de especialista (VB × RS) e
+os limiares de desempenho. Na consulta sobra só um acesso à tabela e o vizinho mais
+próximo nos eixos numéricos; quando o vizinho mais próximo empata entre pontos
+distintos, a média é calculada a partir das métricas por cenário, também gravadas
+no artefato.
+
+Uso::
+
+    python -m recomendador.tabela tabela_recomendacoes          # compila
+    python -m recomendador.tabela tabela_recomendacoes --check  # confere as fontes
+
+O diretório gerado é autocontido (não precisa dos .xlsx nem do catálogo: a configuração
+de cada sistema, com a faixa de tensão, vai no manifesto) e pode ser copiado para os
+servidores.
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from .armazem import open_database, save_database
+from .atualizacao import DIRETORIO_DELTAS, list_deltas, source_fingerprint
+from .batch import CompiledSystem
+from .cache import file_sha256
+from .catalogo import (
+    VERSAO_CATALOGO, bloqueio_tensao_map, cenario_geracao_map, curvas_regulacao_map, req_suportabilidade_map,
+    system_from_dict, system_name_for, system_to_dict, tecnica_ativa_map, tipo_gd_map, valid_adjustments,
+)
+from .engine import (
+    HEADER_DROPOUT, HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO, MODO_MEDIA, MODO_UNICO,
+    STATUS_INCONSISTENTE, STATUS_OK, STATUS_SEM_AJUSTE, STATUS_SEM_CENARIO, Recommender, validate_scenario,
+)
+from .indice import NumericGroup
+from .saida import plain_text
+
+FORMATO_TABELA = 3
+MANIFESTO = 'manifesto.json'
+
+# Ordem das colunas categóricas de X (e dos códigos do cenário)
+MAPAS_CATEGORICOS = [
+    tipo_gd_map, bloqueio_tensao_map, req_suportabilidade_map, tecnica_ativa_map, curvas_regulacao_map, cenario_geracao_map,
+]
+# Combinações de regras rígidas (VB, RS) avaliadas para cada ponto
+REGRAS = [(vb, rs) for vb in sorted(bloqueio_tensao_map.values()) for rs in sorted(req_suportabilidade_map.values())]
+ARRAYS_TABELA = (
+    'codigos_usuario', 'grupo', 'ponto_inicio', 'ponto_capacidade_kw', 'ponto_vn_kv', 'ponto_h',
+    'linha_inicio', 'linhas', 'vencedor', 'valores',
+)
+
+
+def _compilar_sistema(sistema, indice):
+    """Arrays da tabela de um sistema, a partir do índice de cenários e dos arrays compilados."""
+    codigos_usuario = np.array(list(itertools.product(*[sorted(m.values()) for m in MAPAS_CATEGORICOS])), dtype=np.int16)
+    grupos = {}
+    grupo_por_codigo = np.full(len(codigos_usuario), -1, dtype=np.int32)
+    for i, codigos in enumerate(codigos_usuario.tolist()):
+        chave = indice.categorico.resolve_key(codigos)
+        if indice.categorico.group(chave) is not None:
+            grupo_por_codigo[i] = grupos.setdefault(chave, len(grupos))
+
+    ponto_inicio, linha_inicio = [0], [0]
+    capacidades, tensoes, inercias, linhas = [], [], [], []
+    for chave in grupos:
+        grupo = indice.numerico.group(chave, indice.categorico.group(chave))
+        valores = np.column_stack((grupo.capacidade_kw, grupo.vn_kv, grupo.h))
+        # As linhas do grupo já estão ordenadas por (capacidade, tensão, inércia)
+        quebra = np.flatnonzero((valores[1:] != valores[:-1]).any(axis=1)) + 1
+        for a, b in zip(np.concatenate(([0], quebra)), np.concatenate((quebra, [len(valores)]))):
+            capacidades.append(valores[a, 0])
+            tensoes.append(valores[a, 1])
+            inercias.append(valores[a, 2])
+            linhas.append(np.sort(grupo.posicoes[a:b]))
+            linha_inicio.append(linha_inicio[-1] + b - a)
+        ponto_inicio.append(len(capacidades))
+
+    n_ajustes = len(sistema.ajustes)
+    vencedor = np.full((len(linhas), len(REGRAS)), -1, dtype=np.int16)
+    valores = np.empty((len(linhas), n_ajustes, 3))
+    for p, posicoes in enumerate(linhas):
+        for r, (vb, rs) in enumerate(REGRAS):
+            indice_vencedor, valores[p] = sistema.evaluate(posicoes, vb, rs)
+            if indice_vencedor is not None:
+                vencedor[p, r] = indice_vencedor
+
+    return {
+        'codigos_usuario': codigos_usuario,
+        'grupo': grupo_por_codigo,
+        'ponto_inicio': np.array(ponto_inicio, dtype=np.int64),
+        'ponto_capacidade_kw': np.array(capacidades, dtype=float),
+        'ponto_vn_kv': np.array(tensoes, dtype=float),
+        'ponto_h': np.array(inercias, dtype=float),
+        'linha_inicio': np.array(linha_inicio, dtype=np.int64),
+        'linhas': np.concatenate(linhas) if linhas else np.empty(0, dtype=np.int64),
+        'vencedor': vencedor,
+        'valores': valores,
+    }
+
+
+def compile_table(destino, recomendador=None, base_dir='.'):
+    """Avalia todas as combinações e grava o artefato em ``destino`` (substituição atômica)."""
+    recomendador = Recommender(base_dir=base_dir) if recomendador is None else recomendador
+    destino = os.path.abspath(destino)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    manifesto = {'formato': FORMATO_TABELA, 'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'catalogo': VERSAO_CATALOGO, 'regras': REGRAS, 'sistemas': {}}
+    for nome in recomendador.sistemas:
+        base = recomendador.database(nome)
+        tabela = _compilar_sistema(CompiledSystem(base), base.indice)
+        dir_sistema = os.path.join(tmp, nome)
+        # A base vai no formato do armazém; os arrays da tabela ficam ao lado
+        save_database(base, dir_sistema, base_dir=None)
+        for chave in ARRAYS_TABELA:
+            np.save(os.path.join(dir_sistema, f'tabela_{chave}.npy'), tabela[chave], allow_pickle=False)
+        manifesto['sistemas'][nome] = {
+            # Configuração do registro do recomendador (faixa de tensão, candidatos, regras)
+            'config': system_to_dict(base.config),
+            'fontes': {os.path.basename(caminho): file_sha256(os.path.join(recomendador.base_dir, caminho))
+                       for caminho in base.config.arquivos.values()},
+            # Versão da base com as atualizações incrementais (``atualizacao``) já aplicadas
+            'versao': base.versao,
+            'grupos': int(len(tabela['ponto_inicio']) - 1),
+            'pontos': int(len(tabela['ponto_h'])),
+        }
+    with open(os.path.join(tmp, MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=1)
+
+    antigo = f"{destino}.{os.getpid()}.old"
+    if os.path.isdir(destino):
+        os.replace(destino, antigo)
+    os.replace(tmp, destino)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return manifesto
+
+
+class _TabelaSistema:
+    def __init__(self, sistema, arrays):
+        self.sistema = sistema
+        for chave in ARRAYS_TABELA:
+            setattr(self, chave, arrays[chave])
+        self.grupo_por_codigo = {tuple(c): g for c, g in zip(self.codigos_usuario.tolist(), self.grupo.tolist())}
+        self._numericos = {}
+
+    def _grupo_numerico(self, grupo):
+        numerico = self._numericos.get(grupo)
+        if numerico is None:
+            pontos = np.arange(self.ponto_inicio[grupo], self.ponto_inicio[grupo + 1])
+            numerico = NumericGroup(pontos, self.ponto_capacidade_kw, self.ponto_vn_kv, self.ponto_h)
+            self._numericos[grupo] = numerico
+        return numerico
+
+    def nearest_points(self, codigos, f1_capacidade, f2_tensao, f3_inercia):
+        grupo = self.grupo_por_codigo.get(tuple(codigos), -1)
+        if grupo < 0:
+            return np.empty(0, dtype=np.int64)
+        return self._grupo_numerico(grupo).nearest(f1_capacidade, f2_tensao, f3_inercia)
+
+    def rows(self, pontos):
+        return np.sort(np.concatenate([self.linhas[self.linha_inicio[p]:self.linha_inicio[p + 1]] for p in pontos]))
+
+
+def _ajuste(sistema, indice, valores):
+    registro = {'Ajuste_ID': sistema.ajustes[indice].item(), 'Label': sistema.labels[indice]}
+    registro.update(zip(('BAC', 'FNR', 'FPR'), valores[indice].tolist()))
+    registro.update(zip((HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO, HEADER_DROPOUT),
+                        sistema.parametros[indice].tolist()))
+    return {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in registro.items()}
+
+
+class RecommendationTable:
+    """Consulta ao artefato gerado por ``compile_table``.
+
+    ``recommend`` devolve o mesmo dicionário do serviço HTTP (status, sistema, modo,
+    cenário mais próximo, vencedor e alternativas).
+    """
+
+    def __init__(self, tabelas, manifesto):
+        self.tabelas = tabelas
+        self.manifesto = manifesto
+        # Registro com que a tabela foi compilada (roteamento por tensão), na ordem do manifesto
+        self.sistemas = {nome: tabela.sistema.config for nome, tabela in tabelas.items()}
+        self._regra = {regra: i for i, regra in enumerate(map(tuple, manifesto['regras']))}
+
+    @classmethod
+    def load(cls, diretorio, mmap_mode='r'):
+        with open(os.path.join(diretorio, MANIFESTO), encoding='utf-8') as f:
+            manifesto = json.load(f)
+        if manifesto.get('formato') != FORMATO_TABELA:
+            raise ValueError(f"Formato de tabela não suportado: {manifesto.get('formato')!r}")
+        if manifesto.get('catalogo') != VERSAO_CATALOGO:
+            raise ValueError(f"Tabela compilada com o catálogo versão {manifesto.get('catalogo')!r}; "
+                             f"o catálogo atual é a versão {VERSAO_CATALOGO}")
+        tabelas = {}
+        for nome, dados in manifesto['sistemas'].items():
+            dir_sistema = os.path.join(diretorio, nome)
+            arrays = {chave: np.load(os.path.join(dir_sistema, f'tabela_{chave}.npy'), mmap_mode=mmap_mode,
+                                     allow_pickle=False) for chave in ARRAYS_TABELA}
+            config = system_from_dict(nome, dados['config'])
+            base = open_database(config, dir_sistema, mmap_mode=mmap_mode)
+            tabelas[nome] = _TabelaSistema(CompiledSystem(base), arrays)
+        return cls(tabelas, manifesto)
+
+    def stale_sources(self, base_dir='.'):
+        """Arquivos de origem cujo conteúdo mudou desde a compilação (e deltas publicados depois dela)."""
+        mudados = []
+        for nome, dados in self.manifesto['sistemas'].items():
+            antes = len(mudados)
+            for arquivo, sha256 in dados['fontes'].items():
+                caminho = os.path.join(base_dir, arquivo)
+                if not os.path.exists(caminho) or file_sha256(caminho) != sha256:
+                    mudados.append(arquivo)
+            if len(mudados) == antes:
+                config = self.sistemas[nome]
+                mudados.extend(os.path.join(DIRETORIO_DELTAS, nome, f'{versao:06d}') for versao, _, _ in list_deltas(
+                    config, base_dir, dados.get('versao', 0), source_fingerprint(config, base_dir)))
+        return mudados
+
+    def recommend(self, cenario):
+        saida = {'status': None, 'sistema': None, 'modo': None, 'inconsistencias': [], 'n_cenarios': 0,
+                 'cenario_proximo': None, 'vencedor': None, 'alternativas': []}
+        inconsistencias = validate_scenario(cenario)
+        if inconsistencias:
+            saida.update(status=STATUS_INCONSISTENTE, inconsistencias=[plain_text(m) for m in inconsistencias])
+            return saida
+
+        nome = system_name_for(cenario.tensao_kv, self.sistemas)
+        tabela = self.tabelas[nome]
+        sistema = tabela.sistema
+        codigos = cenario.categorical_codes()
+        pontos = tabela.nearest_points(codigos, cenario.capacidade_kw, cenario.tensao_kv, cenario.inercia_busca)
+        saida['sistema'] = nome
+        if len(pontos) == 0:
+            saida['status'] = STATUS_SEM_CENARIO
+            return saida
+
+        regra = self._regra[(codigos[1], codigos[2])]
+        if len(pontos) == 1:
+            # Caso comum: um único ponto numérico, resultado pré-computado
+            p = pontos[0]
+            n_linhas = int(tabela.linha_inicio[p + 1] - tabela.linha_inicio[p])
+            posicoes = tabela.linhas[tabela.linha_inicio[p]:tabela.linha_inicio[p + 1]]
+            valores = tabela.valores[p]
+            vencedor = int(tabela.vencedor[p, regra])
+            vencedor = None if vencedor < 0 else vencedor
+        else:
+            posicoes = tabela.rows(pontos)
+            n_linhas = len(posicoes)
+            vencedor, valores = sistema.evaluate(posicoes, codigos[1], codigos[2])
+
+        saida['modo'] = MODO_UNICO if n_linhas == 1 else MODO_MEDIA
+        saida['n_cenarios'] = n_linhas
+        if n_linhas == 1:
+            saida['cenario_proximo'] = str(sistema.nomes[posicoes[0]])
+        if vencedor is None:
+            saida['status'] = STATUS_SEM_AJUSTE
+            return saida
+
+        ordem = valid_adjustments(sistema.config, valores, codigos[1], codigos[2])
+        saida['status'] = STATUS_OK
+        saida['vencedor'] = _ajuste(sistema, vencedor, valores)
+        saida['alternativas'] = [_ajuste(sistema, i, valores) for i in ordem[1:].tolist()]
+        return saida
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compila a tabela de recomendações pré-computada.")
+    parser.add_argument('destino', nargs='?', default='tabela_recomendacoes', help="Diretório do artefato")
+    parser.add_argument('--base-dir', default='.', help="Diretório com as bases X/Y/parâmetros")
+    parser.add_argument('--check', action='store_true', help="Só confere se o artefato está atualizado")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mudados = RecommendationTable.load(args.destino).stale_sources(args.base_dir)
+        for arquivo in mudados:
+            print(f"desatualizado: {arquivo}")
+        return 1 if mudados else 0
+
+    t0 = time.perf_counter()
+    manifesto = compile_table(args.destino, base_dir=args.base_dir)
+    for nome, dados in manifesto['sistemas'].items():
+        print(f"{nome}: {dados['grupos']} grupos, {dados['pontos']} pontos")
+    print(f"Tabela gravada em {args.destino} ({time.perf_counter() - t0:.2f} s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
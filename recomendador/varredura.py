@@ -0,0 +1,144 @@
+"""Varredura de sensibilidade: recomendação ao longo de uma grade de capacidades, tensões ou inércias.
+
+Com a configuração categórica fixa, a cascata de filtros roda uma única vez por
+sistema; a grade inteira é posicionada sobre os valores ordenados do grupo numérico
+(``NumericGroup.nearest_grid``) e cada conjunto distinto de cenários simulados
+selecionados é avaliado uma única vez. O resultado é uma tabela com uma linha por
+ponto da grade (mesmas colunas do lote) e, opcionalmente, um gráfico do vencedor e
+do BAC ao longo do eixo::
+
+    tabela = sweep(recomendador, cenario, 'capacidade_kw', grid(500, 5000, 40))
+    figura = sweep_chart(tabela, 'capacidade_kw')
+"""
+import numpy as np
+import pandas as pd
+
+from .engine import (
+    HEADER_DROPOUT, HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO, STATUS_INCONSISTENTE, STATUS_OK,
+    STATUS_SEM_AJUSTE, STATUS_SEM_CENARIO, validate_scenario,
+)
+from .saida import COLUNAS_SAIDA, STATUS_ENTRADA_INVALIDA, output_row, plain_text
+
+# Eixos que podem ser varridos (campos de ``Scenario``) e o rótulo de cada um
+EIXOS = {
+    'capacidade_kw': 'CAPACIDADE DA GD (kW)',
+    'tensao_kv': 'TENSÃO DO SISTEMA (kV)',
+    'inercia': 'CONSTANTE DE INÉRCIA H (s)',
+}
+# Posição de cada eixo na cascata numérica (capacidade, tensão, inércia)
+_ETAPA_EIXO = {'capacidade_kw': 0, 'tensao_kv': 1, 'inercia': 2}
+MAXIMO_PONTOS = 10_000
+
+
+def grid(inicio, fim, pontos):
+    """Grade uniforme de ``pontos`` valores entre ``inicio`` e ``fim`` (inclusive)."""
+    return np.linspace(float(inicio), float(fim), int(pontos))
+
+
+def _linha_avaliacao(recomendador, base, posicoes, codigos):
+    config = base.config
+    if len(posicoes) == 0:
+        return output_row(config.nome, STATUS_SEM_CENARIO,
+                            "Nenhum cenário compatível foi encontrado com os filtros fornecidos.")
+    modo, _, _, validos = recomendador.evaluate(base, posicoes, codigos[1], codigos[2])
+    linha = output_row(config.nome, STATUS_OK if not validos.empty else STATUS_SEM_AJUSTE)
+    linha['modo'] = modo
+    linha['n_cenarios'] = len(posicoes)
+    linha['cenario_proximo'] = '; '.join(base.X_total_sim['NomeCenario'].iloc[posicoes].astype(str).tolist())
+    if validos.empty:
+        linha['mensagem'] = "Nenhum ajuste cumpriu todos os critérios de regras e desempenho."
+    else:
+        vencedor = validos.iloc[0]
+        linha['vencedor'] = vencedor['Label']
+        for coluna in ('Ajuste_ID', 'BAC', 'FNR', 'FPR', HEADER_ROCOF, HEADER_TEMPO, HEADER_TENSAO_BLOQUEIO,
+                       HEADER_DROPOUT):
+            linha[coluna] = vencedor[coluna]
+    return linha
+
+
+def sweep(recomendador, cenario, eixo, valores):
+    """Recomendação para ``cenario`` com o campo ``eixo`` trocado por cada um dos ``valores``.
+
+    Retorna um DataFrame com a coluna do eixo e as colunas de saída do lote, uma linha
+    por valor (na ordem dada). Cada linha é idêntica à de ``recommend`` para o cenário
+    correspondente.
+    """
+    if eixo not in EIXOS:
+        raise ValueError(f"Eixo inválido: {eixo!r}. Opções: {list(EIXOS)}")
+    valores = np.asarray(valores, dtype=float).reshape(-1)
+    if len(valores) > MAXIMO_PONTOS:
+        raise ValueError(f"Grade com {len(valores)} pontos; o máximo é {MAXIMO_PONTOS}.")
+    if not np.isfinite(valores).all():
+        raise ValueError("A grade da varredura deve ter apenas valores finitos.")
+    if eixo == 'inercia' and cenario.tipo_gd != 'Gerador Síncrono':
+        raise ValueError("A varredura de inércia só se aplica a Gerador Síncrono.")
+
+    linhas = [None] * len(valores)
+    inconsistencias = validate_scenario(cenario)
+    if inconsistencias:
+        mensagem = ' | '.join(plain_text(m) for m in inconsistencias)
+        linhas = [output_row(None, STATUS_INCONSISTENTE, mensagem) for _ in valores]
+        return _tabela(eixo, valores, linhas)
+
+    recomendador.check_sources()
+    codigos = cenario.categorical_codes()
+    alvos = [cenario.capacidade_kw, cenario.tensao_kv, cenario.inercia_busca]
+    etapa = _ETAPA_EIXO[eixo]
+
+    # Só a tensão pode mudar de sistema ao longo da grade
+    tensoes = valores if eixo == 'tensao_kv' else np.full(len(valores), cenario.tensao_kv)
+    por_sistema = {}
+    for i, tensao in enumerate(tensoes.tolist()):
+        try:
+            nome = recomendador.system_for(tensao)
+        except ValueError as e:
+            linhas[i] = output_row(None, STATUS_ENTRADA_INVALIDA, str(e))
+            continue
+        por_sistema.setdefault(nome, []).append(i)
+
+    for nome, indices in por_sistema.items():
+        base = recomendador.database(nome)
+        chave = base.indice.categorico.resolve_key(codigos)
+        posicoes_grupo = base.indice.categorico.group(chave)
+        if posicoes_grupo is None:
+            linha = _linha_avaliacao(recomendador, base, np.empty(0, dtype=np.int64), codigos)
+            for i in indices:
+                linhas[i] = linha
+            continue
+        grupo = base.indice.numerico.group(chave, posicoes_grupo)
+        classes, posicoes = grupo.nearest_grid(etapa, valores[indices], *alvos)
+        # Classes diferentes podem cair nos mesmos cenários simulados: cada conjunto é avaliado uma vez
+        avaliadas = {}
+        por_classe = []
+        for p in posicoes:
+            linha = avaliadas.get(p.tobytes())
+            if linha is None:
+                linha = avaliadas[p.tobytes()] = _linha_avaliacao(recomendador, base, p, codigos)
+            por_classe.append(linha)
+        for i, classe in zip(indices, classes.tolist()):
+            linhas[i] = por_classe[classe]
+    return _tabela(eixo, valores, linhas)
+
+
+def _tabela(eixo, valores, linhas):
+    tabela = pd.DataFrame(linhas, columns=COLUNAS_SAIDA)
+    tabela.insert(0, eixo, valores)
+    tabela['Ajuste_ID'] = tabela['Ajuste_ID'].astype('Int64')
+    return tabela
+
+
+def sweep_chart(tabela, eixo):
+    """Gráfico do BAC do vencedor ao longo do eixo, com os pontos coloridos pelo ajuste vencedor."""
+    import plotly.express as px  # só quando o gráfico é pedido
+
+    pontos = tabela[tabela['vencedor'].notna()]
+    figura = px.scatter(pontos, x=eixo, y='BAC', color='vencedor',
+                        hover_data={HEADER_ROCOF: ':.4f', HEADER_TEMPO: ':.4f', 'cenario_proximo': True})
+    # Linha do BAC por baixo dos pontos (com lacunas onde não há ajuste válido)
+    figura.add_scatter(x=tabela[eixo], y=tabela['BAC'], mode='lines', line=dict(color='lightgray'),
+                       showlegend=False, hoverinfo='skip')
+    figura.data = figura.data[-1:] + figura.data[:-1]
+    figura.update_traces(marker=dict(size=9), selector=dict(mode='markers'))
+    figura.update_layout(xaxis_title=EIXOS[eixo], yaxis_title="ACURÁCIA BALANCEADA (%)",
+                         legend_title_text="Ajuste vencedor", height=450)
+    return figura
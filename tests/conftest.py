@@ -0,0 +1,19 @@
+"""Fixtures compartilhadas: as bases de exemplo (xlsx) da raiz do repositório."""
+import os
+
+import pytest
+
+from recomendador.engine import Recommender
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def base_dir():
+    return RAIZ
+
+
+@pytest.fixture(scope='session')
+def recomendador():
+    # Um motor por sessão de testes: as bases são lidas uma única vez
+    return Recommender(base_dir=RAIZ)
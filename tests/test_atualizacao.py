@@ -0,0 +1,51 @@
+"""Atualizações incrementais: deltas inconsistentes são rejeitados antes de virar versão."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from recomendador.atualizacao import apply_delta
+from recomendador.engine import METRICAS
+
+
+@pytest.fixture(scope='module')
+def base(recomendador):
+    return recomendador.database('MT')
+
+
+def _delta(base, n=3):
+    """n cenários novos (cópias renomeadas de linhas da base) e as métricas completas dos candidatos."""
+    x_novos = base.X_total_sim.iloc[:n].copy()
+    x_novos['NomeCenario'] = [f'Novo_{i}' for i in range(n)]
+    y_novos = {'NomeCenario': x_novos['NomeCenario'].tolist()}
+    for ajuste in base.config.ajustes_candidatos:
+        for m, metrica in enumerate(METRICAS):
+            y_novos[f'{metrica}_Ajuste_{ajuste}'] = base.metricas[:n, base.coluna_ajuste[ajuste], m]
+    return x_novos, y_novos
+
+
+def test_delta_completo_vira_a_versao_seguinte(base):
+    x_novos, y_novos = _delta(base)
+    nova = apply_delta(base, x_novos, pd.DataFrame(y_novos))
+    assert nova.versao == base.versao + 1 and len(nova.X_total_sim) == len(base.X_total_sim) + 3
+    assert np.array_equal(nova.aprovacao[-3:], base.aprovacao[:3])
+
+
+def test_linhas_de_x_sem_metricas_sao_rejeitadas(base):
+    x_novos, _ = _delta(base)
+    with pytest.raises(ValueError, match='Métricas ausentes'):
+        apply_delta(base, x_novos)
+
+
+def test_metricas_sem_um_ajuste_candidato_sao_rejeitadas(base):
+    x_novos, y_novos = _delta(base)
+    ajuste = base.config.ajustes_candidatos[-1]
+    del y_novos[f'FPR_Ajuste_{ajuste}']
+    with pytest.raises(ValueError, match=rf'\[{ajuste}\]'):
+        apply_delta(base, x_novos, pd.DataFrame(y_novos))
+
+
+def test_metricas_apagadas_de_um_cenario_existente_sao_rejeitadas(base):
+    ajuste = base.config.ajustes_candidatos[0]
+    y = pd.DataFrame({'NomeCenario': [base.X_total_sim['NomeCenario'].iloc[0]], f'BAC_Ajuste_{ajuste}': ['n/d']})
+    with pytest.raises(ValueError, match='Métricas ausentes'):
+        apply_delta(base, y_novos=y)
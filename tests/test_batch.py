@@ -0,0 +1,26 @@
+"""Recomendação em lote: processos de trabalho e caminho serial respondem o mesmo."""
+from dataclasses import replace
+
+import pandas as pd
+
+from recomendador.batch import recommend_batch
+from recomendador.catalogo import SISTEMAS
+from recomendador.engine import Recommender
+
+
+def cenarios_gs(tensoes_kv, capacidades_kw):
+    return pd.DataFrame({
+        'capacidade_kw': capacidades_kw, 'tensao_kv': tensoes_kv, 'tipo_gd': 'Gerador Síncrono',
+        'bloqueio_tensao': 'Habilitado', 'req_suportabilidade': 'Categoria I', 'tecnica_ativa': 'Desabilitada',
+        'curva_regulacao': 'Desabilitada', 'cenario_geracao': 'Apenas Gerador Síncrono', 'inercia': None})
+
+
+def test_processos_usam_as_faixas_de_tensao_do_recomendador(base_dir):
+    # 69 kV fica na base MT: a faixa padrão a mandaria para a AT
+    sistemas = {'AT': replace(SISTEMAS['AT'], tensao_min_kv=100.0),
+                'MT': replace(SISTEMAS['MT'], tensao_max_kv=100.0)}
+    recomendador = Recommender(base_dir=base_dir, sistemas=sistemas)
+    cenarios = cenarios_gs([69.0] * 4 + [138.0] * 2, [1112.0, 1500.0, 2000.0, 12500.0, 20000.0, 30000.0])
+    serial = recommend_batch(recomendador, cenarios)
+    assert list(serial['sistema']) == ['MT'] * 4 + ['AT'] * 2
+    pd.testing.assert_frame_equal(recommend_batch(recomendador, cenarios, workers=2), serial)
@@ -0,0 +1,59 @@
+"""Cache de resultados: ligado ou desligado, o motor responde o mesmo. Cache das planilhas: lê o mesmo que o xlsx."""
+import os
+
+import pandas as pd
+import pytest
+
+from recomendador.cache import read_excel_cached
+from recomendador.engine import Recommender, Scenario
+from recomendador.memo import ResultCache
+
+
+def cenario_gs(capacidade_kw, inercia):
+    return Scenario(capacidade_kw, 13.8, 'Gerador Síncrono', 'Habilitado', 'Categoria I', 'Desabilitada',
+                    'Desabilitada', 'Apenas Gerador Síncrono', inercia)
+
+
+@pytest.mark.parametrize('entradas', [
+    # Lados opostos do ponto médio entre 1112 kW e 1562 kW (mesma chave com as entradas arredondadas)
+    [(1337.004, 0.4182), (1336.996, 0.4182)],
+    # H exatamente na base e logo acima dela
+    [(1112.0, 0.4182), (1112.0, 0.4182004)],
+])
+def test_entradas_vizinhas_de_um_corte_nao_compartilham_resultado(base_dir, recomendador, entradas):
+    com_cache = Recommender(base_dir=base_dir, cache=ResultCache())
+    for capacidade_kw, inercia in entradas + entradas:
+        cenario = cenario_gs(capacidade_kw, inercia)
+        esperado = recomendador.recommend(cenario)
+        obtido = com_cache.recommend(cenario)
+        assert obtido.nome_cenario == esperado.nome_cenario
+        assert list(obtido.validos['Label']) == list(esperado.validos['Label'])
+    assert com_cache.cache.stats()['hits'] == len(entradas)
+
+
+def test_cenarios_do_mesmo_ponto_simulado_reaproveitam_a_avaliacao(base_dir):
+    com_cache = Recommender(base_dir=base_dir, cache=ResultCache())
+    primeiro = com_cache.recommend(cenario_gs(1500.0, 0.7557))
+    segundo = com_cache.recommend(cenario_gs(1550.0, 0.75))
+    assert segundo.nome_cenario == primeiro.nome_cenario == 'C3_Cgd1_H1_RS1_VB1'
+    assert segundo.candidatos is primeiro.candidatos
+    assert segundo.cenario.capacidade_kw == 1550.0
+
+
+def test_planilha_com_tipos_misturados_le_o_mesmo_que_o_xlsx(tmp_path):
+    caminho = str(tmp_path / 'mista.xlsx')
+    pd.DataFrame({'mista': [1, 'a', None], 7: ['x', 'y', 'z'], pd.Timestamp('2024-01-01'): [1.5, 2.5, 3.5]}) \
+        .to_excel(caminho, index=False)
+    esperado = pd.read_excel(caminho)
+    assert esperado['mista'].tolist()[:2] == [1, 'a']
+    # Não cabe nos blocos sem perder tipos: as duas leituras vêm do xlsx
+    for _ in range(2):
+        pd.testing.assert_frame_equal(read_excel_cached(caminho, cache_dir=str(tmp_path / 'cache')), esperado)
+    assert not os.path.exists(tmp_path / 'cache' / 'mista__0.json')
+
+    caminho = str(tmp_path / 'texto.xlsx')
+    pd.DataFrame({'nome': ['a', None, 'c'], 'valor': [1, 2, 3]}).to_excel(caminho, index=False)
+    esperado = pd.read_excel(caminho)
+    for _ in range(2):
+        pd.testing.assert_frame_equal(read_excel_cached(caminho, cache_dir=str(tmp_path / 'cache')), esperado)
+    assert os.path.exists(tmp_path / 'cache' / 'texto__0.json')
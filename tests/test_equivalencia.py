@@ -0,0 +1,197 @@
+"""Equivalência entre os caminhos de recomendação, sobre uma amostra fixa de entradas das duas bases.
+
+* motor x cascata original do app (pandas), com as duas mudanças documentadas: o desempate
+  numérico só entre os cenários que sobraram (user-003) e empates exatos de BAC na ordem
+  do catálogo (ordenação estável);
+* lote serial x lote em processos;
+* tabela pré-computada x motor;
+* base com delta aplicado x base relida inteira;
+* cache de resultados ligado x desligado.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recomendador.atualizacao import apply_delta
+from recomendador.batch import recommend_batch
+from recomendador.catalogo import (
+    LIMIAR_BAC, LIMIAR_FNR, LIMIAR_FPR, SISTEMAS, bloqueio_tensao_map, cenario_geracao_map, curvas_regulacao_map,
+    req_suportabilidade_map, tecnica_ativa_map, tipo_gd_map,
+)
+from recomendador.engine import (
+    STATUS_INCONSISTENTE, STATUS_OK, STATUS_SEM_AJUSTE, STATUS_SEM_CENARIO, Database, Recommender, Scenario,
+    build_metrics_tensor, load_simulation_database, validate_scenario,
+)
+from recomendador.indice import ScenarioIndex
+from recomendador.memo import ResultCache
+from recomendador.service import recommendation_to_dict
+from recomendador.tabela import RecommendationTable, compile_table
+
+# Mapas na ordem das colunas categóricas de X (Tipo_gd, VB, RS, TecAt, CR, Cgd)
+MAPAS = (tipo_gd_map, bloqueio_tensao_map, req_suportabilidade_map, tecnica_ativa_map, curvas_regulacao_map,
+         cenario_geracao_map)
+# Valores de TecAt, CR e Cgd que o app tenta quando o valor pedido não existe no grupo ("Desconhecido")
+FALLBACK = {3: 4, 4: 5, 5: 5}
+CENARIOS_POR_BASE = 150
+# Linhas do fim da base MT que chegam como delta
+LINHAS_DELTA = 400
+
+
+def amostra_de_cenarios(base, n, semente):
+    """Entradas consistentes em torno dos cenários simulados: pontos da base, pontos médios, vizinhanças
+    e, em parte das linhas, uma categoria trocada (exercita os fallbacks da cascata)."""
+    rng = np.random.default_rng(semente)
+    x = base.X_total_sim
+    capacidades = np.unique(x.iloc[:, 1].to_numpy(dtype=float) / 1000.0)
+    tensoes = np.unique(x.iloc[:, 2].to_numpy(dtype=float) / 1000.0)
+    inercias = np.unique(x.iloc[:, 3].to_numpy(dtype=float))
+    inversos = [{v: k for k, v in mapa.items()} for mapa in MAPAS]
+    cenarios = []
+    while len(cenarios) < n:
+        linha = x.iloc[int(rng.integers(len(x)))]
+        textos = [inverso.get(int(linha.iloc[4 + i]), None) for i, inverso in enumerate(inversos)]
+        if rng.random() < 0.25:
+            i = int(rng.integers(len(MAPAS)))
+            textos[i] = str(rng.choice(list(MAPAS[i])))
+        if None in textos:
+            continue
+        i = int(rng.integers(len(capacidades)))
+        capacidade = float(rng.choice([capacidades[i], capacidades[i] * 1.07, capacidades[i] * 0.93,
+                                       (capacidades[i] + capacidades[min(i + 1, len(capacidades) - 1)]) / 2]))
+        tensao = float(rng.choice(tensoes)) + float(rng.choice([0.0, 0.0, -0.4, 0.4]))
+        inercia = None
+        if textos[0] == 'Gerador Síncrono':
+            inercia = rng.choice([None, float(rng.choice(inercias)), float(rng.choice(inercias)) + 0.05, 0.3, 5.0])
+        cenario = Scenario(capacidade, tensao, *textos, inercia)
+        if base.config.covers(tensao) and not validate_scenario(cenario):
+            cenarios.append(cenario)
+    return cenarios
+
+
+def cascata_original(x, y, config, cenario):
+    """Busca e filtros do app original (pandas). Retorna (status, posições, métricas dos candidatos, ids válidos)."""
+    codigos = cenario.categorical_codes()
+    candidatos = x
+    for i, coluna in enumerate(x.columns[4:10]):
+        filtrado = candidatos[candidatos[coluna] == codigos[i]]
+        if filtrado.empty and i in FALLBACK:
+            filtrado = candidatos[candidatos[coluna] == FALLBACK[i]]
+        if not filtrado.empty:
+            candidatos = filtrado
+
+    # Desempate numérico: capacidade, tensão e o menor H acima do alvo, só entre os que sobraram
+    f1, f2, f3 = cenario.capacidade_kw, cenario.tensao_kv, cenario.inercia_busca
+    diff = (candidatos.iloc[:, 1] / 1000.0 - f1).abs()
+    candidatos = candidatos[diff == diff.min()]
+    if len(candidatos) > 1:
+        diff = (candidatos.iloc[:, 2] / 1000.0 - f2).abs()
+        candidatos = candidatos[diff == diff.min()]
+    if len(candidatos) > 1:
+        diff_abs = (candidatos.iloc[:, 3] - f3).abs()
+        if np.isclose(diff_abs.min(), 0.0, atol=1e-9):
+            candidatos = candidatos[diff_abs == 0]
+        else:
+            diff_sinal = candidatos.iloc[:, 3] - f3
+            maiores = diff_sinal > 0
+            candidatos = (candidatos[diff_sinal == diff_sinal[maiores].min()] if maiores.any()
+                          else candidatos[diff_abs == diff_abs.min()])
+    if candidatos.empty:
+        return STATUS_SEM_CENARIO, [], None, None
+
+    metricas = y.loc[candidatos.index]
+    tabela = pd.DataFrame([{'Ajuste_ID': a, **{m: metricas[f'{m}_Ajuste_{a}'].mean() for m in ('BAC', 'FNR', 'FPR')}}
+                           for a in config.ajustes_candidatos])
+    elegiveis = config.allowed_adjustments(codigos[1], codigos[2])
+    validos = tabela[tabela['Ajuste_ID'].isin(elegiveis) & (tabela['BAC'] > LIMIAR_BAC)
+                     & (tabela['FNR'] < LIMIAR_FNR) & (tabela['FPR'] < LIMIAR_FPR)]
+    validos = validos.sort_values(by='BAC', ascending=False, kind='stable')
+    status = STATUS_OK if len(validos) else STATUS_SEM_AJUSTE
+    return status, sorted(candidatos.index), tabela[['BAC', 'FNR', 'FPR']].to_numpy(), list(validos['Ajuste_ID'])
+
+
+@pytest.fixture(scope='module')
+def cenarios(recomendador):
+    return [c for semente, nome in enumerate(sorted(SISTEMAS))
+            for c in amostra_de_cenarios(recomendador.database(nome), CENARIOS_POR_BASE, semente)]
+
+
+@pytest.fixture(scope='module')
+def cenarios_lote(cenarios):
+    return pd.DataFrame([{**vars(c), 'inercia': np.nan if c.inercia is None else c.inercia} for c in cenarios])
+
+
+@pytest.mark.parametrize('nome', sorted(SISTEMAS))
+def test_motor_responde_como_a_cascata_original(base_dir, recomendador, cenarios, nome):
+    config = SISTEMAS[nome]
+    arquivos = {k: os.path.join(base_dir, v) for k, v in config.arquivos.items()}
+    x, y = load_simulation_database(arquivos['x'], arquivos['y'])
+    status_vistos = set()
+    for cenario in cenarios:
+        if not config.covers(cenario.tensao_kv):
+            continue
+        status, posicoes, metricas, validos = cascata_original(x, y, config, cenario)
+        obtido = recomendador.recommend(cenario)
+        status_vistos.add(status)
+        assert obtido.status == status, cenario
+        assert sorted(obtido.posicoes.tolist()) == posicoes, cenario
+        if metricas is not None:
+            np.testing.assert_allclose(obtido.candidatos[['BAC', 'FNR', 'FPR']].to_numpy(), metricas, rtol=1e-12)
+            assert list(obtido.validos['Ajuste_ID']) == validos, cenario
+    # A amostra tem recomendações e cenários sem nenhum ajuste válido
+    assert {STATUS_OK, STATUS_SEM_AJUSTE} <= status_vistos
+
+
+def test_lote_em_processos_responde_como_o_serial(recomendador, cenarios_lote):
+    serial = recommend_batch(recomendador, cenarios_lote)
+    assert STATUS_INCONSISTENTE not in set(serial['status'])
+    pd.testing.assert_frame_equal(recommend_batch(recomendador, cenarios_lote, workers=2), serial)
+    pd.testing.assert_frame_equal(recommend_batch(recomendador, cenarios_lote, workers=2, vizinhos=3),
+                                  recommend_batch(recomendador, cenarios_lote, vizinhos=3))
+
+
+def test_tabela_responde_como_o_motor(base_dir, recomendador, cenarios, tmp_path):
+    compile_table(str(tmp_path / 'tabela'), recomendador, base_dir=base_dir)
+    tabela = RecommendationTable.load(str(tmp_path / 'tabela'))
+    for cenario in cenarios:
+        assert tabela.recommend(cenario) == recommendation_to_dict(recomendador.recommend(cenario)), cenario
+
+
+def test_delta_responde_como_a_base_relida(base_dir, recomendador, cenarios):
+    completa = recomendador.database('MT')
+    config = completa.config
+    arquivos = {k: os.path.join(base_dir, v) for k, v in config.arquivos.items()}
+    x, y = load_simulation_database(arquivos['x'], arquivos['y'])
+    corte = len(x) - LINHAS_DELTA
+    x_inicial = x.iloc[:corte]
+    metricas, coluna_ajuste = build_metrics_tensor(y, x_inicial.index)
+    inicial = Database(config, completa.df_params, x_inicial, ScenarioIndex.from_frame(x_inicial), metricas,
+                       coluna_ajuste)
+
+    atualizada = apply_delta(inicial, x.iloc[corte:], y.iloc[corte:])
+    pd.testing.assert_frame_equal(atualizada.X_total_sim, completa.X_total_sim)
+    assert atualizada.coluna_ajuste == completa.coluna_ajuste
+    np.testing.assert_array_equal(atualizada.metricas, completa.metricas)
+    np.testing.assert_array_equal(atualizada.aprovacao, completa.aprovacao)
+    for cenario in cenarios:
+        if not config.covers(cenario.tensao_kv):
+            continue
+        alvos = (cenario.capacidade_kw, cenario.tensao_kv, cenario.inercia_busca)
+        posicoes = atualizada.indice.nearest(cenario.categorical_codes(), *alvos)
+        assert np.array_equal(posicoes, completa.indice.nearest(cenario.categorical_codes(), *alvos)), cenario
+        if len(posicoes):
+            codigos = cenario.categorical_codes()
+            _, _, candidatos, validos = recomendador.evaluate(atualizada, posicoes, codigos[1], codigos[2])
+            _, _, esperados, validos_esperados = recomendador.evaluate(completa, posicoes, codigos[1], codigos[2])
+            pd.testing.assert_frame_equal(candidatos, esperados)
+            pd.testing.assert_frame_equal(validos, validos_esperados)
+
+
+def test_cache_ligado_responde_como_desligado(base_dir, recomendador, cenarios):
+    com_cache = Recommender(base_dir=base_dir, cache=ResultCache())
+    # Duas passadas: a segunda sai toda do cache
+    for cenario in cenarios + cenarios:
+        assert recommendation_to_dict(com_cache.recommend(cenario)) == \
+            recommendation_to_dict(recomendador.recommend(cenario)), cenario
+    assert com_cache.cache.stats()['hits'] >= len(cenarios)
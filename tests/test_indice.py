@@ -0,0 +1,16 @@
+"""Desempate numérico (capacidade -> tensão -> inércia) restrito aos cenários que sobraram."""
+from recomendador.engine import MODO_MEDIA, STATUS_OK, Scenario
+
+
+def test_desempate_de_inercia_considera_so_os_cenarios_que_sobraram(recomendador):
+    # No grupo (GS, VB0, RS1, Cgd3), 2000 kW empata em 1562 kW com dois cenários de H 0.7557. O código
+    # original tomava o menor H acima de 0.3 no grupo inteiro (0.4182, dos cenários de 1112 kW), não
+    # achava esse H entre os empatados e respondia "nenhum cenário compatível"
+    recomendacao = recomendador.recommend(Scenario(
+        2000.0, 13.2, 'Gerador Síncrono', 'Desabilitado', 'Categoria I', 'Desabilitada', 'Desabilitada',
+        'Cenário Híbrido (Maior contribuição de GS)', 0.3))
+    assert recomendacao.status == STATUS_OK
+    assert recomendacao.modo == MODO_MEDIA
+    nomes = recomendador.database('MT').X_total_sim['NomeCenario'].iloc[recomendacao.posicoes]
+    assert sorted(nomes) == ['C1T_Cgd3_H1_RS1_VB0_A3', 'C2T_Cgd3_H1_RS1_VB0_A3']
+    assert list(recomendacao.validos['Label']) == ['M_F2', 'M_F3', 'M_F4']
@@ -0,0 +1,61 @@
+"""Ingestão em blocos: a base gravada é aberta pelo motor e pelo lote com os mesmos resultados das planilhas."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recomendador.batch import recommend_batch
+from recomendador.catalogo import SISTEMAS
+from recomendador.engine import Recommender, Scenario
+from recomendador.ingestao import ingest
+
+CENARIOS = pd.DataFrame([
+    (1500.0, 13.8, 'Gerador Síncrono', 'Habilitado', 'Categoria I', 'Desabilitada', 'Desabilitada',
+     'Apenas Gerador Síncrono', 0.7557),
+    (1336.996, 13.8, 'Gerador Síncrono', 'Habilitado', 'Categoria I', 'Desabilitada', 'Desabilitada',
+     'Apenas Gerador Síncrono', 0.4182),
+    (2000.0, 11.9, 'Gerador Síncrono', 'Desabilitado', 'Sem Requisitos', 'Desabilitada', 'Desabilitada',
+     'Apenas Gerador Síncrono', None),
+    (1112.0, 13.8, 'Gerador Baseado em Inversor', 'Habilitado', 'Categoria II', 'GEFS', 'volt-var',
+     'Apenas Gerador Baseado em Inversores', None),
+    (20000.0, 13.8, 'Gerador Baseado em Inversor', 'Desabilitado', 'Categoria III', 'Desconhecido', 'Desconhecido',
+     'Cenário Híbrido (Maior contribuição de GBI)', None),
+    (12500.0, 13.8, 'Gerador Síncrono', 'Habilitado', 'Categoria II', 'Desabilitada', 'hertz-watt',
+     'Cenário Híbrido (Maior contribuição de GS)', 2.0),
+], columns=['capacidade_kw', 'tensao_kv', 'tipo_gd', 'bloqueio_tensao', 'req_suportabilidade', 'tecnica_ativa',
+            'curva_regulacao', 'cenario_geracao', 'inercia'])
+
+
+@pytest.fixture(scope='module')
+def destino(base_dir, tmp_path_factory):
+    config = SISTEMAS['MT']
+    tmp = tmp_path_factory.mktemp('ingestao')
+    x_csv, y_csv = tmp / 'X_total.csv', tmp / 'Metricas_Y.csv'
+    pd.read_excel(os.path.join(base_dir, config.arquivos['x']), sheet_name='X_total').to_csv(x_csv, index=False)
+    pd.read_excel(os.path.join(base_dir, config.arquivos['y'])).to_csv(y_csv, index=False)
+    destino = tmp / 'bases_MT'
+    # Blocos pequenos: a base inteira atravessa várias fronteiras de bloco
+    ingest(config, str(x_csv), str(y_csv), os.path.join(base_dir, config.arquivos['params']), str(destino),
+           tamanho_bloco=7, progresso=lambda linhas, segundos: None)
+    return str(destino)
+
+
+def test_motor_com_a_base_ingerida_responde_como_as_planilhas(base_dir, recomendador, destino):
+    ingerido = Recommender(base_dir=base_dir, compiladas={'MT': destino})
+    for valores in CENARIOS.astype(object).where(CENARIOS.notna(), None).itertuples(index=False):
+        cenario = Scenario(*valores)
+        esperado, obtido = recomendador.recommend(cenario), ingerido.recommend(cenario)
+        assert obtido.status == esperado.status
+        assert obtido.nome_cenario == esperado.nome_cenario
+        assert np.array_equal(obtido.posicoes, esperado.posicoes)
+        if esperado.candidatos is not None:
+            pd.testing.assert_frame_equal(obtido.candidatos, esperado.candidatos)
+            assert list(obtido.validos['Label']) == list(esperado.validos['Label'])
+    assert ingerido.loaded_systems() == ['MT']
+
+
+def test_lote_com_a_base_ingerida_responde_como_as_planilhas(base_dir, recomendador, destino):
+    esperado = recommend_batch(recomendador, CENARIOS)
+    obtido = recommend_batch(Recommender(base_dir=base_dir, compiladas={'MT': destino}), CENARIOS)
+    pd.testing.assert_frame_equal(obtido, esperado)
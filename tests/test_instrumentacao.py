@@ -0,0 +1,30 @@
+"""Detalhamento por requisição: cada thread (sessão do app, rota do serviço) fica só com os próprios tempos."""
+import threading
+
+from recomendador.instrumentacao import Telemetry
+
+
+def test_requisicoes_concorrentes_nao_compartilham_o_detalhamento():
+    telemetria = Telemetry()
+    dentro = threading.Barrier(2)
+    rastros = {}
+
+    def sessao(nome):
+        with telemetria.request(sessao=nome) as rastro:
+            telemetria.observe(f'etapa_{nome}', 0.001)
+            # As duas requisições ficam abertas ao mesmo tempo
+            dentro.wait()
+        rastros[nome] = rastro.as_dict()
+
+    threads = [threading.Thread(target=sessao, args=(nome,)) for nome in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for nome in ('a', 'b'):
+        assert rastros[nome]['sessao'] == nome
+        assert list(rastros[nome]['etapas_ms']) == [f'etapa_{nome}']
+    snapshot = telemetria.snapshot()
+    assert 'ultimo' not in snapshot
+    assert snapshot['etapas']['requisicao']['n'] == 2
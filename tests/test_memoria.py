@@ -0,0 +1,37 @@
+"""Limite de memória: consultas concorrentes enquanto as bases são descartadas e recarregadas."""
+import threading
+
+from recomendador.engine import Recommender
+
+THREADS = 8
+CONSULTAS = 60
+
+
+def test_lru_aguenta_threads_concorrentes_com_limite_de_memoria(base_dir, tmp_path):
+    # Só cabe uma base por vez: cada troca de sistema descarta a outra (reabertas do armazém, em mmap)
+    recomendador = Recommender(base_dir=base_dir, memoria_maxima=1, armazem=str(tmp_path))
+    recomendador.warm()
+    inicio = threading.Barrier(THREADS)
+    erros = []
+
+    def consultas(i):
+        inicio.wait()
+        try:
+            for j in range(CONSULTAS):
+                nome = ('AT', 'MT')[(i + j) % 2]
+                assert recomendador.database(nome).config.nome == nome
+                assert set(recomendador.loaded_systems()) <= {'AT', 'MT'}
+                recomendador.memory_usage()
+                recomendador.versions()
+        except Exception as e:  # qualquer falha de uma thread reprova o teste
+            erros.append(e)
+
+    threads = [threading.Thread(target=consultas, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert erros == []
+    assert recomendador.descartes > 0
+    assert len(recomendador.loaded_systems()) == 1
@@ -0,0 +1,28 @@
+"""Ranking padrão da pontuação e vencedor do motor: mesma ordem, inclusive nos empates de BAC."""
+import numpy as np
+
+from recomendador.catalogo import SISTEMAS, valid_adjustments
+from recomendador.engine import Scenario
+from recomendador.pontuacao import Scoring
+
+
+def test_empate_exato_de_bac_tem_o_mesmo_vencedor_no_ranking(recomendador):
+    # C4_Cgd1_H2_RS4_VB1_CR1: os dois melhores válidos têm BAC 100
+    recomendacao = recomendador.recommend(Scenario(
+        1112.0, 13.8, 'Gerador Síncrono', 'Habilitado', 'Sem Requisitos', 'Desabilitada', 'Desabilitada',
+        'Apenas Gerador Síncrono', 0.4182))
+    assert recomendacao.validos['BAC'].iloc[0] == recomendacao.validos['BAC'].iloc[1]
+    topo, _ = recomendacao.ranking()
+    assert topo.index[0] == recomendacao.vencedor.name
+    assert list(topo.index) == list(recomendacao.validos.index)
+
+
+def test_empates_seguem_a_ordem_do_catalogo():
+    config = SISTEMAS['MT']
+    n = len(config.ajustes_candidatos)
+    valores = np.tile([95.0, 1.0, 1.0], (n, 1))
+    valores[n - 1, 0] = 99.0
+    ordem = valid_adjustments(config, valores, 1, 4)
+    ranking = Scoring(k=n).rank(valores, config.eligible(1, 4))
+    assert ordem[0] == n - 1 and list(ordem[1:]) == sorted(ordem[1:])
+    assert list(ranking.topo[0][:len(ordem)]) == list(ordem)
@@ -0,0 +1,95 @@
+"""Serviço HTTP: rotas leves respondem mesmo com uma carga fria das bases em andamento."""
+import asyncio
+import http.client
+import json
+import time
+
+from recomendador.aquecimento import Warmup
+from recomendador.catalogo import SISTEMAS
+from recomendador.engine import Recommender
+from recomendador.service import RecommendationService, _atender
+
+CENARIO = {
+    'capacidade_kw': 1500, 'tensao_kv': 13.8, 'tipo_gd': 'Gerador Síncrono', 'bloqueio_tensao': 'Habilitado',
+    'req_suportabilidade': 'Categoria I', 'tecnica_ativa': 'Desabilitada', 'curva_regulacao': 'Desabilitada',
+    'cenario_geracao': 'Apenas Gerador Síncrono', 'inercia': 0.7557,
+}
+ESPERA_CARGA = 1.0
+
+
+class RecommenderLento(Recommender):
+    """Carga fria artificialmente lenta (como a primeira leitura dos .xlsx)."""
+
+    def _load(self, config):
+        time.sleep(ESPERA_CARGA)
+        return super()._load(config)
+
+
+def _pedir(porta, metodo, caminho, corpo=None):
+    # Cliente bloqueante, numa thread própria: o tempo medido não depende do loop do serviço
+    conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+    t0 = time.perf_counter()
+    conexao.request(metodo, caminho, body=None if corpo is None else json.dumps(corpo))
+    resposta = conexao.getresponse()
+    dados = json.loads(resposta.read())
+    conexao.close()
+    return resposta.status, dados, time.perf_counter() - t0
+
+
+def rodar_servico(servico, cliente):
+    async def principal():
+        servidor = await asyncio.start_server(lambda r, w: _atender(servico, r, w), '127.0.0.1', 0)
+        async with servidor:
+            return await cliente(servidor.sockets[0].getsockname()[1])
+    return asyncio.run(principal())
+
+
+def test_carga_fria_nao_segura_as_rotas_leves(base_dir):
+    servico = RecommendationService(RecommenderLento(base_dir=base_dir))
+
+    async def cliente(porta):
+        def saude():
+            time.sleep(0.1)  # com a recomendação já lendo as bases
+            return _pedir(porta, 'GET', '/health')
+        return await asyncio.gather(asyncio.to_thread(_pedir, porta, 'POST', '/recommend', CENARIO),
+                                    asyncio.to_thread(saude))
+
+    (status, corpo, _), (status_saude, _, tempo_saude) = rodar_servico(servico, cliente)
+    assert status == 200 and corpo['cenario_proximo'] == 'C3_Cgd1_H1_RS1_VB1'
+    assert status_saude == 200 and tempo_saude < ESPERA_CARGA / 2
+
+
+def test_aquecimento_em_andamento_responde_503_sem_esperar_a_carga(base_dir):
+    aquecimento = Warmup(RecommenderLento(base_dir=base_dir, sistemas={'MT': SISTEMAS['MT']})).start()
+    servico = RecommendationService(aquecimento.recomendador, aquecimento=aquecimento)
+
+    async def cliente(porta):
+        durante = await asyncio.gather(asyncio.to_thread(_pedir, porta, 'GET', '/ready'),
+                                       asyncio.to_thread(_pedir, porta, 'POST', '/recommend', CENARIO))
+        await asyncio.to_thread(aquecimento.wait, 30)
+        depois = await asyncio.gather(asyncio.to_thread(_pedir, porta, 'GET', '/ready'),
+                                      asyncio.to_thread(_pedir, porta, 'POST', '/recommend', CENARIO))
+        return durante, depois
+
+    durante, depois = rodar_servico(servico, cliente)
+    for status, corpo, segundos in durante:
+        assert status == 503 and segundos < ESPERA_CARGA / 2, corpo
+    assert [status for status, _, _ in depois] == [200, 200]
+    assert depois[1][1]['cenario_proximo'] == 'C3_Cgd1_H1_RS1_VB1'
+
+
+def test_limite_de_memoria_aquece_so_o_que_cabe_e_segura_o_ready(base_dir):
+    # Limite abaixo de uma base: a primeira sobe, a segunda fica para a primeira consulta
+    recomendador = RecommenderLento(base_dir=base_dir, memoria_maxima=1)
+    aquecimento = Warmup(recomendador).start()
+    servico = RecommendationService(recomendador, aquecimento=aquecimento)
+
+    async def cliente(porta):
+        durante = await asyncio.to_thread(_pedir, porta, 'GET', '/ready')
+        await asyncio.to_thread(aquecimento.wait, 30)
+        return durante, await asyncio.to_thread(_pedir, porta, 'GET', '/ready')
+
+    (status_durante, _, _), (status_depois, corpo, _) = rodar_servico(servico, cliente)
+    assert status_durante == 503
+    assert status_depois == 200 and corpo['carregados'] == [next(iter(SISTEMAS))]
+    assert recomendador.descartes == 0
@@ -0,0 +1,24 @@
+"""Tabela pré-computada: responde com o registro de sistemas com que foi compilada."""
+from dataclasses import replace
+
+from recomendador.catalogo import SISTEMAS
+from recomendador.engine import Recommender, Scenario
+from recomendador.service import recommendation_to_dict
+from recomendador.tabela import RecommendationTable, compile_table
+
+
+def test_tabela_usa_as_faixas_de_tensao_do_registro_compilado(base_dir, tmp_path):
+    # 69 kV fica na base MT: a faixa padrão a mandaria para a AT
+    sistemas = {'AT': replace(SISTEMAS['AT'], tensao_min_kv=100.0),
+                'MT': replace(SISTEMAS['MT'], tensao_max_kv=100.0)}
+    recomendador = Recommender(base_dir=base_dir, sistemas=sistemas)
+    compile_table(str(tmp_path / 'tabela'), recomendador, base_dir=base_dir)
+    tabela = RecommendationTable.load(str(tmp_path / 'tabela'))
+    assert tabela.sistemas == sistemas
+    assert tabela.stale_sources(base_dir) == []
+    for tensao_kv, sistema in ((69.0, 'MT'), (138.0, 'AT')):
+        cenario = Scenario(1112.0, tensao_kv, 'Gerador Síncrono', 'Habilitado', 'Categoria I', 'Desabilitada',
+                           'Desabilitada', 'Apenas Gerador Síncrono', None)
+        saida = tabela.recommend(cenario)
+        assert saida['sistema'] == sistema
+        assert saida == recommendation_to_dict(recomendador.recommend(cenario))